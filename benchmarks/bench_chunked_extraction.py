@@ -0,0 +1,69 @@
+import resource
+import time
+import tracemalloc
+import bpy
+import numpy as np
+
+import bench_common
+from grille_beamng_cdae.cdae_builder import CdaeMeshBuilder, CdaeMaterialIndexer
+
+
+def create_grid_mesh(size: int) -> bpy.types.Mesh:
+    """Quad grid with one UV map and a corner color attribute, built with foreach_set."""
+    xs, ys = np.meshgrid(np.arange(size + 1, dtype=np.float32), np.arange(size + 1, dtype=np.float32))
+    co = np.stack([xs.ravel(), ys.ravel(), np.zeros(xs.size, dtype=np.float32)], axis=1)
+
+    corners = np.arange(size * size).reshape(size, size)
+    corners = corners + corners // size
+    loops = np.stack([corners, corners + 1, corners + size + 2, corners + size + 1], axis=-1).ravel().astype(np.int32)
+
+    mesh = bpy.data.meshes.new("bench_grid")
+    mesh.vertices.add(len(co))
+    mesh.vertices.foreach_set("co", co.ravel())
+    mesh.loops.add(len(loops))
+    mesh.loops.foreach_set("vertex_index", loops)
+    mesh.polygons.add(size * size)
+    mesh.polygons.foreach_set("loop_start", np.arange(0, len(loops), 4, dtype=np.int32))
+    try:
+        mesh.polygons.foreach_set("loop_total", np.full(size * size, 4, dtype=np.int32))
+    except (AttributeError, TypeError):
+        pass # read-only since 4.0, derived from loop_start
+    mesh.update()
+
+    uv = mesh.uv_layers.new(name="uv0")
+    uv.data.foreach_set("uv", (co[loops, :2] / size).ravel())
+    color = mesh.color_attributes.new("color", 'FLOAT_COLOR', 'CORNER')
+    color.data.foreach_set("color", np.ones(len(loops) * 4, dtype=np.float32))
+    return mesh
+
+
+def run(mesh: bpy.types.Mesh, chunk_memory_limit: float):
+    builder = CdaeMeshBuilder(CdaeMaterialIndexer())
+    builder.chunk_memory_limit = chunk_memory_limit
+
+    tracemalloc.start()
+    now = time.perf_counter()
+    result = builder.build_from_mesh(mesh)
+    elapsed = time.perf_counter() - now
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    label = "full" if chunk_memory_limit <= 0 else f"chunked {chunk_memory_limit:.0f} MiB"
+    print(f"  {label:18} peak {peak / 2**20:8.1f} MiB  time {elapsed * 1000:8.1f} ms  verts {result.verts.element_count}")
+
+
+def main():
+    size = 1000
+    mesh = create_grid_mesh(size)
+    print(f"CdaeMeshBuilder.build_from_mesh ({len(mesh.loops)} loops), peak of NumPy and Python allocations")
+
+    for limit in (0, 256, 64, 16):
+        run(mesh, limit)
+
+    # Process wide high-water mark, includes Blender itself and the source mesh.
+    print(f"  max RSS of this process: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+    bpy.data.meshes.remove(mesh)
+
+
+if __name__ == "__main__":
+    main()
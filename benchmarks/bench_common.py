@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+import time
+import types
+
+# Benchmarks run inside Blender's Python, e.g.:
+#   blender --background --factory-startup --python benchmarks/bench_dts_writer.py
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+if REPO_DIR not in sys.path:
+    sys.path.append(REPO_DIR)
+
+
+def load_module_at_revision(revision: str, path: str) -> types.ModuleType:
+    """Module source as of a git revision, e.g. the implementation a benchmark compares against, relative imports resolve to the current package."""
+    source = subprocess.run(["git", "show", f"{revision}:{path}"], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout
+    package = os.path.dirname(path).replace("/", ".")
+    module = types.ModuleType(f"{package}._{os.path.basename(path)[:-3]}_{revision}")
+    module.__package__ = package
+    exec(compile(source, f"{revision}:{path}", "exec"), module.__dict__)
+    return module
+
+
+def measure(fn, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        now = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - now)
+    return best
+
+
+def report(name: str, baseline: float, current: float, unit: str = "", amount: float = 0):
+    speedup = baseline / current if current > 0 else float("inf")
+    print(f"{name}")
+    print(f"  baseline: {baseline*1000:9.2f} ms")
+    print(f"  current:  {current*1000:9.2f} ms")
+    if amount > 0:
+        print(f"  throughput: {amount / baseline:,.0f} -> {amount / current:,.0f} {unit}/s")
+    print(f"  speedup:  {speedup:.2f}x")
@@ -0,0 +1,85 @@
+import numpy as np
+
+from io import BytesIO
+
+from bench_common import load_module_at_revision, measure, report
+from grille_beamng_cdae.cdae_v31 import CdaeV31
+from grille_beamng_cdae.io_dts_writer import DtsWriter
+from grille_beamng_cdae.numerics import *
+
+
+# Writer before the batched buffers, one struct.pack per scalar into BytesIO streams. It wrote no sequence
+# bodies, so the current writer does more work here. Its guards overflowed the s8 stream after 127 of them,
+# the patch below wraps them like the current writer so the baseline can write shapes of this size.
+baseline_writer = load_module_at_revision("bc532ab", "grille_beamng_cdae/io_dts_writer.py")
+
+
+def write_wrapped_guard(self):
+    self.write_u8(self.guard_index & 0xFF)
+    self.write_u16(self.guard_index & 0xFFFF)
+    self.write_s32(self.guard_index)
+    self.guard_index += 1
+
+
+baseline_writer.CdaeDtsBuffers.write_guard = write_wrapped_guard
+
+
+def create_shape(mesh_count: int, node_count: int, keyframes: int) -> CdaeV31:
+    rng = np.random.default_rng(0)
+    cdae = CdaeV31()
+
+    tree = cdae.unpack_tree()
+    for i in range(node_count):
+        node_index, node = tree.create_node()
+        node.nameIndex = cdae.get_name_index(f"node{i}")
+    cdae.pack_tree(tree)
+    cdae.defaultTranslations.set_numpy_array(rng.random((node_count, 3), dtype=np.float32))
+    cdae.defaultRotations.set_numpy_array(rng.integers(-32767, 32767, (node_count, 4), dtype=np.int16))
+
+    for _ in range(mesh_count):
+        mesh = CdaeV31.Mesh()
+        mesh.type = CdaeV31.MeshType.STANDARD
+        mesh.verts.set_numpy_array(rng.random((24, 3), dtype=np.float32))
+        mesh.norms.set_numpy_array(rng.random((24, 3), dtype=np.float32))
+        mesh.tverts0.set_numpy_array(rng.random((24, 2), dtype=np.float32))
+        mesh.indices.set_numpy_array(rng.integers(0, 24, 36, dtype=np.int32))
+        mesh.draw_regions.set_numpy_array(np.array([0, 36, CdaeV31.Mesh.DrawRegion.InfoMask.INDEXED], dtype=np.int32))
+        mesh.numFrames = mesh.numMatFrames = 1
+        mesh.vertsPerFrame = 24
+        cdae.meshes.append(mesh)
+
+    cdae.nodeTranslations.set_numpy_array(rng.random((node_count * keyframes, 3), dtype=np.float32))
+    cdae.nodeRotations.set_numpy_array(rng.integers(-32767, 32767, (node_count * keyframes, 4), dtype=np.int16))
+
+    seq = CdaeV31.Sequence()
+    seq.numKeyframes = keyframes
+    seq.rotationMatters = [True] * node_count
+    seq.translationMatters = [True] * node_count
+    cdae.sequences.append(seq)
+
+    for i in range(64):
+        mat = CdaeV31.Material()
+        mat.name = f"material_{i}"
+        cdae.materials.append(mat)
+
+    return cdae
+
+
+def main():
+    cdae = create_shape(mesh_count=5000, node_count=500, keyframes=100)
+
+    def write_baseline():
+        baseline_writer.DtsWriter.write_to_stream(cdae, BytesIO())
+
+    def write_current():
+        DtsWriter.write_to_stream(cdae, BytesIO())
+
+    stream = BytesIO()
+    DtsWriter.write_to_stream(cdae, stream)
+    size = len(stream.getvalue())
+
+    report(f"DtsWriter.write_to_stream ({len(cdae.meshes)} meshes, {size / 2**20:.1f} MiB)", measure(write_baseline), measure(write_current), "MiB", size / 2**20)
+
+
+if __name__ == "__main__":
+    main()
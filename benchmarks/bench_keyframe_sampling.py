@@ -0,0 +1,77 @@
+import bpy
+import math
+
+from bench_common import measure, report
+from grille_beamng_cdae.cdae_builder import CdaeKeyframeSampler
+from grille_beamng_cdae.numerics import Transforms
+
+
+def create_rig(node_count: int, frame_count: int) -> list[bpy.types.Object]:
+    """Chain of empties, each one rotating and sliding relative to its parent."""
+    objects = []
+    parent = None
+    for index in range(node_count):
+        obj = bpy.data.objects.new(f"bone{index}", None)
+        bpy.context.scene.collection.objects.link(obj)
+        obj.parent = parent
+        obj.location = (0.0, 0.0, 1.0 if parent else 0.0)
+        for frame in (0, frame_count // 2, frame_count):
+            obj.rotation_euler = (0.0, 0.0, math.sin(frame * 0.01 + index))
+            obj.location.x = math.cos(frame * 0.02 + index) * 0.1
+            obj.keyframe_insert("rotation_euler", frame=frame)
+            obj.keyframe_insert("location", frame=frame)
+        objects.append(obj)
+        parent = obj
+    return objects
+
+
+def create_sampler(sample_count: int) -> CdaeKeyframeSampler:
+    sampler = CdaeKeyframeSampler()
+    sampler.sample_keyframes_enabled = True
+    sampler.start = 0
+    sampler.end = sample_count
+    sampler.sample_count = sample_count
+    return sampler
+
+
+def sample_baseline(objects: list[bpy.types.Object], sample_count: int) -> list[Transforms]:
+    """Previous implementation: every node sets every frame on its own."""
+    sampler = create_sampler(sample_count)
+    scene = bpy.context.scene
+    frame_backup = scene.frame_current
+    for obj in objects:
+        for frame in sampler.get_frames():
+            intframe = int(frame)
+            scene.frame_set(intframe, subframe=frame - intframe)
+            sampler.keyframes.append(Transforms.from_blender_matrix(obj.matrix_world))
+        scene.frame_set(frame_backup)
+    return sampler.keyframes
+
+
+def sample_current(objects: list[bpy.types.Object], sample_count: int) -> list[Transforms]:
+    sampler = create_sampler(sample_count)
+    sampler.register(objects)
+    for obj in objects:
+        sampler.sample(obj)
+    return sampler.keyframes
+
+
+def main():
+    node_count = 100
+    sample_count = 200
+    objects = create_rig(node_count, sample_count)
+
+    baseline = sample_baseline(objects, sample_count)
+    current = sample_current(objects, sample_count)
+    matching = sum(a == b for a, b in zip(baseline, current))
+    print(f"{node_count} nodes, {sample_count} samples: {matching} of {len(baseline)} keyframes match")
+
+    report(f"CdaeKeyframeSampler ({node_count} nodes, {sample_count} samples)",
+        measure(lambda: sample_baseline(objects, sample_count), 1),
+        measure(lambda: sample_current(objects, sample_count), 1),
+        "keyframes", node_count * sample_count
+    )
+
+
+if __name__ == "__main__":
+    main()
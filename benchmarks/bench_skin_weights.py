@@ -0,0 +1,114 @@
+import bpy
+import numpy as np
+
+from bench_common import measure, report
+from grille_beamng_cdae.cdae_builder import CdaeMeshBuilder, CdaeMaterialIndexer
+
+
+def create_armature(bone_count: int) -> bpy.types.Object:
+    armature = bpy.data.objects.new("skin_bench_rig", bpy.data.armatures.new("skin_bench_rig"))
+    bpy.context.scene.collection.objects.link(armature)
+    bpy.context.view_layer.objects.active = armature
+    bpy.ops.object.mode_set(mode='EDIT')
+    for bone in range(bone_count):
+        edit_bone = armature.data.edit_bones.new(f"bone{bone}")
+        edit_bone.head = (bone, 0.0, 0.0)
+        edit_bone.tail = (bone, 0.0, 1.0)
+    bpy.ops.object.mode_set(mode='OBJECT')
+    return armature
+
+
+def create_skinned_grid(size: int, bone_count: int, groups_per_vertex: int) -> bpy.types.Object:
+    """Grid with size^2 vertices deformed by an armature, every vertex weighted to a few random bone groups."""
+    xs, ys = np.meshgrid(np.arange(size, dtype=np.float32), np.arange(size, dtype=np.float32))
+    verts = np.stack([xs.ravel(), ys.ravel(), np.zeros(xs.size, dtype=np.float32)], axis=1)
+
+    mesh = bpy.data.meshes.new("skin_bench")
+    mesh.vertices.add(len(verts))
+    mesh.vertices.foreach_set("co", verts.ravel())
+    mesh.update()
+    obj = bpy.data.objects.new("skin_bench", mesh)
+    bpy.context.scene.collection.objects.link(obj)
+
+    rng = np.random.default_rng(0)
+    assigned = rng.integers(0, bone_count, (len(verts), groups_per_vertex))
+    weights = rng.random((len(verts), groups_per_vertex))
+    for bone in range(bone_count):
+        group = obj.vertex_groups.new(name=f"bone{bone}")
+        rows, columns = np.nonzero(assigned == bone)
+        # One call per distinct weight would be exact, quantized weights keep the setup short.
+        quantized = np.round(weights[rows, columns] * 16) / 16
+        for weight in np.unique(quantized):
+            group.add(rows[quantized == weight].tolist(), float(weight), 'REPLACE')
+
+    modifier = obj.modifiers.new("Armature", 'ARMATURE')
+    modifier.object = create_armature(bone_count)
+    return obj
+
+
+def get_weights_baseline(obj: bpy.types.Object, max_influences: int):
+    """Per-vertex Python: sort each vertex's groups, keep the heaviest and renormalize."""
+    result = []
+    for vertex in obj.data.vertices:
+        elements = sorted(((element.weight, element.group) for element in vertex.groups if element.weight > 0), reverse=True)[:max_influences]
+        total = sum(weight for weight, _ in elements)
+        result.append([(group, weight / total) for weight, group in elements])
+    return result
+
+
+def get_weights_current(builder: CdaeMeshBuilder):
+    builder.set_skin_weights()
+    return builder.skin.offsets
+
+
+def main():
+    size = 317
+    bone_count = 60
+    max_influences = 4
+    obj = create_skinned_grid(size, bone_count, 6)
+    vertex_count = len(obj.data.vertices)
+    group_names = [group.name for group in obj.vertex_groups]
+
+    builder = CdaeMeshBuilder(CdaeMaterialIndexer())
+    builder.skin_enabled = True
+    builder.skin_max_influences = max_influences
+    builder.skin = builder.get_skin(obj)
+
+    # Raw data has no weight attributes, so it takes the Python pass over vertex.groups.
+    builder.mesh = obj.data
+    vertices, groups, weights = builder.get_group_weights(group_names)
+    print(f"{vertex_count} vertices, {bone_count} bones, {len(weights)} weights")
+    python_gather = measure(lambda: builder.get_group_weights(group_names), 3)
+
+    # Evaluated meshes carry the bone groups as attributes written by the temporary Geometry Nodes modifier.
+    builder.override_modifiers([obj])
+    try:
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+        evaluated = obj.evaluated_get(depsgraph)
+
+        def evaluate():
+            obj.update_tag()
+            depsgraph.update()
+            evaluated.to_mesh_clear()
+            return evaluated.to_mesh()
+
+        evaluation = measure(evaluate, 3)
+        builder.mesh = evaluate()
+        bulk_vertices, _, bulk_weights = builder.get_group_weights(group_names)
+        print(f"bulk gather: {len(bulk_weights)} weights, matches python gather: {len(bulk_weights) == len(weights) and np.array_equal(np.sort(bulk_vertices), np.sort(vertices))}")
+        bulk_gather = measure(lambda: builder.get_group_weights(group_names), 3)
+        report(f"gather bone weights ({vertex_count} vertices, {bone_count} bones)", python_gather, bulk_gather, "vertices", vertex_count)
+        print(f"  mesh evaluation including the weight attributes modifier: {evaluation*1000:9.2f} ms")
+
+        report(f"set_skin_weights ({vertex_count} vertices, {bone_count} bones)",
+            measure(lambda: get_weights_baseline(obj, max_influences), 1),
+            measure(lambda: get_weights_current(builder), 3),
+            "vertices", vertex_count
+        )
+        evaluated.to_mesh_clear()
+    finally:
+        builder.restore_modifiers()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+import numpy as np
+
+from bench_common import measure
+from grille_beamng_cdae.cdae_builder_optimizer import stripify
+
+
+def create_grid_triangles(size: int) -> np.ndarray:
+    """(n, 3) triangle list of a welded quad grid, two triangles per quad in row order."""
+    corners = np.arange(size * size).reshape(size, size)
+    corners = corners + corners // size
+    quads = np.stack([corners, corners + 1, corners + size + 2, corners + size + 1], axis=-1).reshape(-1, 4)
+    return quads[:, [0, 1, 2, 0, 2, 3]].reshape(-1, 3).astype(np.int32)
+
+
+def main():
+    # stripify walks the triangles in pure Python, there is no vectorized baseline, so this reports its throughput.
+    for size in (64, 256, 512):
+        tris = create_grid_triangles(size)
+        strip = stripify(tris)
+        seconds = measure(lambda: stripify(tris), 1 if size > 256 else 3)
+        print(f"stripify ({len(tris)} triangles)")
+        print(f"  time:       {seconds*1000:9.2f} ms")
+        print(f"  throughput: {len(tris) / seconds:,.0f} triangles/s")
+        print(f"  indices:    {tris.size} -> {len(strip)}")
+
+
+if __name__ == "__main__":
+    main()
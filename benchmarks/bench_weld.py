@@ -0,0 +1,63 @@
+import copy
+import numpy as np
+
+from bench_common import measure, report
+from grille_beamng_cdae.cdae_builder import CdaeMeshBuilder
+
+
+def collapse_vertices_baseline(npmesh: CdaeMeshBuilder.NpMesh) -> int:
+    """Previous implementation: lexicographic np.unique over the concatenated float rows."""
+    combined = npmesh.concatenate()
+    _, unique_indices, inverse = np.unique(combined, axis=0, return_inverse=True, return_index=True)
+    npmesh.indices = inverse.reshape(-1)[npmesh.indices].astype(np.int32)
+    npmesh.positions = npmesh.positions[unique_indices]
+    npmesh.normals = npmesh.normals[unique_indices]
+    npmesh.uvs0 = npmesh.uvs0[unique_indices]
+    return len(combined) - len(unique_indices)
+
+
+def create_grid(size: int, noise: float = 0.0) -> CdaeMeshBuilder.NpMesh:
+    """Quad grid split into loops, every inner vertex is shared by four loops."""
+    rng = np.random.default_rng(0)
+    xs, ys = np.meshgrid(np.arange(size + 1, dtype=np.float32), np.arange(size + 1, dtype=np.float32))
+    verts = np.stack([xs.ravel(), ys.ravel(), np.zeros(xs.size, dtype=np.float32)], axis=1)
+
+    corners = np.arange(size * size).reshape(size, size)
+    corners = corners + corners // size
+    quads = np.stack([corners, corners + 1, corners + size + 2, corners + size + 1], axis=-1).reshape(-1, 4)
+    loop_verts = quads.ravel()
+
+    npmesh = CdaeMeshBuilder.NpMesh()
+    npmesh.positions = verts[loop_verts]
+    npmesh.normals = np.tile(np.array([0, 0, 1], dtype=np.float32), (len(loop_verts), 1))
+    npmesh.uvs0 = npmesh.positions[:, :2] / size
+    if noise > 0:
+        npmesh.normals = npmesh.normals + rng.normal(0, noise, npmesh.normals.shape).astype(np.float32)
+        npmesh.uvs0 = npmesh.uvs0 + rng.normal(0, noise, npmesh.uvs0.shape).astype(np.float32)
+    npmesh.indices = np.arange(len(loop_verts), dtype=np.int32).reshape(-1, 4)[:, [0, 1, 2, 0, 2, 3]].reshape(-1, 3)
+    return npmesh
+
+
+def main():
+    size = 512
+    grid = create_grid(size)
+    loops = len(grid.positions)
+
+    welded_baseline = collapse_vertices_baseline(copy.deepcopy(grid))
+    welded_current = copy.deepcopy(grid).collapse_vertices()
+    print(f"exact: {loops} loops, welded baseline {welded_baseline}, current {welded_current}")
+
+    report(f"NpMesh.collapse_vertices ({loops} loops)",
+        measure(lambda: collapse_vertices_baseline(copy.deepcopy(grid)), 3),
+        measure(lambda: copy.deepcopy(grid).collapse_vertices(), 3),
+        "loops", loops
+    )
+
+    noisy = create_grid(size, noise=1e-6)
+    welded_exact = copy.deepcopy(noisy).collapse_vertices()
+    welded_tolerance = copy.deepcopy(noisy).collapse_vertices(1e-4, 1e-3, 1e-4)
+    print(f"noisy: {loops} loops, welded exact {welded_exact}, with tolerance {welded_tolerance}")
+
+
+if __name__ == "__main__":
+    main()
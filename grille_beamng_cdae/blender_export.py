@@ -12,7 +12,7 @@ from enum import Enum
 from .blender_msgbox import MessageBox
 from .blender_object_collector import ObjectCollector
 from .beamng_asset import DaeAsset
-from .cdae_builder_tree import CdaeTreeBuildMode
+from .cdae_builder_tree import CdaeTree, CdaeTreeBuildMode
 from .cdae_builder import CdeaBuilder, MeshDataEvalMode
 from .cdae_v31 import CdaeV31
 from .material_libary import MaterialLibary
@@ -69,6 +69,7 @@ class ExportBase(Operator, ExportHelper):
     selection_only: BoolProperty(name="Selection Only", default=False, description="Use selected Objects.")
     include_children: BoolProperty(name="Include Children", default=False, description="Include all Children of selected Objects.")
     include_hidden: BoolProperty(name="Include Hidden", default=False, description="Include Objects that are hidden in Viewport.")
+    include_instances: BoolProperty(name="Include Instances", default=True, description="Export collection and Geometry Nodes instances as nodes sharing one mesh.")
 
     temp_presets_file: StringProperty(default="export")
     temp_presets_selection: StringProperty()
@@ -92,6 +93,7 @@ class ExportBase(Operator, ExportHelper):
 
     use_transforms: BoolProperty(name="Use Transforms", default=True, description="Translation, Rotation")
     compression_enabled: BoolProperty(name="Compression", default=True)
+    print_stats_enabled: BoolProperty(name="Print Statistics", default=False, description="Print the figures of every enabled geometry stage to the console, otherwise a single summary line.")
     build_mode: EnumProperty(
         name="Build Mode",
         description="",
@@ -120,6 +122,28 @@ class ExportBase(Operator, ExportHelper):
         name="UV1",
         default="1",
     )
+    geo_encoded_normals: BoolProperty(name="Encoded Normals", default=False, description="Store 1-byte table normals instead of floats (CDAE), for meshes where every normal stays close to a table entry.")
+    geo_encoded_normals_error: FloatProperty(name="Max Error (Deg)", default=2.0, min=0.0, max=180.0, description="Largest angle between a normal and its table entry for a mesh to use encoded normals.")
+    geo_weld_position: FloatProperty(name="Weld Position", default=0.0, min=0.0, precision=5, description="Positions closer than this get welded, 0 welds exact matches only.")
+    geo_weld_normal: FloatProperty(name="Weld Normal", default=0.0, min=0.0, precision=5)
+    geo_weld_uv: FloatProperty(name="Weld UV", default=0.0, min=0.0, precision=5)
+    geo_optimize: BoolProperty(name="Optimize For GPU", default=False, description="Reorder triangles and vertices for the vertex cache and remove degenerate triangles.")
+    geo_optimize_overdraw: BoolProperty(name="Optimize Overdraw", default=False)
+    geo_optimize_stats: BoolProperty(name="Cache Statistics", default=False, description="Simulate the vertex cache before and after optimizing and print ACMR and ATVR, slow on large meshes.")
+    geo_strips: BoolProperty(name="Triangle Strips", default=False, description="Store draw regions as triangle strips where they need fewer indices than lists. Slow on large meshes, strips are built in Python at about 100k triangles per second.")
+    geo_chunk_memory: FloatProperty(name="Chunk Memory (MiB)", default=0.0, min=0.0, description="Weld large meshes in chunks that stay below this working set, 0 processes each mesh at once.")
+    geo_split_vertices: IntProperty(name="Split Vertex Budget", default=0, min=0, description="Split meshes with more vertices into spatial pieces, 0 disables.")
+    geo_split_triangles: IntProperty(name="Split Triangle Budget", default=0, min=0, description="Split meshes with more triangles into spatial pieces, 0 disables.")
+    geo_batching: BoolProperty(name="Static Batching", default=False, description="Merge static meshes of each subshape into one mesh per detail, with one draw region per material (Flat Dump and Blender Hierarchy).")
+    geo_lod_enabled: BoolProperty(name="Generate LODs", default=False, description="Add decimated detail levels for Mesh role objects (Flat Dump and Collada Node Tree).")
+    geo_lod_ratios: StringProperty(name="LOD Ratios", default="0.5, 0.25, 0.1", description="Triangle ratio of each generated level, comma separated.")
+    geo_lod_sizes: StringProperty(name="LOD Sizes (PX)", default="64, 32, 16", description="Pixel size of each generated level, comma separated.")
+    geo_hlod_enabled: BoolProperty(name="HLOD Proxy", default=False, description="Replace the meshes of each subshape's lowest detail by one merged and decimated proxy mesh.")
+    geo_hlod_max_triangles: IntProperty(name="HLOD Triangles", default=5000, min=0, description="Triangle budget of each proxy mesh, 0 merges without decimating.")
+    geo_hull_count: IntProperty(name="Collision Hulls", default=0, min=0, max=64, description="Replace Collision role meshes by up to this many convex hulls, 0 exports them as they are.")
+    geo_hull_triangles: IntProperty(name="Hull Triangles", default=64, min=0, max=508, description="Triangle budget of each convex hull, 0 only applies the 256 vertex limit. Export time grows with the budget times the mesh size.")
+    geo_lod_error_samples: IntProperty(name="Error Samples", default=1024, min=0, description="Surface samples per mesh to estimate the error of each detail level, 0 skips the estimate.")
+    geo_lod_base_size: IntProperty(name="Full Detail Size (PX)", default=128, min=1, description="Pixel size of the full detail when levels are generated in Flat Dump mode.")
     geo_eval: EnumProperty(
         name="Modifiers",
         items=[
@@ -187,6 +211,10 @@ class ExportBase(Operator, ExportHelper):
     anim_samples: IntProperty(name="Samples", default=100, min=2, update=update_fps)
     anim_duration: FloatProperty(name="Duration (Seconds)", default=100, min=0.01, update=update_fps)
     anim_fps: FloatProperty(name="FPS", default=1, min=0, update=update_samples)
+    anim_vertex: BoolProperty(name="Vertex Animation", default=False, description="Store the evaluated vertices of deforming meshes at every sample (CDAE), e.g. flags and cloth.")
+    anim_vertex_tolerance: FloatProperty(name="Frame Tolerance", default=0.0001, min=0, precision=5, description="Samples that move no vertex further than this from the last stored frame reuse it.")
+    anim_skin: BoolProperty(name="Skinning", default=False, description="Export meshes deformed by an armature as skinned meshes in bind pose, with one node per bone.")
+    anim_skin_influences: IntProperty(name="Bone Influences", default=4, min=1, max=8, description="Largest weights kept per vertex, renormalized to sum to one.")
 
     filter_glob: StringProperty(default="*.dae;*.cdae;*.json", options={'HIDDEN'})
 
@@ -230,9 +258,32 @@ class ExportBase(Operator, ExportHelper):
         builder.mesh_builder.uv0_hint = self.geo_uv0
         builder.mesh_builder.uv1_hint = self.geo_uv1
         builder.mesh_builder.apply_scale = self.geo_apply_scale
-        #builder.mesh_builder.compute_tangents = self.file_format == FileFormat.CDAE
+        builder.mesh_builder.compute_tangents = self.file_format == FileFormat.CDAE
+        builder.mesh_builder.use_encoded_normals = self.geo_encoded_normals and self.file_format == FileFormat.CDAE
+        builder.mesh_builder.encoded_normals_max_error = self.geo_encoded_normals_error
+        builder.mesh_builder.weld_position_tolerance = self.geo_weld_position
+        builder.mesh_builder.weld_normal_tolerance = self.geo_weld_normal
+        builder.mesh_builder.weld_uv_tolerance = self.geo_weld_uv
+        builder.mesh_builder.optimize_enabled = self.geo_optimize
+        builder.mesh_builder.optimizer.optimize_overdraw = self.geo_optimize_overdraw
+        builder.mesh_builder.optimizer.compute_stats = self.geo_optimize_stats
+        builder.mesh_builder.strips_enabled = self.geo_strips and self.file_format in (FileFormat.CDAE, FileFormat.DTS)
+        builder.mesh_builder.chunk_memory_limit = self.geo_chunk_memory
+        builder.mesh_builder.split_max_vertices = self.geo_split_vertices
+        builder.mesh_builder.split_max_triangles = self.geo_split_triangles
+        builder.instances_enabled = self.include_instances
+        builder.instance_parents = collector.objects
         builder.readonly = self.file_readonly
         builder.tree.build_mode = build_mode
+        builder.detail_error_samples = self.geo_lod_error_samples
+        builder.batching_enabled = self.geo_batching
+        builder.hlod_enabled = self.geo_hlod_enabled
+        builder.hlod_max_triangles = self.geo_hlod_max_triangles
+        builder.mesh_builder.hull_count = self.geo_hull_count
+        builder.mesh_builder.hull_max_triangles = self.geo_hull_triangles
+        if self.geo_lod_enabled:
+            builder.tree.lod_levels = CdaeTree.parse_lod_levels(self.geo_lod_ratios, self.geo_lod_sizes)
+            builder.tree.lod_base_size = self.geo_lod_base_size
         sampler = builder.sampler
         sampler.sample_transforms_enabled = self.use_transforms
         sampler.sample_keyframes_enabled = self.write_animations
@@ -240,6 +291,10 @@ class ExportBase(Operator, ExportHelper):
         sampler.end = self.anim_frame_end
         sampler.sample_count = self.anim_samples
         sampler.duration = self.anim_duration
+        builder.vertex_animation_enabled = self.anim_vertex and self.file_format == FileFormat.CDAE
+        builder.mesh_builder.vertex_animation_tolerance = self.anim_vertex_tolerance
+        builder.mesh_builder.skin_enabled = self.anim_skin and self.file_format == FileFormat.CDAE
+        builder.mesh_builder.skin_max_influences = self.anim_skin_influences
         log("setup")
 
         builder.tree.add_objects(collector.objects)
@@ -247,6 +302,7 @@ class ExportBase(Operator, ExportHelper):
 
         builder.build()
         log("build")
+        self.print_stats(builder)
 
         filepath: str = self.filepath
         dirpath = os.path.dirname(filepath)
@@ -271,6 +327,35 @@ class ExportBase(Operator, ExportHelper):
         return {OperatorResult.FINISHED}
     
 
+    def print_stats(self, builder: CdeaBuilder):
+        """One summary line, the figures of every enabled stage with Print Statistics."""
+        mesh_builder = builder.mesh_builder
+        vertex_count = mesh_builder.loop_count - mesh_builder.welded_count
+        print(f"stats: {vertex_count} vertices, {len(mesh_builder.mesh_cache)} meshes built, {mesh_builder.cache_hits} cache hits, {builder.instance_count} instances")
+        if not self.print_stats_enabled:
+            return
+
+        print(f"welded {mesh_builder.welded_count} of {mesh_builder.loop_count} loops into {vertex_count} vertices")
+        if builder.vertex_animation_enabled:
+            print(f"vertex animation: {len(mesh_builder.vertex_frames)} deforming meshes")
+        if mesh_builder.skin_enabled:
+            print(f"skinning: {len(mesh_builder.skins)} skinned meshes")
+        if builder.batching_enabled:
+            print(f"batching: {builder.draw_calls_before} -> {builder.draw_calls_after} draw calls")
+        if builder.hlod_enabled:
+            print(f"hlod: {builder.hlod_triangles_before} -> {builder.hlod_triangles_after} triangles")
+        if mesh_builder.strips_enabled:
+            print(f"strips: {mesh_builder.strip_indices_before} -> {mesh_builder.strip_indices_after} indices ({mesh_builder.strip_indices_before - mesh_builder.strip_indices_after} saved)")
+        if mesh_builder.hull_count > 0:
+            print(f"collision hulls: {mesh_builder.hull_triangles_before} -> {mesh_builder.hull_triangles_after} triangles ({mesh_builder.hull_triangles_before - mesh_builder.hull_triangles_after} saved)")
+        if builder.tree.lod_levels_skipped:
+            print(f"lod: {builder.tree.lod_levels_skipped} generated levels skipped")
+        for detail in builder.cdae.unpack_details():
+            print(f"{builder.cdae.names[detail.nameIndex]}: size {detail.size}, {detail.polyCount} polys, error {detail.averageError:.5f} avg {detail.maxError:.5f} max")
+        if mesh_builder.optimize_enabled and mesh_builder.optimizer.compute_stats:
+            print(mesh_builder.optimizer.get_stats())
+
+
     def check(self, context):
         format: FileFormat = self.file_format
         path: str = self.filepath
@@ -389,10 +474,12 @@ class ExportBase(Operator, ExportHelper):
         if self.selection_only:
             box.prop(self, "include_children")
         #box.prop(self, "include_hidden")
+        box.prop(self, "include_instances")
         
         box = layout.box()
         box.label(text="File", icon='FILE_NEW')
         box.prop(self, "file_format")
+        box.prop(self, "print_stats_enabled")
 
         if format == FileFormat.DAE:
             box.prop(self, "limit_precision_enabled")
@@ -413,6 +500,36 @@ class ExportBase(Operator, ExportHelper):
             box.label(text="Geometry", icon='MESH_DATA')
             box.prop(self, "geo_apply_scale")
             box.prop(self, "geo_eval")
+            box.prop(self, "geo_weld_position")
+            box.prop(self, "geo_weld_normal")
+            box.prop(self, "geo_weld_uv")
+            box.prop(self, "geo_chunk_memory")
+            box.prop(self, "geo_split_vertices")
+            box.prop(self, "geo_split_triangles")
+            box.prop(self, "geo_batching")
+            box.prop(self, "geo_lod_enabled")
+            if self.geo_lod_enabled:
+                box.prop(self, "geo_lod_ratios")
+                box.prop(self, "geo_lod_sizes")
+                if self.build_mode == CdaeTreeBuildMode.FLAT_DUMP:
+                    box.prop(self, "geo_lod_base_size")
+            box.prop(self, "geo_hlod_enabled")
+            if self.geo_hlod_enabled:
+                box.prop(self, "geo_hlod_max_triangles")
+            box.prop(self, "geo_hull_count")
+            if self.geo_hull_count > 0:
+                box.prop(self, "geo_hull_triangles")
+            box.prop(self, "geo_lod_error_samples")
+            box.prop(self, "geo_optimize")
+            if self.geo_optimize:
+                box.prop(self, "geo_optimize_overdraw")
+                box.prop(self, "geo_optimize_stats")
+            if format == FileFormat.CDAE:
+                box.prop(self, "geo_encoded_normals")
+                if self.geo_encoded_normals:
+                    box.prop(self, "geo_encoded_normals_error")
+            if format != FileFormat.DAE:
+                box.prop(self, "geo_strips")
             box.prop(self, "geo_uv_mode")
             if self.geo_uv_mode == UvMode.STRING:
                 box.prop(self, "geo_uv0")
@@ -422,12 +539,21 @@ class ExportBase(Operator, ExportHelper):
             box.label(text="Animations", icon='ANIM_DATA')
             box.prop(self, "write_animations")
             box.use_property_split = False
+            # Only the CDAE writer stores skinned meshes and vertex frames.
+            if format == FileFormat.CDAE:
+                box.prop(self, "anim_skin")
+                if self.anim_skin:
+                    box.prop(self, "anim_skin_influences")
             if self.write_animations:
                 box.prop(self, "anim_frame_start")
                 box.prop(self, "anim_frame_end")
                 box.prop(self, "anim_duration")
                 box.prop(self, "anim_samples")
                 box.prop(self, "anim_fps")
+                if format == FileFormat.CDAE:
+                    box.prop(self, "anim_vertex")
+                    if self.anim_vertex:
+                        box.prop(self, "anim_vertex_tolerance")
                 if self.anim_duration > 500:
                     alert(box, f"Long animations can break.")
 
@@ -11,6 +11,7 @@ from bpy.props import StringProperty, BoolProperty, EnumProperty
 
 from .io_dae_reader import DaeReader
 from .io_cdae_reader import CdaeReader
+from .io_dts_reader import DtsReader
 from .cdae_parser import CdaeParser
 from .utils_debug import CdaeJsonDebugger
 
@@ -28,7 +29,7 @@ class ImportCdae(Operator, ImportHelper):
     bl_label = "Import BeamNG"
     filename_ext = ".cdae"
 
-    filter_glob: StringProperty(default="*.dae;*.cdae;*.json", options={'HIDDEN'})
+    filter_glob: StringProperty(default="*.dae;*.cdae;*.dts;*.json", options={'HIDDEN'})
 
     validate_meshes: BoolProperty(name="Validate Meshes", default=True)
     debug_info: BoolProperty(name="Debug Info", default=False)
@@ -44,6 +45,8 @@ class ImportCdae(Operator, ImportHelper):
                 cdae = DaeReader.read_from_file(filepath)
             case FileFormat.CDAE:
                 cdae = CdaeReader.read_from_file(filepath)
+            case FileFormat.DTS:
+                cdae = DtsReader.read_from_file(filepath)
             case _:
                 raise Exception()
 
@@ -63,7 +66,7 @@ class ImportCdae(Operator, ImportHelper):
 
     @staticmethod
     def menu_func(self, context):
-        self.layout.operator(ImportCdae.bl_idname, text="BeamNG (.cdae)")
+        self.layout.operator(ImportCdae.bl_idname, text="BeamNG (.dae/.cdae/.dts)")
 
 
     def draw(self, context):
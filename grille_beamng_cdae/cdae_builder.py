@@ -1,5 +1,6 @@
 import bpy
-import bmesh
+import mathutils
+import copy
 import re
 import numpy as np
 
@@ -7,11 +8,13 @@ from numpy.typing import NDArray
 from enum import Enum
 from dataclasses import dataclass
 from typing import List, Dict, Optional, Tuple
-from collections import defaultdict
 
 from .cdae_v31 import *
 from .blender_object_properties import ObjectProperties, ObjectRole
-from .cdae_builder_tree import CdaeTree
+from .cdae_builder_tree import CdaeTree, CdaeTreeBuildMode
+from .cdae_builder_optimizer import CdaeMeshOptimizer, split_triangles
+from .cdae_builder_decimate import simplify_triangles, get_surface_samples, get_surface_distances
+from .cdae_builder_hull import get_convex_decomposition
 from .torque3d import Torque3D
 from .utils_debug import Stopwatch
 
@@ -32,6 +35,27 @@ class CdaeMaterialIndexer:
         return self.material_to_index[bmat]
     
     
+class CdaeBufferArena:
+    """Scratch arrays reused across meshes of one export, each key grows its buffer but never shrinks it."""
+
+    def __init__(self):
+        self.buffers: dict[str, NDArray] = {}
+        self.allocations: int = 0
+
+
+    def get(self, key: str, shape: int | tuple, dtype = np.float32) -> NDArray:
+        shape = (shape,) if isinstance(shape, int) else shape
+        size = int(np.prod(shape))
+        dtype = np.dtype(dtype)
+        buffer = self.buffers.get(key)
+        if buffer is None or buffer.dtype != dtype or len(buffer) < size:
+            capacity = max(size, 0 if buffer is None else len(buffer) * 2)
+            buffer = np.empty(capacity, dtype=dtype)
+            self.buffers[key] = buffer
+            self.allocations += 1
+        return buffer[:size].reshape(shape)
+
+
 class MeshDataEvalMode(str, Enum):
     RawData = "RawData"
     ModViewport = "Viewport"
@@ -42,6 +66,9 @@ class MeshDataEvalMode(str, Enum):
 
 class CdaeMeshBuilder:
 
+    SKIN_ATTRIBUTE_PREFIX = "cdae_skin_"
+
+
     class NpMesh:
 
         def __init__(self):
@@ -54,6 +81,9 @@ class CdaeMeshBuilder:
             self.uvs0: NDArray = None
             self.uvs1: NDArray = None
             self.colors: NDArray = None
+            # Loop and vertex of the source mesh for every vertex, only tracked for vertex animation.
+            self.source_loops: NDArray = None
+            self.source_vertices: NDArray = None
 
 
         def concatenate(self):
@@ -72,26 +102,269 @@ class CdaeMeshBuilder:
             return np.concatenate(keys, axis=1)
         
 
-        def collapse_vertices(self):
+        def get_weld_keys(self, position_tolerance: float, normal_tolerance: float, uv_tolerance: float):
+
+            def quantize(array: NDArray, tolerance: float):
+                if array.dtype == np.uint8:
+                    return array.astype(np.int64)
+                if tolerance > 0:
+                    return np.floor(array / tolerance + 0.5).astype(np.int64)
+                # Exact mode compares bit patterns, adding 0 folds -0.0 into 0.0.
+                return (array.astype(np.float32) + np.float32(0)).view(np.uint32).astype(np.int64)
+
+            keys = [quantize(self.positions, position_tolerance), quantize(self.normals, normal_tolerance)]
+            if self.uvs0 is not None:
+                keys.append(quantize(self.uvs0, uv_tolerance))
+            if self.uvs1 is not None:
+                keys.append(quantize(self.uvs1, uv_tolerance))
+            if self.colors is not None:
+                keys.append(quantize(self.colors, 0))
+            # Loops of different vertices may only meet at rest, they have to stay apart when animated.
+            if self.source_vertices is not None:
+                keys.append(self.source_vertices[:, None].astype(np.int64))
+
+            return np.concatenate(keys, axis=1)
+
+
+        @staticmethod
+        def hash_rows(keys: NDArray, seed: int = 0xcbf29ce484222325):
+            hashes = np.full(len(keys), seed, dtype=np.uint64)
+            for column in keys.T:
+                hashes ^= column.astype(np.uint64)
+                hashes *= np.uint64(0x100000001b3)
+            hashes ^= hashes >> np.uint64(33)
+            hashes *= np.uint64(0xff51afd7ed558ccd)
+            hashes ^= hashes >> np.uint64(33)
+            return hashes
+
+
+        def collapse_vertices(self, position_tolerance: float = 0.0, normal_tolerance: float = 0.0, uv_tolerance: float = 0.0) -> int:
+            """
+            Welds loops into vertices, returns the number of welded loops.
+            Rows are deduplicated by a 64-bit hash with a single 1-D sort, the full keys are only sorted on a hash collision.
+            """
+            keys = self.get_weld_keys(position_tolerance, normal_tolerance, uv_tolerance)
+            if len(keys) == 0:
+                self.indices = self.indices.astype(np.int32)
+                return 0
 
-            combined = self.concatenate()
             _, unique_indices, inverse = np.unique(
-                combined,
-                axis=0,
+                CdaeMeshBuilder.NpMesh.hash_rows(keys),
                 return_inverse=True,
                 return_index=True
             )
 
-            self.indices = inverse[self.indices].astype(np.int32)
-
-            self.positions = self.positions[unique_indices]
-            self.normals = self.normals[unique_indices]
+            if not (keys[unique_indices][inverse] == keys).all():
+                _, unique_indices, inverse = np.unique(
+                    keys,
+                    axis=0,
+                    return_inverse=True,
+                    return_index=True
+                )
+            inverse = inverse.reshape(-1)
+
+            # Keep vertices in order of first use instead of hash order.
+            order = np.argsort(unique_indices)
+            rank = np.empty(len(order), dtype=np.int32)
+            rank[order] = np.arange(len(order), dtype=np.int32)
+            unique_indices = unique_indices[order]
+
+            self.indices = rank[inverse][self.indices].astype(np.int32)
+            self.reorder_vertices(unique_indices)
+
+            return len(keys) - len(unique_indices)
+
+
+        def compute_tangents(self):
+            """Per-vertex tangents with handedness in w, accumulated per triangle and orthogonalized against the normals."""
+            tris = self.indices.reshape((-1, 3))
+            p0, p1, p2 = self.positions[tris[:, 0]], self.positions[tris[:, 1]], self.positions[tris[:, 2]]
+            t0, t1, t2 = self.uvs0[tris[:, 0]], self.uvs0[tris[:, 1]], self.uvs0[tris[:, 2]]
+
+            e1, e2 = p1 - p0, p2 - p0
+            d1, d2 = t1 - t0, t2 - t0
+            det = d1[:, 0] * d2[:, 1] - d2[:, 0] * d1[:, 1]
+            r = np.divide(1.0, det, out=np.zeros_like(det), where=np.abs(det) > 1e-12)[:, None]
+            sdir = (e1 * d2[:, 1:2] - e2 * d1[:, 1:2]) * r
+            tdir = (e2 * d1[:, 0:1] - e1 * d2[:, 0:1]) * r
+
+            flat = tris.ravel()
+            count = len(self.positions)
+            def accumulate(per_tri: NDArray):
+                per_corner = np.repeat(per_tri, 3, axis=0)
+                return np.stack([np.bincount(flat, weights=per_corner[:, i], minlength=count) for i in range(3)], axis=1)
+
+            tan = accumulate(sdir)
+            bitan = accumulate(tdir)
+            normals = self.normals.astype(np.float64)
+
+            # Gram-Schmidt, vertices without usable UVs get any vector perpendicular to the normal.
+            tan -= normals * np.einsum("ij,ij->i", normals, tan)[:, None]
+            length = np.linalg.norm(tan, axis=1)
+            invalid = length < 1e-12
+            if invalid.any():
+                axis = np.where(np.abs(normals[invalid, 0:1]) < 0.9, [[1.0, 0.0, 0.0]], [[0.0, 1.0, 0.0]])
+                fallback = np.cross(normals[invalid], axis)
+                tan[invalid] = fallback
+                length[invalid] = np.maximum(np.linalg.norm(fallback, axis=1), 1e-12)
+            tan /= length[:, None]
+
+            handedness = np.where(np.einsum("ij,ij->i", np.cross(normals, tan), bitan) < 0, -1.0, 1.0)
+            self.tangents = np.concatenate([tan, handedness[:, None]], axis=1).astype(np.float32)
+
+
+        def get_triangle_info(self) -> NDArray:
+            """The draw region info of every triangle."""
+            tri_info = np.zeros(self.indices.size // 3, dtype=np.int32)
+            for region in self.draw_regions:
+                first = region['elements_start'] // 3
+                tri_info[first:first + region['elements_count'] // 3] = region['material_index']
+            return tri_info
+
+
+        def from_triangles(self, tris: NDArray, tri_info: NDArray) -> 'CdaeMeshBuilder.NpMesh':
+            """New mesh from triangles of this one with compacted vertices, triangles must be grouped by info."""
+            info, starts, counts = np.unique(tri_info, return_index=True, return_counts=True)
+            used, inverse = np.unique(tris, return_inverse=True)
+
+            result = copy.copy(self)
+            result.indices = inverse.reshape((-1, 3)).astype(np.int32)
+            result.draw_regions = np.empty(len(info), dtype=self.draw_regions.dtype)
+            result.draw_regions['elements_start'] = starts * 3
+            result.draw_regions['elements_count'] = counts * 3
+            result.draw_regions['material_index'] = info
+            result.reorder_vertices(used)
+            return result
+
+
+        def split(self, max_triangles: int, max_vertices: int) -> 'list[CdaeMeshBuilder.NpMesh]':
+            """Splits a welded triangle list into spatially coherent pieces, each with its own compacted vertices."""
+            tris = self.indices.reshape((-1, 3))
+            pieces = split_triangles(tris, self.positions, max_triangles, max_vertices)
+            if len(pieces) < 2:
+                return [self]
+
+            # Triangles stay sorted, so every material stays one contiguous range.
+            tri_info = self.get_triangle_info()
+            return [self.from_triangles(tris[piece_tris], tri_info[piece_tris]) for piece_tris in pieces]
+
+
+        def simplify(self, ratio: float) -> 'CdaeMeshBuilder.NpMesh':
+            """Decimated copy with about ratio times the triangles, seams and borders are kept."""
+            tris = self.indices.reshape((-1, 3))
+            if len(tris) == 0:
+                return self
+            target_count = max(int(len(tris) * ratio), 1)
+            simplified, source = simplify_triangles(tris, self.positions, target_count)
+            return self.from_triangles(simplified, self.get_triangle_info()[source])
+
+
+        def set_triangles(self, tris: NDArray, tri_info: NDArray):
+            """Sets indices from triangles and their draw region info, with one region per info."""
+            order = np.argsort(tri_info, kind="stable")
+            info, starts, counts = np.unique(tri_info[order], return_index=True, return_counts=True)
+            self.indices = tris[order].astype(np.int32)
+            self.draw_regions = np.empty(len(info), dtype=[
+                ('elements_start', np.int32),
+                ('elements_count', np.int32),
+                ('material_index', np.int32),
+            ])
+            self.draw_regions['elements_start'] = starts * 3
+            self.draw_regions['elements_count'] = counts * 3
+            self.draw_regions['material_index'] = info
+
+
+        @staticmethod
+        def from_mesh(mesh: CdaeV31.Mesh) -> 'CdaeMeshBuilder.NpMesh':
+            """Welded mesh back from a built standard mesh, strips and fans become triangle lists again."""
+            npmesh = CdaeMeshBuilder.NpMesh()
+            npmesh.positions = mesh.verts.to_numpy_array(np.float32).reshape((-1, 3))
+            npmesh.normals = mesh.get_vec3f_normals().reshape((-1, 3))
+            if mesh.tangents.element_count:
+                npmesh.tangents = mesh.tangents.to_numpy_array(np.float32).reshape((-1, 4))
+            if mesh.tverts0.element_count:
+                npmesh.uvs0 = mesh.tverts0.to_numpy_array(np.float32).reshape((-1, 2))
+            if mesh.tverts1.element_count:
+                npmesh.uvs1 = mesh.tverts1.to_numpy_array(np.float32).reshape((-1, 2))
+            if mesh.colors.element_count:
+                npmesh.colors = mesh.colors.to_numpy_array(np.uint8).reshape((-1, 4))
+
+            indices = mesh.indices.to_numpy_array(np.int32)
+            regions = mesh.unpack_regions()
+            tris = [np.zeros((0, 3), dtype=np.int32)] + [region.get_triangles(indices) for region in regions]
+            info = [np.zeros(0, dtype=np.int32)] + [np.full(len(region_tris), region.raw_info & ~CdaeV31.Mesh.DrawRegion.InfoMask.TYPE_MASK, dtype=np.int32) for region, region_tris in zip(regions, tris[1:])]
+            tris, info = np.concatenate(tris), np.concatenate(info)
+
+            valid = (tris[:, 0] != tris[:, 1]) & (tris[:, 1] != tris[:, 2]) & (tris[:, 0] != tris[:, 2])
+            npmesh.set_triangles(tris[valid], info[valid])
+            return npmesh
+
+
+        @staticmethod
+        def merge(npmeshes: 'list[CdaeMeshBuilder.NpMesh]', matrices: list[NDArray]) -> 'CdaeMeshBuilder.NpMesh':
+            """
+            Bakes (3, 4) transforms into meshes and merges them, with one draw region per material.
+            Attributes only some meshes have are filled with neutral values for the others.
+            """
+            def gather(name: str, fill: NDArray):
+                arrays = [getattr(npmesh, name) for npmesh in npmeshes]
+                if all(array is None for array in arrays):
+                    return None
+                return [array if array is not None else np.tile(fill, (len(npmesh.positions), 1)) for array, npmesh in zip(arrays, npmeshes)]
+
+            def rotate(vectors: NDArray, matrix: NDArray):
+                rotated = vectors.astype(np.float64) @ matrix[:, :3].T
+                return rotated / np.maximum(np.linalg.norm(rotated, axis=1), 1e-12)[:, None]
+
+            result = CdaeMeshBuilder.NpMesh()
+            result.positions = np.concatenate([npmesh.positions @ matrix[:, :3].T + matrix[:, 3] for npmesh, matrix in zip(npmeshes, matrices)]).astype(np.float32)
+            result.normals = np.concatenate([rotate(npmesh.normals, matrix) for npmesh, matrix in zip(npmeshes, matrices)]).astype(np.float32)
+
+            tangents = gather("tangents", np.array([1.0, 0.0, 0.0, 1.0], dtype=np.float32))
+            if tangents is not None:
+                result.tangents = np.concatenate([
+                    np.concatenate([rotate(tangent[:, :3], matrix), tangent[:, 3:]], axis=1) for tangent, matrix in zip(tangents, matrices)
+                ]).astype(np.float32)
+            for name, fill in (("uvs0", np.zeros(2, dtype=np.float32)), ("uvs1", np.zeros(2, dtype=np.float32)), ("colors", np.full(4, 255, dtype=np.uint8))):
+                arrays = gather(name, fill)
+                setattr(result, name, np.concatenate(arrays) if arrays is not None else None)
+
+            offsets = np.cumsum([0] + [len(npmesh.positions) for npmesh in npmeshes])[:-1]
+            tris = np.concatenate([npmesh.indices.reshape((-1, 3)) + offset for npmesh, offset in zip(npmeshes, offsets)])
+            tri_info = np.concatenate([npmesh.get_triangle_info() for npmesh in npmeshes])
+            result.set_triangles(tris, tri_info)
+            return result
+
+
+        def reorder_vertices(self, order: NDArray):
+
+            self.positions = self.positions[order]
+            self.normals = self.normals[order]
+            if self.tangents is not None:
+                self.tangents = self.tangents[order]
             if self.uvs0 is not None:
-                self.uvs0 = self.uvs0[unique_indices]
+                self.uvs0 = self.uvs0[order]
             if self.uvs1 is not None:
-                self.uvs1 = self.uvs1[unique_indices]
+                self.uvs1 = self.uvs1[order]
             if self.colors is not None:
-                self.colors = self.colors[unique_indices]
+                self.colors = self.colors[order]
+            if self.source_loops is not None:
+                self.source_loops = self.source_loops[order]
+                self.source_vertices = self.source_vertices[order]
+
+
+
+    @dataclass
+    class Skin:
+        """Bones of a skinned object, and the influences of the mesh being built."""
+        bones: list[str]
+        groups: NDArray
+        group_names: list[str]
+        matrix: NDArray
+        initial_transforms: NDArray
+        offsets: NDArray = None
+        bone_index: NDArray = None
+        weights: NDArray = None
 
 
 
@@ -100,41 +373,248 @@ class CdaeMeshBuilder:
         self.apply_scale: bool = True
         self.scale = Vec3F(1,1,1)
         self.material_indexer = material_indexer
+        self.arena = CdaeBufferArena()
         self.use_uv_hint: bool = False
         self.uv0_hint: str = None
         self.uv1_hint: str = None
         self.compute_tangents: bool = False
         self.compute_encoded_normals: bool = False
+        self.use_encoded_normals: bool = False
+        self.encoded_normals_max_error: float = 2.0
+        self.strip_indices_before: int = 0
+        self.strip_indices_after: int = 0
+        self.weld_position_tolerance: float = 0.0
+        self.weld_normal_tolerance: float = 0.0
+        self.weld_uv_tolerance: float = 0.0
+        self.optimize_enabled: bool = False
+        self.optimizer = CdaeMeshOptimizer()
+        self.strips_enabled: bool = False
+        self.chunk_memory_limit: float = 0.0
+        self.split_max_vertices: int = 0
+        self.split_max_triangles: int = 0
+        self.loop_count: int = 0
+        self.welded_count: int = 0
         self.eval_mode = MeshDataEvalMode.Depsgraph
         self.depsgraph: bpy.types.Depsgraph = None
+        self.modifier_backup: list[tuple[bpy.types.Modifier, bool]] = []
+        self.temporary_modifiers: dict[bpy.types.Object, tuple[bpy.types.Modifier, bpy.types.NodeTree]] = {}
+        self.lod_ratios: dict[bpy.types.Object, list[float]] = {}
+        self.mesh_cache: dict[tuple, dict[float, list[CdaeV31.Mesh]]] = {}
+        self.cache_hits: int = 0
+        self.hull_count: int = 0
+        self.hull_max_triangles: int = 64
+        self.hull_cache: dict[tuple, list[CdaeV31.Mesh]] = {}
+        self.hull_triangles_before: int = 0
+        self.hull_triangles_after: int = 0
+        self.vertex_animation_tolerance: float = 1e-4
+        self.vertex_frames: dict[bpy.types.Object, tuple[NDArray, NDArray, NDArray]] = {}
+        self.frames: tuple[NDArray, NDArray, NDArray] = None
+        self.skin_enabled: bool = False
+        self.skin_max_influences: int = 4
+        self.skins: dict[bpy.types.Object, CdaeMeshBuilder.Skin] = {}
+        self.skin: CdaeMeshBuilder.Skin = None
+
+
+    def tracks_sources(self) -> bool:
+        """Vertex animation and skinning need the source vertex of every built vertex."""
+        return self.frames is not None or self.skin is not None
+
+
+    @staticmethod
+    def get_armature(obj: bpy.types.Object) -> bpy.types.Object | None:
+        for mod in obj.modifiers:
+            if mod.type == 'ARMATURE' and mod.object is not None:
+                return mod.object
+        return None
+
+
+    @staticmethod
+    def get_skin_bones(obj: bpy.types.Object, armature: bpy.types.Object) -> list[str]:
+        """Deform bones of the armature that have a vertex group on obj."""
+        group_names = set(group.name for group in obj.vertex_groups)
+        return [bone.name for bone in armature.data.bones if bone.use_deform and bone.name in group_names]
+
+
+    def get_skin(self, obj: bpy.types.Object) -> 'CdaeMeshBuilder.Skin | None':
+        """Deform bones with a vertex group on obj, inverse bind poses map shape space at bind pose to bone space."""
+        armature = CdaeMeshBuilder.get_armature(obj)
+        if armature is None:
+            return None
+        skin = self.skins.get(obj)
+        if skin is not None:
+            return skin
+
+        group_names = [group.name for group in obj.vertex_groups]
+        bones = CdaeMeshBuilder.get_skin_bones(obj, armature)
+        if not bones:
+            return None
+        groups = np.array([bones.index(name) if name in bones else -1 for name in group_names], dtype=np.int32)
+        initial_transforms = np.array([(armature.matrix_world @ armature.data.bones[name].matrix_local).inverted() for name in bones], dtype=np.float32)
+        skin = CdaeMeshBuilder.Skin(bones, groups, group_names, np.array(obj.matrix_world, dtype=np.float64)[:3], initial_transforms)
+        self.skins[obj] = skin
+        return skin
+
+
+    @staticmethod
+    def prune_weights(vertices: NDArray, bones: NDArray, weights: NDArray, vertex_count: int, max_influences: int) -> tuple[NDArray, NDArray, NDArray]:
+        """
+        Keeps the max_influences largest positive weights of every vertex and renormalizes them to sum to one.
+        Returns influences per vertex in CSR layout: offsets, bone indices and weights, heaviest first.
+        """
+        keep = (bones >= 0) & (weights > 0)
+        vertices, bones, weights = vertices[keep], bones[keep], weights[keep].astype(np.float64)
+
+        order = np.lexsort((-weights, vertices))
+        vertices, bones, weights = vertices[order], bones[order], weights[order]
+        counts = np.bincount(vertices, minlength=vertex_count)
+        starts = np.cumsum(counts) - counts
+        ranks = np.arange(len(vertices)) - starts[vertices]
+
+        keep = ranks < max_influences
+        vertices, bones, weights = vertices[keep], bones[keep], weights[keep]
+        totals = np.bincount(vertices, weights=weights, minlength=vertex_count)
+        weights /= totals[vertices]
+
+        offsets = np.zeros(vertex_count + 1, dtype=np.int64)
+        np.cumsum(np.bincount(vertices, minlength=vertex_count), out=offsets[1:])
+        return offsets, bones.astype(np.int32), weights.astype(np.float32)
+
+
+    def get_group_weights(self, group_names: list[str]) -> tuple[NDArray, NDArray, NDArray]:
+        """
+        (vertex, group, weight) of every bone group entry of the current mesh.
+        Evaluated meshes carry the bone groups as float point attributes, see add_weight_attributes, fetched in bulk.
+        Blender has no bulk accessor for deform weights, raw data meshes are gathered in one Python pass over vertex.groups.
+        """
+        attributes = getattr(self.mesh, "attributes", None)
+        vertices, groups, weights = [], [], []
+        missing = []
+        for index, name in enumerate(group_names):
+            if self.skin.groups[index] < 0:
+                continue
+            attribute = attributes.get(CdaeMeshBuilder.SKIN_ATTRIBUTE_PREFIX + name) if attributes is not None else None
+            if attribute is None or attribute.domain != 'POINT' or attribute.data_type != 'FLOAT':
+                missing.append(index)
+                continue
+            values = self.fetch("group_weight", attribute.data, "value", 1).reshape(-1)
+            nonzero = np.nonzero(values)[0]
+            vertices.append(nonzero)
+            groups.append(np.full(len(nonzero), index, dtype=np.int32))
+            weights.append(values[nonzero])
+
+        if missing:
+            entries = np.array([(index, element.group, element.weight) for index, vertex in enumerate(self.mesh.vertices) for element in vertex.groups], dtype=np.float64).reshape((-1, 3))
+            flat_vertices, flat_groups, flat_weights = entries[:, 0].astype(np.int64), entries[:, 1].astype(np.int32), entries[:, 2].astype(np.float32)
+            keep = np.isin(flat_groups, missing)
+            vertices.append(flat_vertices[keep])
+            groups.append(flat_groups[keep])
+            weights.append(flat_weights[keep])
+
+        if not vertices:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        return np.concatenate(vertices), np.concatenate(groups), np.concatenate(weights)
+
+
+    def set_skin_weights(self):
+        """Pruned influences of the current mesh, per source vertex."""
+        vertices, groups, weights = self.get_group_weights(self.skin.group_names)
+        bones = self.skin.groups[groups] if len(groups) else np.zeros(0, dtype=np.int32)
+        self.skin.offsets, self.skin.bone_index, self.skin.weights = CdaeMeshBuilder.prune_weights(
+            vertices, bones, weights, len(self.mesh.vertices), self.skin_max_influences
+        )
+
+
+    def set_skin_output(self, mesh_out: CdaeV31.Mesh, npmesh: 'CdaeMeshBuilder.NpMesh'):
+        """Influences of every built vertex, expanded from those of its source vertex."""
+        skin = self.skin
+        sources = npmesh.source_vertices
+        counts = skin.offsets[sources + 1] - skin.offsets[sources]
+        vertex_index = np.repeat(np.arange(len(sources), dtype=np.int32), counts)
+        ranks = np.arange(len(vertex_index)) - np.repeat(np.cumsum(counts) - counts, counts)
+        influences = skin.offsets[sources][vertex_index] + ranks
+
+        mesh_out.type = CdaeV31.MeshType.SKIN
+        mesh_out.initial_transforms.set_numpy_array(skin.initial_transforms)
+        mesh_out.vertex_index.set_numpy_array(vertex_index)
+        mesh_out.bone_index.set_numpy_array(skin.bone_index[influences])
+        mesh_out.weight.set_numpy_array(skin.weights[influences])
+        mesh_out.node_index.set_numpy_array(np.arange(len(skin.bones), dtype=np.int32))
+
+        unweighted = int((counts == 0).sum())
+        if unweighted:
+            print(f"skin: {unweighted} vertices without bone weights")
 
 
     @staticmethod
-    def get_radius(bounds: Box6F):
-        return math.sqrt(bounds.range().max_unit()*2)
+    def get_bounding_sphere(points: NDArray, rounds: int = 8) -> tuple[NDArray, float]:
+        """
+        Near-minimal sphere around points, Ritter's sphere tightened by shrinking and regrowing it (Ericson 2004).
+        Growing always moves towards the farthest point, so every step is one vectorized pass.
+        """
+        points = points.astype(np.float64)
+        extremes = points[np.concatenate([points.argmin(axis=0), points.argmax(axis=0)])]
+        pair_distances = np.linalg.norm(extremes[:, None] - extremes[None, :], axis=2)
+        i, j = np.unravel_index(np.argmax(pair_distances), pair_distances.shape)
+
+        def grow(center: NDArray, radius: float):
+            while True:
+                distances = np.linalg.norm(points - center, axis=1)
+                far = int(np.argmax(distances))
+                if distances[far] <= radius:
+                    return center, radius
+                new_radius = (radius + distances[far]) / 2 * (1 + 1e-9)
+                center = center + (points[far] - center) * ((distances[far] - new_radius) / distances[far])
+                radius = new_radius
+
+        best_center, best_radius = grow((extremes[i] + extremes[j]) / 2, pair_distances[i, j] / 2)
+        for shrink in np.linspace(0.95, 0.995, rounds):
+            center, radius = grow(best_center, best_radius * shrink)
+            if radius < best_radius:
+                best_center, best_radius = center, radius
+
+        return best_center, float(best_radius)
+
+
+    @staticmethod
+    def set_bounds(mesh: CdaeV31.Mesh, positions: NDArray):
+        mins = positions.min(axis=0).astype(float)
+        maxs = positions.max(axis=0).astype(float)
+        mesh.bounds = Box6F(*mins, *maxs)
+        center, mesh.radius = CdaeMeshBuilder.get_bounding_sphere(positions)
+        mesh.center = Vec3F(*center)
+
+
+    def fetch(self, key: str, collection, prop: str, size: int, dtype = np.float32) -> NDArray:
+        """foreach_get into an arena buffer, the result is only valid until the next mesh."""
+        data = self.arena.get(key, len(collection) * size, dtype)
+        collection.foreach_get(prop, data)
+        return data.reshape((-1, size))
 
 
     def get_vtx_indices(self):
-        loop_vertex_indices = np.empty(len(self.mesh.loops), dtype=np.int32)
-        self.mesh.loops.foreach_get("vertex_index", loop_vertex_indices)
-        return loop_vertex_indices
+        return self.fetch("vertex_index", self.mesh.loops, "vertex_index", 1, np.int32).reshape(-1)
 
 
     def map_vtx_to_loop(self, vtx_data: NDArray, size: int, indices):
         vtx_data = vtx_data.reshape((-1, size))
-        return vtx_data[indices]
+        return np.take(vtx_data, indices, axis=0, out=self.arena.get("loop_" + str(size), (len(indices), size), vtx_data.dtype))
     
 
     def get_vtx_data(self, key: str, size: int, indices):
-        vertex_data = np.empty(len(self.mesh.vertices) * size, dtype=np.float32)
-        self.mesh.vertices.foreach_get(key, vertex_data)
-        return self.map_vtx_to_loop(vertex_data, size, indices)
+        return self.map_vtx_to_loop(self.fetch(key, self.mesh.vertices, key, size), size, indices)
+
+
+    def get_vtx_positions(self):
+        """Positions through the generic attribute API when available, vertices.co otherwise."""
+        attributes = getattr(self.mesh, "attributes", None)
+        position = attributes.get("position") if attributes is not None else None
+        if position is not None and position.data_type == 'FLOAT_VECTOR':
+            return self.fetch("co", position.data, "vector", 3)
+        return self.fetch("co", self.mesh.vertices, "co", 3)
 
 
     def get_loop_data(self, key: str, size: int):
-        loop_data = np.empty(len(self.mesh.loops) * size, dtype=np.float32)
-        self.mesh.loops.foreach_get(key, loop_data)
-        return loop_data.reshape((-1, size))
+        return self.fetch(key, self.mesh.loops, key, size)
     
 
     def get_uv_layer(self, index: int, uv_hint: str):
@@ -158,14 +638,13 @@ class CdaeMeshBuilder:
         if uv_layer is None:
             return None
         
-        uv_data = np.empty(len(uv_layer) * 2, dtype=np.float32)
-        uv_layer.foreach_get("uv", uv_data)
-        uv_data = uv_data.reshape((-1, 2))
-        uv_data[:, 1] = 1.0 - uv_data[:, 1]
+        uv_data = self.fetch(f"uv{index}", uv_layer, "uv", 2)
+        np.subtract(1.0, uv_data[:, 1], out=uv_data[:, 1])
         return uv_data
         
 
-    def get_color_data(self, indices):
+    def get_color_source(self):
+        """Raw float colors of the first color attribute and whether they are stored per vertex."""
 
         if len(self.mesh.color_attributes) > 0:
             layer_name = self.mesh.color_attributes[0].name
@@ -176,107 +655,357 @@ class CdaeMeshBuilder:
         if not color_layer:
             return None
 
-        loop_count = len(self.mesh.loops)
-        vert_count = len(self.mesh.vertices)
-        components = 4
-
+        # RNA only exposes colors as floats, byte colors included.
         if color_layer.domain == 'CORNER':
-            raw = np.empty(loop_count * components, dtype=np.float32)
-            color_layer.data.foreach_get("color", raw)
-            colors = raw.reshape((loop_count, components))
+            return self.fetch("color", color_layer.data, "color", 4), False
 
         elif color_layer.domain == 'POINT':
-            raw = np.empty(vert_count * components, dtype=np.float32)
-            color_layer.data.foreach_get("color", raw)
-            colors = raw.reshape((vert_count, components))
+            return self.fetch("color", color_layer.data, "color", 4), True
 
-            colors = colors[indices]
+        return None
+        
 
-        else:
+    def get_color_data(self, indices):
+
+        source = self.get_color_source()
+        if source is None:
             return None
 
-        colors_u8 = (colors * 255.0).astype(np.uint8)
+        colors, per_vertex = source
+        np.multiply(colors, 255.0, out=colors)
+        colors_u8 = self.arena.get("color_u8", (len(indices), 4), np.uint8)
+        np.copyto(colors_u8, colors[indices] if per_vertex else colors, casting="unsafe")
         return colors_u8
         
 
-    def build_from_mesh(self, mesh: bpy.types.Mesh)-> CdaeV31.Mesh:
-        
-        if any(len(p.vertices) > 4 for p in mesh.polygons):
-            bm = bmesh.new()
-            bm.from_mesh(mesh)
-            bmesh.ops.triangulate(bm, faces=bm.faces)
-            bm.to_mesh(mesh)
-            bm.free()
-
-        self.mesh = mesh
-        mesh.calc_loop_triangles()
+    def get_material_lookup(self, slots: NDArray):
+        """Maps local material slots to global material indices, the extra last slot stands for no material."""
+        materials = self.mesh.materials
+        lookup = np.zeros(len(materials) + 1, dtype=np.int32)
+        for slot in np.unique(slots).tolist():
+            lookup[slot] = self.material_indexer.get_index(materials[slot] if slot < len(materials) else None)
+        return lookup
 
-        vertex_indices = self.get_vtx_indices()
 
-        npmesh = CdaeMeshBuilder.NpMesh()
-        npmesh.positions = self.get_vtx_data("co", 3, vertex_indices)
-        npmesh.normals = self.get_loop_data("normal", 3)
-        npmesh.uvs0 = self.get_uv_data(0, self.uv0_hint)
-        npmesh.uvs1 = self.get_uv_data(1, self.uv1_hint)
-        npmesh.colors = self.get_color_data(vertex_indices)
+    def get_triangle_data(self):
 
-        if self.compute_tangents and npmesh.uvs0 is not None and len(npmesh.uvs0) > 0:
-            mesh.calc_tangents()
-            npmesh.tangents = self.get_loop_data("tangent", 4)
+        tri_loops = self.fetch("tri_loops", self.mesh.loop_triangles, "loops", 3, np.int32)
+        tri_polys = self.fetch("tri_polys", self.mesh.loop_triangles, "polygon_index", 1, np.int32).reshape(-1)
 
+        poly_materials = self.fetch("poly_materials", self.mesh.polygons, "material_index", 1, np.int32).reshape(-1)
+        np.minimum(poly_materials, len(self.mesh.materials), out=poly_materials)
 
-        material_ranges: defaultdict[int, list] = defaultdict(list)
-        for tri in mesh.loop_triangles:
-            poly = mesh.polygons[tri.polygon_index]
-            mat = mesh.materials[poly.material_index] if poly.material_index < len(mesh.materials) else None
-            global_mat_index = self.material_indexer.get_index(mat)
+        tri_materials = poly_materials[tri_polys]
+        lookup = self.get_material_lookup(tri_materials)
+        tri_materials = lookup[tri_materials]
 
-            material_ranges[global_mat_index].append([
-                tri.loops[2],
-                tri.loops[1],
-                tri.loops[0]
-            ])
-
-        
-        indices_list = []
-        for mat_index in material_ranges:
-            matrange = material_ranges[mat_index]
-            indices_list.extend(matrange)
-        npmesh.indices = np.array(indices_list, dtype=np.int32)
-
-
-        draw_regions = []
-        offset = 0
-        for mat_index in material_ranges:
-            count = len(material_ranges[mat_index])
-            draw_regions.append((offset * 3, count * 3, mat_index | CdaeV31.Mesh.DrawRegion.InfoMask.INDEXED))
-            offset += count
+        # Stable, so triangles keep their original order within a material.
+        order = np.argsort(tri_materials, kind="stable")
+        indices = tri_loops[order][:, ::-1]
+        mat_indices, starts, counts = np.unique(tri_materials[order], return_index=True, return_counts=True)
 
         DrawRegion = np.dtype([
             ('elements_start', np.int32),
             ('elements_count', np.int32),
             ('material_index', np.int32),
         ])
-        npmesh.draw_regions = np.array(draw_regions, dtype=DrawRegion)
+        draw_regions = np.empty(len(mat_indices), dtype=DrawRegion)
+        draw_regions['elements_start'] = starts * 3
+        draw_regions['elements_count'] = counts * 3
+        draw_regions['material_index'] = mat_indices | CdaeV31.Mesh.DrawRegion.InfoMask.INDEXED
+
+        return np.ascontiguousarray(indices, dtype=np.int32), draw_regions
+
+
+    def get_chunk_size(self, npmesh: 'CdaeMeshBuilder.NpMesh') -> int:
+        """Loops per chunk so the working set of one chunk stays below chunk_memory_limit (MiB)."""
+        floats = 3 + 3
+        floats += 2 if npmesh.uvs0 is not None else 0
+        floats += 2 if npmesh.uvs1 is not None else 0
+        keys = floats + (4 if npmesh.colors is not None else 0)
+        # Gathered attributes, int64 keys and their temporaries, hashes, sort order and inverse.
+        bytes_per_loop = floats * 4 * 2 + keys * 8 * 2 + 8 * 6
+        return max(int(self.chunk_memory_limit * 2**20 / bytes_per_loop), 1024)
+
+
+    def build_welded_chunked(self, vertex_indices: NDArray, indices: NDArray) -> 'CdaeMeshBuilder.NpMesh':
+        """
+        Welds loop chunks one at a time into a global vertex set, so no full per-loop copy of all attributes
+        and no full key matrix is ever built. Within a chunk, rows with equal hashes are verified against their keys.
+        Across chunks, vertices are matched by one 64-bit hash and confirmed by a second one, so two distinct vertices
+        only merge if both hashes collide, and a hash that finds the wrong candidate only costs a missed weld.
+        """
+        co = self.get_vtx_positions()
+        normals = self.get_loop_data("normal", 3)
+        uvs0 = self.get_uv_data(0, self.uv0_hint)
+        uvs1 = self.get_uv_data(1, self.uv1_hint)
+        color_source = self.get_color_source()
+
+        hash_rows = CdaeMeshBuilder.NpMesh.hash_rows
+        loop_count = len(vertex_indices)
+        loop_to_vertex = np.empty(loop_count, dtype=np.int32)
+
+        sorted_hashes = np.empty(0, dtype=np.uint64)
+        sorted_ids = np.empty(0, dtype=np.int32)
+        check_hashes = np.empty(0, dtype=np.uint64)
+        chunks: list[CdaeMeshBuilder.NpMesh] = []
+        vertex_count = 0
+
+        chunk = CdaeMeshBuilder.NpMesh()
+        chunk.uvs0, chunk.uvs1 = uvs0, uvs1
+        chunk.colors = None if color_source is None else color_source[0][:0]
+        chunk_size = self.get_chunk_size(chunk)
+
+        for start in range(0, loop_count, chunk_size):
+            stop = min(start + chunk_size, loop_count)
+
+            chunk = CdaeMeshBuilder.NpMesh()
+            chunk.positions = co[vertex_indices[start:stop]]
+            if self.tracks_sources():
+                chunk.source_loops = np.arange(start, stop, dtype=np.int32)
+                chunk.source_vertices = vertex_indices[start:stop].astype(np.int32)
+            chunk.normals = normals[start:stop]
+            chunk.uvs0 = None if uvs0 is None else uvs0[start:stop]
+            chunk.uvs1 = None if uvs1 is None else uvs1[start:stop]
+            if color_source is not None:
+                colors, per_vertex = color_source
+                colors = colors[vertex_indices[start:stop]] if per_vertex else colors[start:stop]
+                chunk.colors = (colors * 255.0).astype(np.uint8)
+
+            keys = chunk.get_weld_keys(self.weld_position_tolerance, self.weld_normal_tolerance, self.weld_uv_tolerance)
+            hashes = hash_rows(keys)
+            checks = hash_rows(keys, 0x84222325cbf29ce4)
+
+            # Dedupe within the chunk, keeping first use order, hash collisions fall back to sorting the keys.
+            _, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+            inverse = inverse.reshape(-1)
+            if not (keys[first][inverse] == keys).all():
+                _, first, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+                inverse = inverse.reshape(-1)
+            del keys
+            order = np.argsort(first)
+            rank = np.empty(len(order), dtype=np.int32)
+            rank[order] = np.arange(len(order), dtype=np.int32)
+            first = first[order]
+            inverse = rank[inverse]
+            hashes, checks = hashes[first], checks[first]
+
+            # Match against vertices of earlier chunks.
+            ids = np.full(len(first), -1, dtype=np.int32)
+            if len(sorted_hashes) > 0:
+                pos = np.minimum(np.searchsorted(sorted_hashes, hashes), len(sorted_hashes) - 1)
+                candidates = sorted_ids[pos]
+                found = sorted_hashes[pos] == hashes
+                found[found] = check_hashes[candidates[found]] == checks[found]
+                ids[found] = candidates[found]
+
+            new = ids < 0
+            new_count = int(new.sum())
+            ids[new] = np.arange(vertex_count, vertex_count + new_count, dtype=np.int32)
+            vertex_count += new_count
+            loop_to_vertex[start:stop] = ids[inverse]
+
+            if new_count > 0:
+                chunk.reorder_vertices(first[new])
+                chunks.append(chunk)
+                check_hashes = np.concatenate([check_hashes, checks[new]])
+                merged_hashes = np.concatenate([sorted_hashes, hashes[new]])
+                merged_ids = np.concatenate([sorted_ids, ids[new]])
+                merge_order = np.argsort(merged_hashes, kind="stable")
+                sorted_hashes, sorted_ids = merged_hashes[merge_order], merged_ids[merge_order]
+
+        del sorted_hashes, sorted_ids, check_hashes
+
+        # Join one attribute at a time and release its chunks right away, so the output is never held twice.
+        def gather(name: str, empty: NDArray):
+            parts = [getattr(c, name) for c in chunks]
+            for c in chunks:
+                setattr(c, name, None)
+            return np.concatenate(parts) if parts else empty
 
+        npmesh = CdaeMeshBuilder.NpMesh()
+        npmesh.positions = gather("positions", co[:0])
+        npmesh.normals = gather("normals", normals[:0])
+        if uvs0 is not None:
+            npmesh.uvs0 = gather("uvs0", uvs0[:0])
+        if uvs1 is not None:
+            npmesh.uvs1 = gather("uvs1", uvs1[:0])
+        if color_source is not None:
+            npmesh.colors = gather("colors", np.empty((0, 4), dtype=np.uint8))
+        if self.tracks_sources():
+            npmesh.source_loops = gather("source_loops", np.empty(0, dtype=np.int32))
+            npmesh.source_vertices = gather("source_vertices", np.empty(0, dtype=np.int32))
+        npmesh.indices = loop_to_vertex[indices]
+
+        self.loop_count += loop_count
+        self.welded_count += loop_count - vertex_count
+        return npmesh
+
+
+    def build_from_mesh(self, mesh: bpy.types.Mesh)-> CdaeV31.Mesh:
+        return self.build_output(self.build_npmesh(mesh))
+
+
+    def build_pieces_from_mesh(self, mesh: bpy.types.Mesh) -> list[CdaeV31.Mesh]:
+        """Like build_from_mesh, but splits meshes over the vertex or triangle budget into several."""
+        return self.build_pieces(self.build_npmesh(mesh))
+
+
+    def build_levels_from_mesh(self, mesh: bpy.types.Mesh, ratios: list[float] = ()) -> dict[float, list[CdaeV31.Mesh]]:
+        """Pieces for the full mesh under ratio 1.0, and for each of ratios a decimated version."""
+        npmesh = self.build_npmesh(mesh)
+
+        # Decimate the welded mesh before build_output reorders or stripifies it.
+        levels = {ratio: npmesh.simplify(ratio) for ratio in ratios}
+        levels[1.0] = npmesh
+        return {ratio: self.build_pieces(level) for ratio, level in levels.items()}
+
+
+    def build_hulls_from_mesh(self, mesh: bpy.types.Mesh, ratios: list[float] = ()) -> dict[float, list[CdaeV31.Mesh]]:
+        return {1.0: self.build_hulls(self.build_npmesh(mesh))}
+
+
+    def build_hulls(self, npmesh: 'CdaeMeshBuilder.NpMesh') -> list[CdaeV31.Mesh]:
+        """
+        Up to hull_count convex hulls of hull_max_triangles each, one mesh per hull, with the material of the first draw region.
+        Cached by a hash of the welded geometry, so equal meshes of different datablocks share their hulls.
+        Flat meshes have no hull and are built as they are.
+        """
+        tris = npmesh.indices.reshape((-1, 3))
+        key = (hash(npmesh.positions.tobytes()), hash(tris.tobytes()), self.hull_count, self.hull_max_triangles)
+        meshes = self.hull_cache.get(key)
+        if meshes is not None:
+            self.cache_hits += 1
+            return meshes
+
+        hulls = get_convex_decomposition(tris, npmesh.positions, self.hull_count, self.hull_max_triangles)
+        if not hulls:
+            return self.build_pieces(npmesh)
+
+        info = npmesh.draw_regions['material_index'][0] if len(npmesh.draw_regions) else 0
+        meshes = []
+        for points, hull_tris in hulls:
+            used, inverse = np.unique(hull_tris, return_inverse=True)
+            hull_tris = inverse.reshape((-1, 3))
+
+            hull = CdaeMeshBuilder.NpMesh()
+            hull.positions = points[used].astype(np.float32)
+            face_normals = np.cross(hull.positions[hull_tris[:, 1]] - hull.positions[hull_tris[:, 0]], hull.positions[hull_tris[:, 2]] - hull.positions[hull_tris[:, 0]])
+            normals = np.zeros((len(used), 3))
+            for corner in range(3):
+                np.add.at(normals, hull_tris[:, corner], face_normals)
+            hull.normals = (normals / np.maximum(np.linalg.norm(normals, axis=1), 1e-12)[:, None]).astype(np.float32)
+            hull.set_triangles(hull_tris, np.full(len(hull_tris), info, dtype=np.int32))
+            meshes.append(self.build_output(hull))
+
+        self.hull_triangles_before += len(tris)
+        self.hull_triangles_after += sum(len(hull_tris) for _, hull_tris in hulls)
+        self.hull_cache[key] = meshes
+        return meshes
+
+
+    def build_pieces(self, npmesh: 'CdaeMeshBuilder.NpMesh') -> list[CdaeV31.Mesh]:
+        if self.split_max_vertices > 0 or self.split_max_triangles > 0:
+            pieces = npmesh.split(self.split_max_triangles, self.split_max_vertices)
+        else:
+            pieces = [npmesh]
+        return [self.build_output(piece) for piece in pieces]
+
+
+    def build_npmesh(self, mesh: bpy.types.Mesh) -> 'CdaeMeshBuilder.NpMesh':
+        
+        # Loop triangles already cover n-gons and reference the original loops, no triangulated copy is needed.
+        self.mesh = mesh
+        mesh.calc_loop_triangles()
+
+        vertex_indices = self.get_vtx_indices()
+        indices, draw_regions = self.get_triangle_data()
+        if self.skin is not None:
+            self.set_skin_weights()
+
+        if self.chunk_memory_limit > 0:
+            npmesh = self.build_welded_chunked(vertex_indices, indices)
+
+        else:
+            npmesh = CdaeMeshBuilder.NpMesh()
+            npmesh.positions = self.map_vtx_to_loop(self.get_vtx_positions(), 3, vertex_indices)
+            npmesh.normals = self.get_loop_data("normal", 3)
+            npmesh.uvs0 = self.get_uv_data(0, self.uv0_hint)
+            npmesh.uvs1 = self.get_uv_data(1, self.uv1_hint)
+            npmesh.colors = self.get_color_data(vertex_indices)
+            npmesh.indices = indices
+            if self.tracks_sources():
+                npmesh.source_loops = np.arange(len(vertex_indices), dtype=np.int32)
+                npmesh.source_vertices = vertex_indices.astype(np.int32)
+
+            self.loop_count += len(npmesh.positions)
+            self.welded_count += npmesh.collapse_vertices(self.weld_position_tolerance, self.weld_normal_tolerance, self.weld_uv_tolerance)
+
+        npmesh.draw_regions = draw_regions
+
+        if self.compute_tangents and npmesh.uvs0 is not None and len(npmesh.uvs0) > 0:
+            npmesh.compute_tangents()
+
+        return npmesh
+
+
+    def build_output(self, npmesh: 'CdaeMeshBuilder.NpMesh') -> CdaeV31.Mesh:
 
         mesh_out = CdaeV31.Mesh()
         mesh_out.type = CdaeV31.MeshType.STANDARD
 
-        npmesh.collapse_vertices()
+        if self.optimize_enabled:
+            self.optimizer.optimize(npmesh)
+        if self.strips_enabled:
+            before, after = self.optimizer.stripify(npmesh)
+            self.strip_indices_before += before
+            self.strip_indices_after += after
         mesh_out.draw_regions.set_numpy_array(npmesh.draw_regions)
         mesh_out.indices.set_numpy_array(npmesh.indices)
-        mesh_out.verts.set_numpy_array(npmesh.positions)
-        mesh_out.norms.set_numpy_array(npmesh.normals)
 
-        if self.compute_encoded_normals:
-            encoded_norms = np.zeros(len(npmesh.normals), dtype=np.uint8)
-            for i in range(len(npmesh.normals)):
-                encoded_norms[i] = Torque3D.encode_normal(npmesh.normals[i])
+        # Vertex animation frames are stored one after the other, each with vertsPerFrame positions and normals.
+        frame_count = 1
+        positions, normals, tangents = npmesh.positions, npmesh.normals, npmesh.tangents
+        if self.frames is not None and npmesh.source_loops is not None:
+            frame_positions, frame_normals, _ = self.frames
+            frame_count = len(frame_positions)
+            positions = frame_positions[:, npmesh.source_vertices].reshape((-1, 3))
+            normals = frame_normals[:, npmesh.source_loops].reshape((-1, 3))
+            normals = (normals / np.maximum(np.linalg.norm(normals, axis=1), 1e-12)[:, None]).astype(np.float32)
+            if tangents is not None:
+                tangents = np.tile(tangents, (frame_count, 1))
+
+        # Skinned meshes are stored in shape space at bind pose, the inverse bind poses take them to bone space.
+        if self.skin is not None and npmesh.source_vertices is not None:
+            self.set_skin_output(mesh_out, npmesh)
+            rotation, translation = self.skin.matrix[:, :3], self.skin.matrix[:, 3]
+            positions = (positions @ rotation.T + translation).astype(np.float32)
+            normals = normals @ rotation.T
+            normals = (normals / np.maximum(np.linalg.norm(normals, axis=1), 1e-12)[:, None]).astype(np.float32)
+            if tangents is not None:
+                rotated = tangents[:, :3] @ rotation.T
+                rotated /= np.maximum(np.linalg.norm(rotated, axis=1), 1e-12)[:, None]
+                tangents = np.concatenate([rotated, tangents[:, 3:]], axis=1).astype(np.float32)
+
+        mesh_out.verts.set_numpy_array(positions)
+
+        use_encoded_normals = False
+        if self.compute_encoded_normals or self.use_encoded_normals:
+            encoded_norms = Torque3D.encode_normals(normals)
             mesh_out.encoded_norms.set_numpy_array(encoded_norms)
 
-        if npmesh.tangents is not None:
-            mesh_out.tangents.set_numpy_array(npmesh.tangents)
+            # Only drop the float normals if no normal moves further than the allowed angle, the table alone averages 4-5 degrees.
+            if self.use_encoded_normals and len(encoded_norms) > 0:
+                error = Torque3D.get_encoding_error(normals, encoded_norms).max()
+                use_encoded_normals = error <= self.encoded_normals_max_error
+
+        if use_encoded_normals:
+            mesh_out.flags |= CdaeV31.Mesh.Flags.USE_ENCODED_NORMALS
+        else:
+            mesh_out.norms.set_numpy_array(normals)
+
+        if tangents is not None:
+            mesh_out.tangents.set_numpy_array(tangents)
 
         if npmesh.uvs0 is not None:
             mesh_out.tverts0.set_numpy_array(npmesh.uvs0)
@@ -288,67 +1017,239 @@ class CdaeMeshBuilder:
             mesh_out.colors.set_numpy_array(npmesh.colors)
 
 
-        mesh_out.numFrames = 1
+        mesh_out.numFrames = frame_count
         mesh_out.numMatFrames = 1
         mesh_out.vertsPerFrame = len(npmesh.positions)
 
         if mesh_out.vertsPerFrame > 0:
-            mins = npmesh.positions.min(axis=0).astype(float)
-            maxs = npmesh.positions.max(axis=0).astype(float)
-            mesh_out.bounds = Box6F(*mins, *maxs)
-            mesh_out.center = mesh_out.bounds.center()
-            mesh_out.radius = CdaeMeshBuilder.get_radius(mesh_out.bounds)
+            CdaeMeshBuilder.set_bounds(mesh_out, positions)
 
         return mesh_out 
 
 
-    def build_from_object(self, obj: bpy.types.Object | None) -> CdaeV31.Mesh:
+    def override_modifiers(self, objects: list[bpy.types.Object]):
+        """
+        Makes viewport visibility of all modifiers match the eval mode, so a single depsgraph evaluation yields
+        the requested result for every object. The previous flags are kept for restore_modifiers.
+        """
+        match self.eval_mode:
+            case MeshDataEvalMode.Depsgraph | MeshDataEvalMode.ModViewport | MeshDataEvalMode.RawData:
+                visible = lambda mod: mod.show_viewport
+            case MeshDataEvalMode.ModRender:
+                visible = lambda mod: mod.show_render
+            case MeshDataEvalMode.ModAll:
+                visible = lambda mod: True
+            case _:
+                raise Exception(self.eval_mode)
+
+        # Skinned meshes are taken in bind pose, the armature deforms them at runtime.
+        for obj in objects:
+            skinned = self.skin_enabled and CdaeMeshBuilder.get_armature(obj) is not None
+            for mod in obj.modifiers:
+                show = visible(mod) and not (skinned and mod.type == 'ARMATURE' and mod.object is not None)
+                if mod.show_viewport != show:
+                    self.modifier_backup.append((mod, mod.show_viewport))
+                    mod.show_viewport = show
+            if skinned and self.eval_mode != MeshDataEvalMode.RawData and obj not in self.temporary_modifiers:
+                self.add_weight_attributes(obj, CdaeMeshBuilder.get_skin_bones(obj, CdaeMeshBuilder.get_armature(obj)))
+
+
+    def add_weight_attributes(self, obj: bpy.types.Object, bones: list[str]):
+        """
+        Appends a temporary Geometry Nodes modifier that copies the bone vertex groups into float point attributes,
+        so the evaluated mesh exposes all weights to foreach_get. Removed again by restore_modifiers.
+        """
+        if not bones:
+            return
+        tree = bpy.data.node_groups.new("cdae_skin_weights", 'GeometryNodeTree')
+        tree.interface.new_socket("Geometry", in_out='INPUT', socket_type='NodeSocketGeometry')
+        tree.interface.new_socket("Geometry", in_out='OUTPUT', socket_type='NodeSocketGeometry')
+        geometry = tree.nodes.new('NodeGroupInput').outputs[0]
+        for name in bones:
+            read = tree.nodes.new('GeometryNodeInputNamedAttribute')
+            read.data_type = 'FLOAT'
+            read.inputs["Name"].default_value = name
+            store = tree.nodes.new('GeometryNodeStoreNamedAttribute')
+            store.data_type = 'FLOAT'
+            store.domain = 'POINT'
+            store.inputs["Name"].default_value = CdaeMeshBuilder.SKIN_ATTRIBUTE_PREFIX + name
+            tree.links.new(geometry, store.inputs["Geometry"])
+            tree.links.new(read.outputs["Attribute"], store.inputs["Value"])
+            geometry = store.outputs["Geometry"]
+        tree.links.new(geometry, tree.nodes.new('NodeGroupOutput').inputs[0])
+
+        mod = obj.modifiers.new("cdae_skin_weights", 'NODES')
+        mod.node_group = tree
+        self.temporary_modifiers[obj] = (mod, tree)
+
+
+    def restore_modifiers(self):
+        for mod, show in reversed(self.modifier_backup):
+            mod.show_viewport = show
+        self.modifier_backup.clear()
+        for obj, (mod, tree) in self.temporary_modifiers.items():
+            obj.modifiers.remove(mod)
+            bpy.data.node_groups.remove(tree)
+        self.temporary_modifiers.clear()
+
+
+    @staticmethod
+    def get_signature_value(obj: bpy.types.Object, value):
+        """
+        Hashable form of a modifier setting. Datablocks are referenced by name, objects also by their transform
+        relative to obj, e.g. a boolean cutter or a mirror object changes the result when it moves.
+        """
+        if isinstance(value, bpy.types.Object):
+            relative = obj.matrix_world.inverted() @ value.matrix_world
+            return (value.name_full, tuple(tuple(round(x, 6) for x in row) for row in relative))
+        if isinstance(value, bpy.types.ID):
+            return value.name_full
+        if hasattr(value, "keys") and hasattr(value, "__getitem__"):
+            return tuple((key, CdaeMeshBuilder.get_signature_value(obj, value[key])) for key in value.keys())
+        if hasattr(value, "__len__") and not isinstance(value, str):
+            return tuple(CdaeMeshBuilder.get_signature_value(obj, item) for item in value)
+        return value
+
+
+    @staticmethod
+    def get_modifier_signature(obj: bpy.types.Object, mod: bpy.types.Modifier) -> tuple:
+        """All settings of a modifier, including ID properties such as Geometry Nodes inputs."""
+        values = [mod.type]
+        for prop in mod.bl_rna.properties:
+            if prop.identifier == "rna_type":
+                continue
+            value = getattr(mod, prop.identifier, None)
+            if not isinstance(value, bpy.types.ID) and prop.type in ('POINTER', 'COLLECTION'):
+                continue
+            values.append((prop.identifier, CdaeMeshBuilder.get_signature_value(obj, value)))
+        values.append(tuple((key, CdaeMeshBuilder.get_signature_value(obj, mod[key])) for key in mod.keys()))
+        return tuple(values)
+
+
+    def get_cache_key(self, obj: bpy.types.Object, evaluated: bool = False) -> tuple:
+        """Objects with equal keys evaluate to the same mesh, e.g. linked duplicates."""
+        materials = tuple(slot.material.name_full if slot.material else None for slot in obj.material_slots)
+        settings = (self.eval_mode, self.use_uv_hint, self.uv0_hint, self.uv1_hint)
+        if evaluated:
+            return ("evaluated", obj.data.as_pointer(), materials, settings)
+        if self.eval_mode == MeshDataEvalMode.RawData:
+            return (obj.data.as_pointer(), materials, settings)
+        modifiers = tuple(CdaeMeshBuilder.get_modifier_signature(obj, mod) for mod in obj.modifiers)
+        return (obj.data.as_pointer(), materials, settings, modifiers)
+
+
+    def build_from_object(self, obj: bpy.types.Object | None, lod_ratio: float = 1.0) -> list[CdaeV31.Mesh]:
+        """
+        Returns one mesh, or several if splitting is enabled and the mesh exceeds the budgets.
+        Results are cached per export, objects sharing data and modifiers get the same meshes.
+        All levels registered for obj in lod_ratios are built together, from a single extraction.
+        Collision objects become convex hulls when hull_count is set.
+        """
         
         if obj is None or not ObjectProperties.has_mesh(obj):
             null = CdaeV31.Mesh()
-            return null
-        
-        print(self.eval_mode)
-        use_depsgraph = self.eval_mode == MeshDataEvalMode.Depsgraph
+            return [null]
+
+        hulls = self.hull_count > 0 and ObjectProperties.get_role(obj) == ObjectRole.Collision
+        ratios = () if hulls else tuple(sorted(self.lod_ratios.get(obj, ())))
+        key = self.get_cache_key(obj) + (hulls, ratios)
+        # Sampled frames and skins belong to this object alone.
+        frames = self.vertex_frames.get(obj)
+        skin = self.get_skin(obj) if self.skin_enabled and not hulls else None
+        if frames is not None or skin is not None:
+            key += (obj.name_full,)
+        levels = self.mesh_cache.get(key)
+        if levels is not None:
+            self.cache_hits += 1
+        else:
+            self.frames = frames
+            self.skin = skin
+            try:
+                levels = self.build_from_object_uncached(obj, hulls, ratios)
+            finally:
+                self.frames = None
+                self.skin = None
+            self.mesh_cache[key] = levels
+        return levels[lod_ratio]
+
+
+    def build_from_instance(self, eval_obj: bpy.types.Object) -> list[CdaeV31.Mesh]:
+        """Instanced objects are already evaluated, every instance of the same data shares one result."""
+
+        key = self.get_cache_key(eval_obj, evaluated=True)
+        cached = self.mesh_cache.get(key)
+        if cached is not None:
+            self.cache_hits += 1
+            return cached[1.0]
+
+        meshes = self.build_pieces_from_mesh(eval_obj.data)
+        self.mesh_cache[key] = {1.0: meshes}
+        return meshes
+
+
+    def sample_vertex_animation(self, objects: list[bpy.types.Object], frames: list[float]):
+        """
+        Evaluated positions and loop normals of objects over frames, in a single frame-major pass over the scene.
+        Arrays of (frames, vertices, 3) are allocated from the first frame, objects that change topology are dropped.
+        Frames moving no vertex more than vertex_animation_tolerance from the last kept frame are skipped,
+        each object keeps the index of the stored frame shown at every sampled frame.
+        """
+        scene = bpy.context.scene
+        frame_backup = scene.frame_current
+        positions: dict[bpy.types.Object, NDArray] = {}
+        normals: dict[bpy.types.Object, NDArray] = {}
+
+        try:
+            for index, frame in enumerate(frames):
+                scene.frame_set(int(frame), subframe=frame - int(frame))
+                depsgraph = bpy.context.evaluated_depsgraph_get()
+                for obj in objects:
+                    if index > 0 and obj not in positions:
+                        continue
+                    eval_obj: bpy.types.Object = obj.evaluated_get(depsgraph)
+                    mesh = eval_obj.to_mesh()
+                    try:
+                        if index == 0:
+                            positions[obj] = np.empty((len(frames), len(mesh.vertices), 3), dtype=np.float32)
+                            normals[obj] = np.empty((len(frames), len(mesh.loops), 3), dtype=np.float32)
+                        elif len(mesh.vertices) != positions[obj].shape[1] or len(mesh.loops) != normals[obj].shape[1]:
+                            print(f"vertex animation: {obj.name} changes topology, skipped")
+                            del positions[obj], normals[obj]
+                            continue
+                        mesh.vertices.foreach_get("co", positions[obj][index].reshape(-1))
+                        mesh.loops.foreach_get("normal", normals[obj][index].reshape(-1))
+                    finally:
+                        eval_obj.to_mesh_clear()
+        finally:
+            scene.frame_set(frame_backup)
 
-        if use_depsgraph:
-            eval_obj: bpy.types.Object = obj.evaluated_get(self.depsgraph)
-            mesh = eval_obj.to_mesh()
+        for obj, frame_positions in positions.items():
+            kept = [0]
+            for index in range(1, len(frames)):
+                if np.abs(frame_positions[index] - frame_positions[kept[-1]]).max(initial=0.0) > self.vertex_animation_tolerance:
+                    kept.append(index)
+            if len(kept) < 2:
+                continue
+            frame_index = np.searchsorted(kept, np.arange(len(frames)), side="right") - 1
+            self.vertex_frames[obj] = (frame_positions[kept], normals[obj][kept], frame_index)
 
-        else:
-            temp_obj: bpy.types.Object = obj.copy()
-            mesh = temp_obj.data = obj.data.copy()
-            bpy.context.collection.objects.link(temp_obj)
 
-            active = bpy.context.view_layer.objects.active
-            bpy.context.view_layer.objects.active = temp_obj
-            
-            match self.eval_mode:
-                case MeshDataEvalMode.RawData:
-                    modifiers = []
-                case MeshDataEvalMode.ModViewport:
-                    modifiers = [mod for mod in temp_obj.modifiers if mod.show_viewport]
-                case MeshDataEvalMode.ModRender:
-                    modifiers = [mod for mod in temp_obj.modifiers if mod.show_render]
-                case MeshDataEvalMode.ModAll:
-                    modifiers = temp_obj.modifiers
-                case _:
-                    raise Exception(self.eval_mode)
-
-            for mod in modifiers:
-                bpy.ops.object.modifier_apply(modifier=mod.name)
-
-            bpy.data.objects.remove(temp_obj, do_unlink=True)
-            bpy.context.view_layer.objects.active = active
+    def build_from_object_uncached(self, obj: bpy.types.Object, hulls: bool = False, ratios: list[float] = ()) -> dict[float, list[CdaeV31.Mesh]]:
+
+        build = self.build_hulls_from_mesh if hulls else self.build_levels_from_mesh
+
+        # Raw data is read straight from the original mesh, nothing in it gets modified.
+        if self.eval_mode == MeshDataEvalMode.RawData:
+            return build(obj.data, ratios)
+
+        eval_obj: bpy.types.Object = obj.evaluated_get(self.depsgraph)
+        mesh = eval_obj.to_mesh()
 
         try:
-            return self.build_from_mesh(mesh)
+            return build(mesh, ratios)
         
         finally:
-            if use_depsgraph:
-                eval_obj.to_mesh_clear()
-            else:
-                bpy.data.meshes.remove(mesh)
+            eval_obj.to_mesh_clear()
 
 
 
@@ -370,6 +1271,8 @@ class CdaeKeyframeSampler:
         self.sample_keyframes_enabled: bool = False
         self.keyframes: list[Transforms] = []
         self.nodes_enabled: list[bool] = []
+        self.rows: dict[object, int] = {}
+        self.matrices: NDArray = None
 
 
     def create_sequence(self) -> CdaeV31.Sequence:
@@ -398,28 +1301,74 @@ class CdaeKeyframeSampler:
 
 
 
-    def sample_keyframes(self, obj: bpy.types.Object):
-        
-        frame_backup = bpy.context.scene.frame_current
+    def sample_instance(self, matrix):
+        """Instances only exist in the evaluated scene of the current frame, they get no keyframes."""
+        transforms = Transforms.from_blender_matrix(matrix) if self.sample_transforms_enabled else Transforms()
+        self.nodes_enabled.append(False)
+        return CdaeKeyframeSampler.Result(transforms, False)
+
 
+    def is_moving(self) -> bool:
+        """Whether the keyframes of the last node sampled with keyframes differ from each other."""
+        frames = self.keyframes[-self.sample_count:]
+        return any(frame != frames[0] for frame in frames[1:])
+
+
+    def get_frames(self) -> list[float]:
+        """Scene frames of the keyframes."""
         frame_range = self.end - self.start
         frame_scale = frame_range / self.sample_count
+        return [iframe * frame_scale + self.start for iframe in range(self.sample_count)]
+
 
-        for iframe in (range(self.sample_count)):
-            scaled_frame = iframe * frame_scale
-            final_frame = scaled_frame + self.start
-            self.keyframes.append(self.sample_frame(obj, final_frame))
+    def register(self, objects):
+        """
+        Nodes to sample together, anything with a matrix_world. Registered nodes are sampled in one pass
+        over the frames on the first sample, each frame is set once for all of them.
+        """
+        if not self.sample_keyframes_enabled:
+            return
+        for obj in objects:
+            if obj is not None and obj not in self.rows:
+                self.rows[obj] = len(self.rows)
+                self.matrices = None
+
+
+    def sample_matrices(self, objects: list) -> NDArray:
+        """(objects, sample_count, 4, 4) world matrices, frame-major, every frame is set once."""
+        matrices = np.empty((len(objects), self.sample_count, 4, 4), dtype=np.float64)
+        frame_backup = bpy.context.scene.frame_current
+
+        for index, final_frame in enumerate(self.get_frames()):
+            self.set_frame(final_frame)
+            for row, obj in enumerate(objects):
+                matrices[row, index] = obj.matrix_world
 
         bpy.context.scene.frame_set(frame_backup)
+        return matrices
+
+
+    def sample_keyframes(self, obj: bpy.types.Object):
+
+        row = self.rows.get(obj)
+        if row is None:
+            # Nodes that were not registered get a pass of their own.
+            matrices = self.sample_matrices([obj])[0]
+        else:
+            if self.matrices is None:
+                self.matrices = self.sample_matrices(list(self.rows))
+            matrices = self.matrices[row]
+
+        for matrix in matrices:
+            self.keyframes.append(Transforms.from_blender_matrix(mathutils.Matrix(matrix)))
 
         self.nodes_enabled.append(True)
 
 
-    def sample_frame(self, obj: bpy.types.Object, frame: float) -> Transforms:
+    def set_frame(self, frame: float):
         intframe = int(frame)
         subframe = frame - intframe
         bpy.context.scene.frame_set(intframe, subframe=subframe)
-        return self.sample_current(obj)
     
 
     def sample_current(self, obj: bpy.types.Object) -> Transforms:
@@ -427,6 +1376,35 @@ class CdaeKeyframeSampler:
 
 
 class CdeaBuilder:
+
+    class BonePose:
+        """Samples like an object, the pose of a bone relative to its parent bone, or to the world for root bones."""
+
+        def __init__(self, armature: bpy.types.Object, name: str):
+            self.armature = armature
+            self.name = name
+
+
+        @property
+        def matrix_world(self):
+            pose_bone = self.armature.pose.bones[self.name]
+            if pose_bone.parent is None:
+                return self.armature.matrix_world @ pose_bone.matrix
+            return pose_bone.parent.matrix.inverted() @ pose_bone.matrix
+
+
+
+    @staticmethod
+    def get_detail_meshes(detail: CdaeV31.Detail, shapes: list[CdaeV31.SubShape], objects: list[CdaeV31.Object], meshes: list[CdaeV31.Mesh]):
+        """Yields (object index, mesh) for every object of the detail's subshape that has a mesh at its level."""
+        if detail.subShapeNum < 0 or detail.objectDetailNum < 0:
+            return
+        shape = shapes[detail.subShapeNum]
+        for obj_index in range(shape.firstObject, shape.firstObject + shape.numObjects):
+            obj = objects[obj_index]
+            if detail.objectDetailNum < obj.numMeshes:
+                yield obj_index, meshes[obj.startMeshIndex + detail.objectDetailNum]
+
     
     def __init__(self):
         self.cdae = CdaeV31()
@@ -436,10 +1414,241 @@ class CdeaBuilder:
         self.sampler = CdaeKeyframeSampler()
         self.materials: list[bpy.types.Material] = []
         self.readonly: bool = False
+        self.instances_enabled: bool = False
+        self.instance_parents: set[bpy.types.Object] = set()
+        self.instance_count: int = 0
+        self.detail_error_samples: int = 1024
+        self.batching_enabled: bool = False
+        self.draw_calls_before: int = 0
+        self.draw_calls_after: int = 0
+        self.hlod_enabled: bool = False
+        self.hlod_max_triangles: int = 5000
+        self.hlod_triangles_before: int = 0
+        self.hlod_triangles_after: int = 0
+        self.vertex_animation_enabled: bool = False
+        self.bone_poses: dict[tuple[bpy.types.Object, str], CdeaBuilder.BonePose] = {}
 
 
     def build(self):
 
+        # Modifier overrides for all objects first, then one depsgraph evaluation serves every mesh.
+        mesh_objects = [mesh.bpy_mesh_obj for mesh in self.tree.iter_meshes() if mesh.bpy_mesh_obj is not None]
+        self.register_lod_ratios()
+        self.mesh_builder.override_modifiers(mesh_objects)
+        try:
+            if self.mesh_builder.eval_mode != MeshDataEvalMode.RawData or self.instances_enabled:
+                self.mesh_builder.depsgraph = bpy.context.evaluated_depsgraph_get()
+            if self.instances_enabled:
+                self.add_instances(self.mesh_builder.depsgraph)
+            if self.vertex_animation_enabled and self.sampler.sample_keyframes_enabled:
+                self.sample_vertex_animation()
+            self.register_nodes()
+            self.build_cdae()
+        finally:
+            self.mesh_builder.restore_modifiers()
+
+
+    def add_instances(self, depsgraph: bpy.types.Depsgraph):
+        """
+        Collection and Geometry Nodes instances of the collected objects become nodes with their instance transform.
+        Meshes are built right away, evaluated instance data does not survive a frame change during sampling.
+        """
+        counters: dict[str, int] = {}
+        for inst in depsgraph.object_instances:
+            if not inst.is_instance or inst.object.type != 'MESH':
+                continue
+            parent = inst.parent.original if inst.parent is not None else None
+            if parent not in self.instance_parents:
+                continue
+
+            meshes = self.mesh_builder.build_from_instance(inst.object)
+            base = self.tree._get_obj_name(parent)
+            index = counters.get(base, 0)
+            counters[base] = index + 1
+            self.tree.add_instance(f"{base}_inst{index}", inst.matrix_world.copy(), meshes)
+            self.instance_count += 1
+
+
+    def register_lod_ratios(self):
+        """Generated levels the tree kept for each object, only those get decimated."""
+        lod_ratios = self.mesh_builder.lod_ratios
+        lod_ratios.clear()
+        for mesh in self.tree.iter_meshes():
+            if mesh.bpy_mesh_obj is not None and mesh.lod_ratio != 1.0:
+                ratios = lod_ratios.setdefault(mesh.bpy_mesh_obj, [])
+                if mesh.lod_ratio not in ratios:
+                    ratios.append(mesh.lod_ratio)
+
+
+    def get_bone_pose(self, armature: bpy.types.Object, name: str) -> 'CdeaBuilder.BonePose':
+        key = (armature, name)
+        pose = self.bone_poses.get(key)
+        if pose is None:
+            pose = self.bone_poses[key] = CdeaBuilder.BonePose(armature, name)
+        return pose
+
+
+    def register_nodes(self):
+        """Registers every node to sample with keyframes, so all of them are read in a single pass over the frames."""
+        objects = [node.bpy_sample_obj for node in self.tree.iter_nodes() if node.instance_matrix is None]
+        if self.mesh_builder.skin_enabled:
+            armatures = []
+            for mesh in self.tree.iter_meshes():
+                armature = CdaeMeshBuilder.get_armature(mesh.bpy_mesh_obj) if mesh.bpy_mesh_obj is not None else None
+                if armature is not None and armature not in armatures:
+                    armatures.append(armature)
+            for armature in armatures:
+                objects.extend(self.get_bone_pose(armature, bone.name) for bone in armature.data.bones)
+        self.sampler.register(objects)
+
+
+    def sample_vertex_animation(self):
+        """Deforming render meshes at the keyframes, evaluated meshes only, raw data never deforms."""
+        if self.mesh_builder.eval_mode == MeshDataEvalMode.RawData:
+            print("vertex animation: needs evaluated meshes, skipped")
+            return
+        objects = []
+        for mesh in self.tree.iter_meshes():
+            obj = mesh.bpy_mesh_obj
+            if obj is not None and obj not in objects and ObjectProperties.get_role(obj) in (ObjectRole.Mesh, ObjectRole.Generic):
+                # Skinned objects are deformed by their bone nodes instead.
+                if self.mesh_builder.skin_enabled and CdaeMeshBuilder.get_armature(obj) is not None:
+                    continue
+                objects.append(obj)
+        self.mesh_builder.sample_vertex_animation(objects, self.sampler.get_frames())
+
+
+    @staticmethod
+    def is_render_object(obj: CdaeTree.Object) -> bool:
+        """Objects of plain render meshes, other roles have a meaning of their own."""
+        for mesh in obj.meshes:
+            if mesh.bpy_mesh_obj is not None and ObjectProperties.get_role(mesh.bpy_mesh_obj) not in (ObjectRole.Mesh, ObjectRole.Generic):
+                return False
+        return True
+
+
+    @staticmethod
+    def can_merge(mesh: CdaeV31.Mesh) -> bool:
+        """Standard meshes without billboarding or vertex animation."""
+        return mesh.type == CdaeV31.MeshType.STANDARD and mesh.numFrames <= 1 and not mesh.flags & (CdaeV31.Mesh.Flags.BILLBOARD | CdaeV31.Mesh.Flags.BILLBOARD_Z_AXIS)
+
+
+    @staticmethod
+    def can_batch(obj: CdaeTree.Object, detail_pieces: list[list[CdaeV31.Mesh]]) -> bool:
+        """Plain render meshes only, roles with a meaning of their own and split meshes stay separate."""
+        if not CdeaBuilder.is_render_object(obj):
+            return False
+        for pieces in detail_pieces:
+            if len(pieces) != 1:
+                return False
+            if pieces[0].type != CdaeV31.MeshType.NULL and not CdeaBuilder.can_merge(pieces[0]):
+                return False
+        return True
+
+
+    def compute_detail_stats(self, details: list[CdaeV31.Detail], shapes: list[CdaeV31.SubShape], objects: list[CdaeV31.Object], meshes: list[CdaeV31.Mesh]):
+        """
+        Poly counts per detail and the smallest visible detail, as Torque3D computes them on load.
+        Errors are distances from points sampled on the largest detail of the same subshape to the surface of each detail.
+        """
+        for detail in details:
+            detail.polyCount = sum(mesh.get_poly_count() for _, mesh in CdeaBuilder.get_detail_meshes(detail, shapes, objects, meshes))
+
+        visible = [(detail.size, index) for index, detail in enumerate(details) if detail.size >= 0]
+        if visible:
+            self.cdae.smallest_visible_size, self.cdae.smallest_visible_dl = min(visible)
+
+        if self.detail_error_samples <= 0:
+            return
+
+        for detail in details:
+            if detail.subShapeNum < 0 or detail.objectDetailNum < 0 or detail.size < 0:
+                continue
+            candidates = [other for other in details if other.subShapeNum == detail.subShapeNum and other.objectDetailNum >= 0 and other.size >= 0]
+            reference = max(candidates, key=lambda other: other.size)
+            if reference is detail:
+                detail.averageError = 0.0
+                detail.maxError = 0.0
+                continue
+
+            lod_meshes = dict(CdeaBuilder.get_detail_meshes(detail, shapes, objects, meshes))
+            distances = []
+            for obj_index, reference_mesh in CdeaBuilder.get_detail_meshes(reference, shapes, objects, meshes):
+                lod_mesh = lod_meshes.get(obj_index)
+                if reference_mesh.type != CdaeV31.MeshType.STANDARD or lod_mesh is None or lod_mesh.type != CdaeV31.MeshType.STANDARD:
+                    continue
+                reference_tris, lod_tris = reference_mesh.get_triangles(), lod_mesh.get_triangles()
+                if len(reference_tris) == 0 or len(lod_tris) == 0:
+                    continue
+                if reference_mesh is lod_mesh:
+                    distances.append(np.zeros(1))
+                    continue
+                points = get_surface_samples(reference_tris, reference_mesh.verts.to_numpy_array(np.float32).reshape((-1, 3)), self.detail_error_samples)
+                distances.append(get_surface_distances(points, lod_tris, lod_mesh.verts.to_numpy_array(np.float32).reshape((-1, 3))))
+
+            if distances:
+                distances = np.concatenate(distances)
+                detail.averageError = float(distances.mean())
+                detail.maxError = float(distances.max())
+
+
+    @staticmethod
+    def get_node_matrices(nodes: list[CdaeV31.Node], rotations: list[Quat4F], translations: list[Vec3F]) -> NDArray:
+        """Shape space (n, 3, 4) transforms of all nodes, each node's default transform applied after its parent's."""
+        quats = np.array([rotation.tuple4 for rotation in rotations], dtype=np.float64).reshape((-1, 4))
+        # Stored quaternions have w negated, see Quat4F.from_blender_quaternion.
+        x, y, z, w = quats[:, 0], quats[:, 1], quats[:, 2], -quats[:, 3]
+        scale = 2 / np.maximum((quats * quats).sum(axis=1), 1e-30)
+        local = np.empty((len(nodes), 3, 4))
+        local[:, 0, 0] = 1 - scale * (y * y + z * z)
+        local[:, 0, 1] = scale * (x * y - z * w)
+        local[:, 0, 2] = scale * (x * z + y * w)
+        local[:, 1, 0] = scale * (x * y + z * w)
+        local[:, 1, 1] = 1 - scale * (x * x + z * z)
+        local[:, 1, 2] = scale * (y * z - x * w)
+        local[:, 2, 0] = scale * (x * z - y * w)
+        local[:, 2, 1] = scale * (y * z + x * w)
+        local[:, 2, 2] = 1 - scale * (x * x + y * y)
+        local[:, :, 3] = np.array([translation.tuple3 for translation in translations], dtype=np.float64).reshape((-1, 3))
+
+        # Parents are always created before their children.
+        world = local.copy()
+        for index, node in enumerate(nodes):
+            if node.parentIndex >= 0:
+                parent = world[node.parentIndex]
+                world[index, :, :3] = parent[:, :3] @ local[index, :, :3]
+                world[index, :, 3] = parent[:, :3] @ local[index, :, 3] + parent[:, 3]
+        return world
+
+
+    def compute_bounds(self, flat_tree: CdaeV31.Tree, rotations: list[Quat4F], translations: list[Vec3F], meshes: list[CdaeV31.Mesh]):
+        """Shape bounds, bounding sphere and tube radius from the mesh points moved through their node chains."""
+        matrices = CdeaBuilder.get_node_matrices(flat_tree.nodes, rotations, translations)
+
+        points = []
+        for obj in flat_tree.objects:
+            for mesh in meshes[obj.startMeshIndex:obj.startMeshIndex + obj.numMeshes]:
+                if mesh.type == CdaeV31.MeshType.NULL or mesh.verts.element_count == 0:
+                    continue
+                verts = mesh.verts.to_numpy_array(np.float32).reshape((-1, 3)).astype(np.float64)
+                if obj.nodeIndex >= 0:
+                    matrix = matrices[obj.nodeIndex]
+                    verts = verts @ matrix[:, :3].T + matrix[:, 3]
+                points.append(verts)
+
+        if not points:
+            return
+
+        points = np.concatenate(points)
+        mins, maxs = points.min(axis=0), points.max(axis=0)
+        self.cdae.bounds = Box6F(*mins.astype(float), *maxs.astype(float))
+        center, self.cdae.radius = CdaeMeshBuilder.get_bounding_sphere(points)
+        self.cdae.center = Vec3F(*center.astype(float))
+        self.cdae.tube_radius = float(np.linalg.norm(points[:, :2] - center[:2], axis=1).max())
+
+
+    def build_cdae(self):
+
         cdae = self.cdae
 
         flat_tree = cdae.unpack_tree()
@@ -448,12 +1657,12 @@ class CdeaBuilder:
         defaultRotations = []
         defaultTranslations = []
 
-        if self.mesh_builder.eval_mode == MeshDataEvalMode.Depsgraph:
-            self.mesh_builder.depsgraph = bpy.context.evaluated_depsgraph_get()
-
         def add_node(node: CdaeTree.Node, parent_index: int = -1) -> int:
             
-            node_samples = self.sampler.sample(node.bpy_sample_obj)
+            if node.instance_matrix is not None:
+                node_samples = self.sampler.sample_instance(node.instance_matrix)
+            else:
+                node_samples = self.sampler.sample(node.bpy_sample_obj)
             trans = node_samples.transforms
             defaultRotations.append(trans.rotation)
             defaultTranslations.append(trans.translation)
@@ -465,21 +1674,172 @@ class CdeaBuilder:
             flat_tree.link_node(parent_index, node_index)
             flat_node.nameIndex = cdae.get_name_index(node.name)
 
+            moving = node_samples.has_keyframes and self.sampler.is_moving()
+            animated.append(moving or (parent_index >= 0 and animated[parent_index]))
+
             for obj in node.objects:
+                # One list of pieces per detail, split pieces become sibling objects padded with null meshes.
+                detail_pieces = [mesh.prebuilt if mesh.prebuilt is not None else self.mesh_builder.build_from_object(mesh.bpy_mesh_obj, mesh.lod_ratio) for mesh in obj.meshes]
+                skin = self.mesh_builder.skins.get(obj.meshes[0].bpy_mesh_obj) if obj.meshes else None
+                if skin is not None and any(piece.type == CdaeV31.MeshType.SKIN for pieces in detail_pieces for piece in pieces):
+                    add_skinned_object(obj, detail_pieces, skin)
+                elif batching and not animated[node_index] and CdeaBuilder.can_batch(obj, detail_pieces):
+                    batched.append((node_index, detail_pieces))
+                else:
+                    frames = self.mesh_builder.vertex_frames.get(obj.meshes[0].bpy_mesh_obj) if obj.meshes else None
+                    add_object(node_index, obj.name, detail_pieces, CdeaBuilder.is_render_object(obj), None if frames is None else frames[2])
+
+            for child in node.nodes:
+                add_node(child, node_index)
+
+            return node_index
+
+        def add_bones(armature: bpy.types.Object) -> dict[str, int]:
+            """One node per bone of the armature, created once, parents first."""
+            bone_nodes = armature_nodes.get(armature)
+            if bone_nodes is not None:
+                return bone_nodes
+            bone_nodes = armature_nodes[armature] = {}
+            for bone in sorted(armature.data.bones, key=lambda bone: len(bone.parent_recursive)):
+                node_samples = self.sampler.sample(self.get_bone_pose(armature, bone.name))
+                trans = node_samples.transforms
+                defaultRotations.append(trans.rotation)
+                defaultTranslations.append(trans.translation)
+
+                parent_index = bone_nodes[bone.parent.name] if bone.parent is not None else -1
+                (node_index, flat_node) = flat_tree.create_node()
+                flat_tree.link_node(parent_index, node_index)
+                flat_node.nameIndex = cdae.get_name_index(bone.name)
+                bone_nodes[bone.name] = node_index
+
+                moving = node_samples.has_keyframes and self.sampler.is_moving()
+                animated.append(moving or (parent_index >= 0 and animated[parent_index]))
+            return bone_nodes
+
+        def add_skinned_object(obj: CdaeTree.Object, detail_pieces: list[list[CdaeV31.Mesh]], skin: CdaeMeshBuilder.Skin):
+            """Skinned meshes are in shape space and follow their bone nodes, their object has no node."""
+            bone_nodes = add_bones(CdaeMeshBuilder.get_armature(obj.meshes[0].bpy_mesh_obj))
+            node_index = np.array([bone_nodes[name] for name in skin.bones], dtype=np.int32)
+            for pieces in detail_pieces:
+                for piece in pieces:
+                    if piece.type == CdaeV31.MeshType.SKIN:
+                        piece.node_index.set_numpy_array(node_index)
+            add_object(-1, obj.name, detail_pieces, CdeaBuilder.is_render_object(obj))
+
+        def add_object(node_index: int, name: str, detail_pieces: list[list[CdaeV31.Mesh]], rendered: bool = False, frame_index: NDArray = None):
+            piece_count = max((len(pieces) for pieces in detail_pieces), default=1)
+
+            for piece in range(piece_count):
                 (obj_index, flat_obj) = flat_tree.create_object()
                 flat_tree.link_object(node_index, obj_index)
-                flat_obj.nameIndex = cdae.get_name_index(obj.name)
+                if rendered:
+                    proxied.append(obj_index)
+                if frame_index is not None:
+                    object_frames[obj_index] = frame_index
+                flat_obj.nameIndex = cdae.get_name_index(name if piece == 0 else f"{name}_part{piece}")
 
-                flat_obj.numMeshes = len(obj.meshes)
+                flat_obj.numMeshes = len(detail_pieces)
                 flat_obj.startMeshIndex = len(flat_meshes)
-   
-                for mesh in obj.meshes:
-                    flat_meshes.append(self.mesh_builder.build_from_object(mesh.bpy_mesh_obj))
 
-            for child in node.nodes:
-                add_node(child, node_index)
+                for pieces in detail_pieces:
+                    flat_meshes.append(pieces[piece] if piece < len(pieces) else CdaeV31.Mesh())
 
-            return node_index
+        def add_batch(name: str):
+            """Static objects of the shape merged into one object per detail, on a new root node with identity transform."""
+            trans = self.sampler.sample(None).transforms
+            defaultRotations.append(trans.rotation)
+            defaultTranslations.append(trans.translation)
+            animated.append(False)
+
+            (node_index, flat_node) = flat_tree.create_node()
+            flat_tree.link_node(-1, node_index)
+            flat_node.nameIndex = cdae.get_name_index(name)
+
+            matrices = CdeaBuilder.get_node_matrices(flat_tree.nodes, defaultRotations, defaultTranslations)
+            slot_count = max(len(detail_pieces) for _, detail_pieces in batched)
+            detail_pieces = []
+            for slot in range(slot_count):
+                sources = [(pieces[slot][0], matrices[source_node]) for source_node, pieces in batched if slot < len(pieces)]
+                sources = [(mesh, matrix) for mesh, matrix in sources if mesh.type == CdaeV31.MeshType.STANDARD]
+                self.draw_calls_before += sum(mesh.draw_regions.element_count for mesh, _ in sources)
+                if not sources:
+                    detail_pieces.append([CdaeV31.Mesh()])
+                    continue
+                npmeshes = [CdaeMeshBuilder.NpMesh.from_mesh(mesh) for mesh, _ in sources]
+                merged = CdaeMeshBuilder.NpMesh.merge(npmeshes, [matrix for _, matrix in sources])
+                pieces = self.mesh_builder.build_pieces(merged)
+                self.draw_calls_after += sum(mesh.draw_regions.element_count for mesh in pieces)
+                detail_pieces.append(pieces)
+
+            add_object(node_index, name, detail_pieces, True)
+            batched.clear()
+
+        def add_hlod(shape: CdaeTree.SubShape, name: str):
+            """
+            Visible meshes of the shape's lowest detail merged and decimated into one proxy object on a new root node.
+            The proxy replaces their meshes at that detail, the full detail is never replaced.
+            """
+            shape_details = self.tree.get_shape_details(shape)
+            if len(shape_details) < 2:
+                return
+            detail = shape_details[-1].template
+            reference_slot = shape_details[0].template.objectDetailNum
+            matrices = CdeaBuilder.get_node_matrices(flat_tree.nodes, defaultRotations, defaultTranslations)
+
+            def gather(slot: int) -> list[tuple[int, CdaeV31.Mesh, NDArray]]:
+                sources = []
+                for obj_index in proxied:
+                    flat_obj = flat_tree.objects[obj_index]
+                    if slot < flat_obj.numMeshes and CdeaBuilder.can_merge(flat_meshes[flat_obj.startMeshIndex + slot]):
+                        sources.append((flat_obj.startMeshIndex + slot, flat_meshes[flat_obj.startMeshIndex + slot], matrices[flat_obj.nodeIndex]))
+                return sources
+
+            def merge(sources: list[tuple[int, CdaeV31.Mesh, NDArray]]) -> CdaeMeshBuilder.NpMesh:
+                return CdaeMeshBuilder.NpMesh.merge([CdaeMeshBuilder.NpMesh.from_mesh(mesh) for _, mesh, _ in sources], [matrix for _, _, matrix in sources])
+
+            sources = gather(detail.objectDetailNum)
+            if not sources:
+                return
+
+            merged = merge(sources)
+            triangle_count = merged.indices.size // 3
+            proxy = merged
+            if triangle_count > self.hlod_max_triangles > 0:
+                proxy = merged.simplify(self.hlod_max_triangles / triangle_count)
+            self.hlod_triangles_before += triangle_count
+            self.hlod_triangles_after += proxy.indices.size // 3
+
+            # Error against the full detail, per object pairs can no longer be matched once merged.
+            reference = gather(reference_slot)
+            if self.detail_error_samples > 0 and reference and proxy.indices.size > 0:
+                full = merge(reference)
+                points = get_surface_samples(full.indices.reshape((-1, 3)), full.positions, self.detail_error_samples)
+                distances = get_surface_distances(points, proxy.indices.reshape((-1, 3)), proxy.positions)
+                detail.averageError = float(distances.mean())
+                detail.maxError = float(distances.max())
+
+            for mesh_index, _, _ in sources:
+                flat_meshes[mesh_index] = CdaeV31.Mesh()
+
+            trans = self.sampler.sample(None).transforms
+            defaultRotations.append(trans.rotation)
+            defaultTranslations.append(trans.translation)
+            animated.append(False)
+
+            (node_index, flat_node) = flat_tree.create_node()
+            flat_tree.link_node(-1, node_index)
+            flat_node.nameIndex = cdae.get_name_index(name)
+
+            detail_pieces = [[CdaeV31.Mesh()] for _ in range(detail.objectDetailNum)]
+            detail_pieces.append(self.mesh_builder.build_pieces(proxy))
+            add_object(node_index, name, detail_pieces)
+
+        batching = self.batching_enabled and self.tree.build_mode in (CdaeTreeBuildMode.FLAT_DUMP, CdaeTreeBuildMode.BLENDER_HIERARCHY)
+        batched: list[tuple[int, list[list[CdaeV31.Mesh]]]] = []
+        proxied: list[int] = []
+        object_frames: dict[int, NDArray] = {}
+        armature_nodes: dict[bpy.types.Object, dict[str, int]] = {}
+        animated: list[bool] = []
         
         shapes = cdae.unpack_subshapes()
         shapes_dict: dict[CdaeTree.SubShape, int] = {}
@@ -491,6 +1851,13 @@ class CdeaBuilder:
             for node in shape.nodes:
                 add_node(node)
 
+            if batched:
+                add_batch(f"batch{len(shapes)}")
+
+            if self.hlod_enabled:
+                add_hlod(shape, f"hlod{len(shapes)}")
+            proxied.clear()
+
             last_node = len(flat_tree.nodes)
             last_obj = len(flat_tree.objects)
             node_count = last_node-first_node
@@ -508,12 +1875,22 @@ class CdeaBuilder:
             detail.template.subShapeNum = shapeidx
             details.append(detail.template)
 
+        self.compute_detail_stats(details, shapes, flat_tree.objects, flat_meshes)
+
+
+        states = [CdaeV31.ObjectState() for _ in flat_tree.objects]
 
         if self.sampler.sample_keyframes_enabled:
             seq = self.sampler.create_sequence()
             cdae.sequences.append(seq)
             seq.nameIndex = self.cdae.get_name_index("ambiant")
 
+            # Vertex animated objects get one state per keyframe, naming the mesh frame to show.
+            seq.frameMatters = [obj_index in object_frames for obj_index in range(len(flat_tree.objects))]
+            seq.baseObjectState = len(states)
+            for obj_index in sorted(object_frames):
+                states.extend(CdaeV31.ObjectState(1.0, int(frame), 0) for frame in object_frames[obj_index])
+
             kf_loc = []
             kf_rot = []
             kf_scl = []
@@ -539,19 +1916,12 @@ class CdeaBuilder:
         self.cdae.defaultRotations.pack_list(defaultRotations)
         self.cdae.defaultTranslations.pack_list(defaultTranslations)
 
-        states = [CdaeV31.ObjectState() for _ in flat_tree.objects]
         self.cdae.pack_states(states)
         self.cdae.pack_tree(flat_tree)
         self.cdae.pack_subshapes(shapes)
         self.cdae.pack_details(details)
         self.cdae.meshes = flat_meshes
 
-        if len(flat_meshes) > 0:
-            self.cdae.bounds = flat_meshes[0].bounds
-            for i in range(1, len(flat_meshes)):
-                self.cdae.bounds = self.cdae.bounds.extended(flat_meshes[i].bounds)
-        self.cdae.center = self.cdae.bounds.center()
-        self.cdae.radius = CdaeMeshBuilder.get_radius(self.cdae.bounds)
-        self.cdae.tube_radius = self.cdae.radius
+        self.compute_bounds(flat_tree, defaultRotations, defaultTranslations, flat_meshes)
 
         self.materials = self.material_indexer.materials
\ No newline at end of file
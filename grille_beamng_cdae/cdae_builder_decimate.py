@@ -0,0 +1,239 @@
+import numpy as np
+
+from numpy.typing import NDArray
+
+
+# Quadric error metric simplification (Garland and Heckbert 1997) of welded triangle lists, works on plain NumPy arrays.
+# Collapses are applied in batches of independent half-edges, every pass is fully vectorized.
+
+
+# Upper triangle of the symmetric 4x4 quadric, stored as 10 columns.
+QUADRIC_ROWS = np.array([0, 0, 0, 0, 1, 1, 1, 2, 2, 3])
+QUADRIC_COLS = np.array([0, 1, 2, 3, 1, 2, 3, 2, 3, 3])
+QUADRIC_WEIGHTS = np.where(QUADRIC_ROWS == QUADRIC_COLS, 1.0, 2.0)
+
+
+def get_face_quadrics(indices: NDArray, positions: NDArray) -> NDArray:
+    """Per-vertex quadrics as (n, 10), area weighted plane quadrics summed over the adjacent triangles."""
+    p0, p1, p2 = positions[indices[:, 0]], positions[indices[:, 1]], positions[indices[:, 2]]
+    normals = np.cross(p1 - p0, p2 - p0)
+    areas = np.linalg.norm(normals, axis=1)
+    normals /= np.maximum(areas, 1e-30)[:, None]
+
+    planes = np.concatenate([normals, -np.einsum("ij,ij->i", normals, p0)[:, None]], axis=1)
+    face_quadrics = planes[:, QUADRIC_ROWS] * planes[:, QUADRIC_COLS] * areas[:, None]
+
+    flat = indices.ravel()
+    quadrics = np.empty((len(positions), 10))
+    for i in range(10):
+        quadrics[:, i] = np.bincount(flat, weights=np.repeat(face_quadrics[:, i], 3), minlength=len(positions))
+    return quadrics
+
+
+def get_locked_vertices(indices: NDArray, positions: NDArray) -> NDArray:
+    """
+    Vertices on open or non-manifold edges, and vertices that share their position with another vertex.
+    In a welded mesh this covers mesh borders as well as UV, normal and color seams.
+    """
+    vertex_count = len(positions)
+    edges = np.concatenate([indices[:, [0, 1]], indices[:, [1, 2]], indices[:, [2, 0]]])
+    edges = np.sort(edges, axis=1)
+    edge_keys, counts = np.unique(edges[:, 0].astype(np.int64) * vertex_count + edges[:, 1], return_counts=True)
+    open_keys = edge_keys[counts != 2]
+
+    locked = np.zeros(vertex_count, dtype=bool)
+    locked[open_keys // vertex_count] = True
+    locked[open_keys % vertex_count] = True
+
+    _, inverse, counts = np.unique(positions, axis=0, return_inverse=True, return_counts=True)
+    locked |= counts[inverse.reshape(-1)] > 1
+    return locked
+
+
+def get_collapse_costs(quadrics: NDArray, positions: NDArray, sources: NDArray, targets: NDArray) -> NDArray:
+    """Error of moving sources onto targets, measured with the summed quadric at the target position."""
+    points = np.concatenate([positions[targets], np.ones((len(targets), 1))], axis=1)
+    q = quadrics[sources] + quadrics[targets]
+    terms = points[:, QUADRIC_ROWS] * points[:, QUADRIC_COLS]
+    return np.maximum((q * terms) @ QUADRIC_WEIGHTS, 0.0)
+
+
+def simplify_triangles(indices: NDArray, positions: NDArray, target_count: int, max_error: float = np.inf, max_normal_cos: float = 0.5) -> tuple[NDArray, NDArray]:
+    """
+    Simplifies a (n, 3) triangle list towards target_count triangles by half-edge collapses, vertices are never moved.
+    Returns the new triangles (indexing the same vertices) and for each of them the index of the source triangle.
+    """
+    positions = positions.astype(np.float64)
+    vertex_count = len(positions)
+    tris = indices.astype(np.int64)
+    source = np.arange(len(tris))
+
+    quadrics = get_face_quadrics(tris, positions)
+    locked = get_locked_vertices(tris, positions)
+    rejected = np.empty(0, dtype=np.int64)
+    pass_index = 0
+
+    while len(tris) > target_count:
+        pass_index += 1
+
+        # Candidate collapses u -> v along every directed edge with a free source.
+        sources = tris.ravel()
+        targets = tris[:, [1, 2, 0]].ravel()
+        candidate = ~locked[sources]
+        sources, targets = sources[candidate], targets[candidate]
+        if len(rejected):
+            keep = ~np.isin(sources * vertex_count + targets, rejected)
+            sources, targets = sources[keep], targets[keep]
+        if len(sources) == 0:
+            break
+
+        costs = get_collapse_costs(quadrics, positions, sources, targets)
+        # Cheapest target per source, ties go to the last edge.
+        min_costs = np.full(vertex_count, np.inf)
+        np.minimum.at(min_costs, sources, costs)
+        best_targets = np.full(vertex_count, -1, dtype=np.int64)
+        best = costs == min_costs[sources]
+        best_targets[sources[best]] = targets[best]
+        sources = np.nonzero(best_targets >= 0)[0]
+        targets, costs = best_targets[sources], min_costs[sources]
+
+        within = costs <= max_error
+        sources, targets, costs = sources[within], targets[within], costs[within]
+        if len(sources) == 0:
+            break
+
+        # Only the cheapest collapses are eligible this pass, enough that the independent set below still covers what is needed.
+        eligible_count = 8 * ((len(tris) - target_count) // 2 + 1)
+        if len(sources) > eligible_count:
+            eligible = np.argpartition(costs, eligible_count)[:eligible_count]
+            sources, targets, costs = sources[eligible], targets[eligible], costs[eligible]
+
+        # Among those, a collapse is taken if it has the highest priority around every triangle it touches,
+        # so accepted collapses never share a triangle. Priorities are ids hashed per pass, costs of neighbors are too similar.
+        priority = np.full(vertex_count, -1, dtype=np.int64)
+        salted = sources.astype(np.uint64) + np.uint64(pass_index * vertex_count)
+        priority[sources] = ((salted * np.uint64(0x9e3779b97f4a7c15)) >> np.uint64(1)).astype(np.int64)
+        corner_priority = priority[tris]
+        lost = corner_priority != corner_priority.max(axis=1)[:, None]
+        claimed = np.ones(vertex_count, dtype=bool)
+        claimed[tris[lost]] = False
+        accept = claimed[sources]
+        sources, targets, costs = sources[accept], targets[accept], costs[accept]
+
+        collapse_to = np.full(vertex_count, -1, dtype=np.int64)
+        collapse_to[sources] = targets
+
+        # Reject collapses that flip or strongly tilt any of the remaining triangles around the source.
+        moved = collapse_to[tris]
+        has_move = moved >= 0
+        affected = has_move.any(axis=1)
+        corner = np.argmax(has_move[affected], axis=1)
+        rows = np.nonzero(affected)[0]
+        old = tris[rows]
+        new = old.copy()
+        new[np.arange(len(rows)), corner] = moved[rows, corner]
+        collapsing = (new[:, 0] == new[:, 1]) | (new[:, 1] == new[:, 2]) | (new[:, 0] == new[:, 2])
+
+        def normals(t: NDArray):
+            return np.cross(positions[t[:, 1]] - positions[t[:, 0]], positions[t[:, 2]] - positions[t[:, 0]])
+
+        old_normals, new_normals = normals(old), normals(new)
+        cos = np.einsum("ij,ij->i", old_normals, new_normals)
+        cos /= np.maximum(np.linalg.norm(old_normals, axis=1) * np.linalg.norm(new_normals, axis=1), 1e-30)
+        flipped = (cos < max_normal_cos) & ~collapsing
+        bad_sources = np.unique(old[np.arange(len(rows)), corner][flipped])
+        if len(bad_sources):
+            rejected = np.union1d(rejected, bad_sources * vertex_count + collapse_to[bad_sources])
+            collapse_to[bad_sources] = -1
+
+        # Stop at the target, collapses are applied cheapest first and each removes the triangles on its edge.
+        removed = np.bincount(
+            old[np.arange(len(rows)), corner][collapsing],
+            minlength=vertex_count
+        )
+        valid = collapse_to[sources] >= 0
+        sources, costs = sources[valid], costs[valid]
+        if len(sources) == 0:
+            continue
+        order = np.argsort(costs, kind="stable")
+        total = np.cumsum(removed[sources[order]])
+        limit = int(np.searchsorted(total, len(tris) - target_count)) + 1
+        drop = sources[order[limit:]]
+        collapse_to[drop] = -1
+
+        applied = collapse_to >= 0
+        applied_sources = np.nonzero(applied)[0]
+        np.add.at(quadrics, collapse_to[applied_sources], quadrics[applied_sources])
+
+        remap = np.arange(vertex_count)
+        remap[applied_sources] = collapse_to[applied_sources]
+        tris = remap[tris]
+
+        alive = (tris[:, 0] != tris[:, 1]) & (tris[:, 1] != tris[:, 2]) & (tris[:, 0] != tris[:, 2])
+        tris, source = tris[alive], source[alive]
+
+    return tris.astype(np.int32), source
+
+
+def get_surface_samples(indices: NDArray, positions: NDArray, count: int, seed: int = 0) -> NDArray:
+    """Area weighted random points on a triangle list, the same input always gives the same points."""
+    positions = positions.astype(np.float64)
+    a, b, c = positions[indices[:, 0]], positions[indices[:, 1]], positions[indices[:, 2]]
+    areas = np.linalg.norm(np.cross(b - a, c - a), axis=1)
+    total = areas.sum()
+    weights = areas / total if total > 0 else None
+
+    rng = np.random.default_rng(seed)
+    tris = rng.choice(len(indices), size=count, p=weights)
+    u, v = rng.random(count), rng.random(count)
+    outside = u + v > 1
+    u[outside], v[outside] = 1 - u[outside], 1 - v[outside]
+    return a[tris] + (b[tris] - a[tris]) * u[:, None] + (c[tris] - a[tris]) * v[:, None]
+
+
+def get_point_triangle_distances(points: NDArray, a: NDArray, b: NDArray, c: NDArray) -> NDArray:
+    """Distances of (m, 1, 3) points to (1, k, 3) triangles, closest points by Voronoi region (Ericson 2004)."""
+    ab, ac = b - a, c - a
+    ap, bp, cp = points - a, points - b, points - c
+    d1, d2 = (ab * ap).sum(axis=-1), (ac * ap).sum(axis=-1)
+    d3, d4 = (ab * bp).sum(axis=-1), (ac * bp).sum(axis=-1)
+    d5, d6 = (ab * cp).sum(axis=-1), (ac * cp).sum(axis=-1)
+    va, vb, vc = d3 * d6 - d5 * d4, d5 * d2 - d1 * d6, d1 * d4 - d3 * d2
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        denom = va + vb + vc
+        closest = a + ab * (vb / denom)[..., None] + ac * (vc / denom)[..., None]
+
+        # Later regions take precedence, matching the order of the early outs in the scalar version.
+        bc_t = (d4 - d3) / ((d4 - d3) + (d5 - d6))
+        regions = [
+            ((va <= 0) & (d4 - d3 >= 0) & (d5 - d6 >= 0), b + (c - b) * bc_t[..., None]),
+            ((vb <= 0) & (d2 >= 0) & (d6 <= 0), a + ac * (d2 / (d2 - d6))[..., None]),
+            ((d6 >= 0) & (d5 <= d6), np.broadcast_to(c, closest.shape)),
+            ((vc <= 0) & (d1 >= 0) & (d3 <= 0), a + ab * (d1 / (d1 - d3))[..., None]),
+            ((d3 >= 0) & (d4 <= d3), np.broadcast_to(b, closest.shape)),
+            ((d1 <= 0) & (d2 <= 0), np.broadcast_to(a, closest.shape)),
+        ]
+        for mask, point in regions:
+            closest = np.where(mask[..., None], point, closest)
+
+    return np.linalg.norm(points - closest, axis=-1)
+
+
+def get_surface_distances(points: NDArray, indices: NDArray, positions: NDArray, block_size: int = 1 << 20) -> NDArray:
+    """Distance of every point to the closest triangle, evaluated in blocks of about block_size point triangle pairs."""
+    positions = positions.astype(np.float64)
+    a, b, c = positions[indices[:, 0]], positions[indices[:, 1]], positions[indices[:, 2]]
+    distances = np.full(len(points), np.inf)
+    tri_step = max(min(len(indices), block_size), 1)
+    point_step = max(block_size // tri_step, 1)
+
+    for first_tri in range(0, len(indices), tri_step):
+        tri_slice = slice(first_tri, first_tri + tri_step)
+        ta, tb, tc = a[None, tri_slice], b[None, tri_slice], c[None, tri_slice]
+        for first_point in range(0, len(points), point_step):
+            point_slice = slice(first_point, first_point + point_step)
+            block = get_point_triangle_distances(points[point_slice, None], ta, tb, tc)
+            distances[point_slice] = np.minimum(distances[point_slice], block.min(axis=1))
+
+    return distances
@@ -0,0 +1,173 @@
+import numpy as np
+
+from numpy.typing import NDArray
+
+from .cdae_builder_decimate import get_surface_samples, get_point_triangle_distances
+from .cdae_builder_optimizer import build_adjacency
+
+
+# Convex hulls and approximate convex decomposition for collision meshes, works on plain NumPy arrays.
+
+
+# Vertex limit of a convex collision mesh in Torque, also bounds the hull work, every step costs O(points + faces).
+MAX_HULL_VERTICES = 256
+
+
+def get_planes(points: NDArray, tris: NDArray) -> tuple[NDArray, NDArray]:
+    """Unit normals and offsets of triangle planes, a point p is in front of a plane if normal . p > offset."""
+    p0 = points[tris[:, 0]]
+    normals = np.cross(points[tris[:, 1]] - p0, points[tris[:, 2]] - p0)
+    normals /= np.maximum(np.linalg.norm(normals, axis=1), 1e-30)[:, None]
+    return normals, np.einsum("ij,ij->i", normals, p0)
+
+
+def get_initial_simplex(points: NDArray, eps: float) -> NDArray:
+    """Outward facing triangles of a large tetrahedron on the points, empty if the points are flat."""
+    extremes = np.concatenate([points.argmin(axis=0), points.argmax(axis=0)])
+    spans = np.linalg.norm(points[extremes][:, None] - points[extremes][None], axis=2)
+    i, j = np.unravel_index(np.argmax(spans), spans.shape)
+    a, b = extremes[i], extremes[j]
+
+    ab = points[b] - points[a]
+    line_distances = np.linalg.norm(np.cross(points - points[a], ab), axis=1) / max(np.linalg.norm(ab), 1e-30)
+    c = int(np.argmax(line_distances))
+    if line_distances[c] <= eps:
+        return np.zeros((0, 3), dtype=np.int64)
+
+    normal = np.cross(ab, points[c] - points[a])
+    plane_distances = (points - points[a]) @ normal / np.linalg.norm(normal)
+    d = int(np.argmax(np.abs(plane_distances)))
+    if abs(plane_distances[d]) <= eps:
+        return np.zeros((0, 3), dtype=np.int64)
+
+    tris = np.array([[a, b, c], [a, b, d], [a, c, d], [b, c, d]], dtype=np.int64)
+    normals, offsets = get_planes(points, tris)
+    inward = normals @ points[[a, b, c, d]].mean(axis=0) > offsets
+    tris[inward] = tris[inward][:, [0, 2, 1]]
+    return tris
+
+
+def get_convex_hull(points: NDArray, max_triangles: int = 0, max_vertices: int = MAX_HULL_VERTICES) -> NDArray:
+    """
+    Quickhull, returns outward facing triangles indexing points, empty if the points are flat.
+    Each step adds the point farthest outside of the hull, it stops before the hull exceeds max_vertices or,
+    with max_triangles > 0, the triangle budget, giving an inner approximation that keeps the most prominent vertices.
+    """
+    points = points.astype(np.float64)
+    if len(points) < 4:
+        return np.zeros((0, 3), dtype=np.int64)
+    eps = 1e-7 * max(float(np.ptp(points, axis=0).max()), 1e-30)
+
+    tris = get_initial_simplex(points, eps)
+    if len(tris) == 0:
+        return tris
+    normals, offsets = get_planes(points, tris)
+    alive = np.ones(len(tris), dtype=bool)
+
+    # Every point outside the hull is owned by one face it is in front of, the others by -1.
+    distances = points @ normals.T - offsets
+    owner = np.argmax(distances, axis=1)
+    distances = distances[np.arange(len(points)), owner]
+    owner[distances <= eps] = -1
+
+    vertex_count = len(points)
+    hull_vertices = 4
+    while hull_vertices < max_vertices:
+        if max_triangles > 0 and alive.sum() + 2 > max_triangles:
+            break
+        outside = np.nonzero(owner >= 0)[0]
+        if len(outside) == 0:
+            break
+        apex = outside[np.argmax(distances[outside])]
+        hull_vertices += 1
+
+        visible = alive & (normals @ points[apex] - offsets > eps)
+        edges = tris[visible][:, [0, 1, 1, 2, 2, 0]].reshape((-1, 2))
+        keys = edges[:, 0] * vertex_count + edges[:, 1]
+        horizon = edges[~np.isin(edges[:, 1] * vertex_count + edges[:, 0], keys)]
+
+        first_new = len(tris)
+        new_tris = np.concatenate([horizon, np.full((len(horizon), 1), apex)], axis=1)
+        new_normals, new_offsets = get_planes(points, new_tris)
+        tris = np.concatenate([tris, new_tris])
+        normals = np.concatenate([normals, new_normals])
+        offsets = np.concatenate([offsets, new_offsets])
+        alive[visible] = False
+        alive = np.concatenate([alive, np.ones(len(new_tris), dtype=bool)])
+
+        # Points of removed faces are either inside now, or in front of one of the new faces.
+        owner[apex] = -1
+        orphans = np.nonzero(owner >= 0)[0]
+        orphans = orphans[visible[owner[orphans]]]
+        if len(orphans):
+            orphan_distances = points[orphans] @ new_normals.T - new_offsets
+            best = np.argmax(orphan_distances, axis=1)
+            distances[orphans] = orphan_distances[np.arange(len(orphans)), best]
+            owner[orphans] = np.where(distances[orphans] > eps, first_new + best, -1)
+
+    return tris[alive]
+
+
+def get_nearby_surface_distances(points: NDArray, indices: NDArray, positions: NDArray, block_size: int = 1 << 20) -> NDArray:
+    """
+    Distance of every point to the closest triangle around its nearest vertex.
+    An upper bound of the true surface distance that is exact on reasonably shaped meshes, at a fraction of the cost.
+    """
+    positions = positions.astype(np.float64)
+    used = np.unique(indices)
+    nearest = np.zeros(len(points), dtype=np.int64)
+    nearest_distances = np.full(len(points), np.inf)
+    step = max(block_size // max(len(points), 1), 1)
+    for first in range(0, len(used), step):
+        block = used[first:first + step]
+        squared = (points * points).sum(axis=1)[:, None] - 2 * points @ positions[block].T + (positions[block] ** 2).sum(axis=1)[None]
+        best = np.argmin(squared, axis=1)
+        closer = squared[np.arange(len(points)), best] < nearest_distances
+        nearest[closer] = block[best[closer]]
+        nearest_distances[closer] = squared[np.arange(len(points)), best][closer]
+
+    offsets, adjacency = build_adjacency(indices, len(positions))
+    degrees = offsets[nearest + 1] - offsets[nearest]
+    owners = np.repeat(np.arange(len(points)), degrees)
+    ranks = np.arange(len(owners)) - np.repeat(np.cumsum(degrees) - degrees, degrees)
+    tris = indices[adjacency[offsets[nearest][owners] + ranks]]
+
+    pair_distances = get_point_triangle_distances(points[owners], positions[tris[:, 0]], positions[tris[:, 1]], positions[tris[:, 2]])
+    distances = np.full(len(points), np.inf)
+    np.minimum.at(distances, owners, pair_distances)
+    return distances
+
+
+def get_convex_decomposition(indices: NDArray, positions: NDArray, hull_count: int, max_triangles: int = 0, sample_count: int = 128) -> list[tuple[NDArray, NDArray]]:
+    """
+    Approximate convex decomposition of a (n, 3) triangle list into at most hull_count hulls.
+    The piece whose hull is farthest from its own surface is halved along its longest axis until the count is reached.
+    Returns (points, triangles) per hull, flat pieces have no hull and are left out.
+    """
+    positions = positions.astype(np.float64)
+    centroids = positions[indices].mean(axis=1)
+    eps = 1e-6 * max(float(np.ptp(positions, axis=0).max()), 1e-30) if len(positions) else 0.0
+
+    def build(tris: NDArray) -> tuple[NDArray, NDArray, NDArray, float]:
+        points = positions[np.unique(indices[tris])]
+        hull = get_convex_hull(points, max_triangles)
+        concavity = 0.0
+        if len(hull) and hull_count > 1 and len(tris) > 1:
+            samples = get_surface_samples(hull, points, sample_count)
+            concavity = float(get_nearby_surface_distances(samples, indices[tris], positions).max())
+        return tris, points, hull, concavity
+
+    pieces = [build(np.arange(len(indices)))] if len(indices) else []
+    while 0 < len(pieces) < hull_count:
+        worst = int(np.argmax([piece[3] for piece in pieces]))
+        tris = pieces[worst][0]
+        if pieces[worst][3] <= eps:
+            break
+
+        points = centroids[tris]
+        axis = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+        order = np.argsort(points[:, axis], kind="stable")
+        half = len(tris) // 2
+        pieces[worst:worst + 1] = [build(np.sort(tris[order[:half]])), build(np.sort(tris[order[half:]]))]
+
+    return [(points, hull) for _, points, hull, _ in pieces if len(hull)]
@@ -0,0 +1,347 @@
+import numpy as np
+
+from numpy.typing import NDArray
+
+from .cdae_v31 import CdaeV31
+
+
+# Post-weld GPU optimization of indexed triangle lists, works on plain NumPy arrays.
+
+
+def get_cache_misses(indices: NDArray, cache_size: int) -> int:
+    """Simulates a FIFO post-transform cache, a vertex is cached if it entered within the last cache_size misses."""
+    flat = indices.ravel().tolist()
+    entered = dict()
+    misses = 0
+    for v in flat:
+        if misses - entered.get(v, -cache_size - 1) > cache_size:
+            entered[v] = misses
+            misses += 1
+    return misses
+
+
+def get_degenerate_mask(indices: NDArray, positions: NDArray) -> NDArray:
+    """Triangles that reuse a vertex or have zero area."""
+    a, b, c = indices[:, 0], indices[:, 1], indices[:, 2]
+    mask = (a == b) | (b == c) | (a == c)
+    cross = np.cross(positions[b] - positions[a], positions[c] - positions[a])
+    mask |= ~np.any(cross, axis=1)
+    return mask
+
+
+def build_adjacency(indices: NDArray, vertex_count: int) -> tuple[NDArray, NDArray]:
+    """Vertex to triangle adjacency in CSR layout, returns offsets and triangle indices."""
+    flat = indices.ravel()
+    counts = np.bincount(flat, minlength=vertex_count)
+    offsets = np.zeros(vertex_count + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    triangles = (np.argsort(flat, kind="stable") // 3).astype(np.int32)
+    return offsets, triangles
+
+
+def tipsify(indices: NDArray, vertex_count: int, cache_size: int) -> tuple[NDArray, NDArray]:
+    """
+    Tipsify (Sander et al. 2007), reorders triangles for vertex cache locality in linear time.
+    Returns the new triangle order and the positions where the walk hit a dead end, used as cluster boundaries.
+    """
+    tri_count = len(indices)
+    offsets, adjacency = build_adjacency(indices, vertex_count)
+    offsets = offsets.tolist()
+    adjacency = adjacency.tolist()
+    tris = indices.tolist()
+
+    live = np.diff(np.asarray(offsets)).tolist()
+    stamps = [0] * vertex_count
+    emitted = [False] * tri_count
+    dead_end: list[int] = []
+    order: list[int] = []
+    boundaries: list[int] = [0]
+
+    time = cache_size + 1
+    cursor = 0
+    fan = int(np.argmax(np.asarray(live) > 0)) if tri_count > 0 else -1
+
+    while fan >= 0:
+        candidates = []
+        for t in adjacency[offsets[fan]:offsets[fan + 1]]:
+            if emitted[t]:
+                continue
+            emitted[t] = True
+            order.append(t)
+            for v in tris[t]:
+                dead_end.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if time - stamps[v] > cache_size:
+                    stamps[v] = time
+                    time += 1
+
+        fan = -1
+        best = -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = 0
+                if time - stamps[v] + 2 * live[v] <= cache_size:
+                    priority = time - stamps[v]
+                if priority > best:
+                    best = priority
+                    fan = v
+
+        if fan >= 0:
+            continue
+
+        while dead_end:
+            v = dead_end.pop()
+            if live[v] > 0:
+                fan = v
+                break
+
+        while fan < 0 and cursor < vertex_count:
+            if live[cursor] > 0:
+                fan = cursor
+            cursor += 1
+
+        if fan >= 0:
+            boundaries.append(len(order))
+
+    return np.asarray(order, dtype=np.int64), np.asarray(boundaries, dtype=np.int64)
+
+
+def sort_clusters_for_overdraw(indices: NDArray, boundaries: NDArray, positions: NDArray) -> NDArray:
+    """
+    Orders clusters front to back from a view independent measure (Sander et al. 2007):
+    clusters facing away from the mesh center get drawn first, as they are most likely to occlude the rest.
+    """
+    if len(boundaries) < 2:
+        return np.arange(len(indices))
+
+    a, b, c = positions[indices[:, 0]], positions[indices[:, 1]], positions[indices[:, 2]]
+    normals = np.cross(b - a, c - a)
+    areas = np.linalg.norm(normals, axis=1)
+    centroids = (a + b + c) / 3
+
+    mesh_center = np.average(centroids, axis=0, weights=areas) if areas.sum() > 0 else centroids.mean(axis=0)
+    cluster_normals = np.add.reduceat(normals, boundaries, axis=0)
+    cluster_areas = np.add.reduceat(areas, boundaries)
+    cluster_centers = np.add.reduceat(centroids * areas[:, None], boundaries, axis=0) / np.maximum(cluster_areas, 1e-12)[:, None]
+
+    metric = np.einsum("ij,ij->i", cluster_centers - mesh_center, cluster_normals)
+    cluster_order = np.argsort(-metric, kind="stable")
+
+    sizes = np.diff(np.append(boundaries, len(indices)))
+    cluster_of_tri = np.repeat(np.arange(len(boundaries)), sizes)
+    rank = np.empty(len(cluster_order), dtype=np.int64)
+    rank[cluster_order] = np.arange(len(cluster_order))
+    return np.argsort(rank[cluster_of_tri], kind="stable")
+
+
+def stripify(indices: NDArray) -> NDArray:
+    """
+    Greedy stripification of a (n, 3) triangle list, strips are joined with degenerate triangles.
+    Winding follows the usual convention, odd triangles of a strip are flipped.
+    """
+    tris = indices.tolist()
+    edges: dict[tuple[int, int], list[int]] = {}
+    for t, (a, b, c) in enumerate(tris):
+        edges.setdefault((a, b), []).append(t)
+        edges.setdefault((b, c), []).append(t)
+        edges.setdefault((c, a), []).append(t)
+
+    used = [False] * len(tris)
+
+    def third(t: int, u: int, v: int) -> int:
+        a, b, c = tris[t]
+        return c if (a, b) == (u, v) else a if (b, c) == (u, v) else b
+
+    def find_next(u: int, v: int) -> int:
+        for t in edges.get((u, v), ()):
+            if not used[t]:
+                return t
+        return -1
+
+    def walk(strip: list[int], claimed: list[int]) -> list[int]:
+        while True:
+            u, v = strip[-2], strip[-1]
+            # Even triangles contain the directed edge (u, v), odd ones (v, u).
+            key = (u, v) if len(strip) % 2 == 0 else (v, u)
+            t = find_next(*key)
+            if t < 0:
+                return strip
+            used[t] = True
+            claimed.append(t)
+            strip.append(third(t, *key))
+
+    result: list[int] = []
+    for start in range(len(tris)):
+        if used[start]:
+            continue
+
+        a, b, c = tris[start]
+        best: list[int] = None
+        for rotation in ((a, b, c), (b, c, a), (c, a, b)):
+            claimed = [start]
+            used[start] = True
+            strip = walk(list(rotation), claimed)
+            for t in claimed:
+                used[t] = False
+            if best is None or len(strip) > len(best):
+                best = strip
+
+        used[start] = True
+        best = walk(best[:3], [])
+
+        if result:
+            # Bridge with degenerates, and keep the next strip starting on an even triangle.
+            result.append(result[-1])
+            if len(result) % 2 == 0:
+                result.append(best[0])
+            result.append(best[0])
+        result.extend(best)
+
+    return np.asarray(result, dtype=np.int32)
+
+
+def split_triangles(indices: NDArray, positions: NDArray, max_triangles: int, max_vertices: int) -> list[NDArray]:
+    """
+    k-d split on triangle centroids, halves along the longest axis until every piece fits the budgets (0 disables one).
+    Returns sorted triangle indices per piece, in spatial order, identical input always gives identical pieces.
+    """
+    centroids = positions[indices].mean(axis=1)
+    pieces: list[NDArray] = []
+    stack = [np.arange(len(indices))]
+
+    while stack:
+        tris = stack.pop()
+        over = max_triangles > 0 and len(tris) > max_triangles
+        over = over or (max_vertices > 0 and len(np.unique(indices[tris])) > max_vertices)
+        if len(tris) < 2 or not over:
+            pieces.append(tris)
+            continue
+
+        points = centroids[tris]
+        axis = int(np.argmax(points.max(axis=0) - points.min(axis=0)))
+        order = np.argsort(points[:, axis], kind="stable")
+        half = len(tris) // 2
+        stack.append(np.sort(tris[order[half:]]))
+        stack.append(np.sort(tris[order[:half]]))
+
+    return pieces
+
+
+def get_first_use_order(indices: NDArray, vertex_count: int) -> NDArray:
+    """Vertex order by first appearance in the index buffer, unused vertices are dropped."""
+    used, first = np.unique(indices.ravel(), return_index=True)
+    return used[np.argsort(first)]
+
+
+
+class CdaeMeshOptimizer:
+
+    def __init__(self):
+        self.cache_size: int = 16
+        self.optimize_overdraw: bool = False
+        self.remove_degenerates: bool = True
+        self.compute_stats: bool = False
+        self.triangle_count_before: int = 0
+        self.triangle_count: int = 0
+        self.vertex_count_before: int = 0
+        self.vertex_count: int = 0
+        self.misses_before: int = 0
+        self.misses_after: int = 0
+
+
+    def optimize_indices(self, indices: NDArray, positions: NDArray) -> NDArray:
+
+        if self.remove_degenerates and len(indices) > 0:
+            indices = indices[~get_degenerate_mask(indices, positions)]
+
+        if len(indices) == 0:
+            return indices
+
+        order, boundaries = tipsify(indices, len(positions), self.cache_size)
+        indices = indices[order]
+
+        if self.optimize_overdraw:
+            indices = indices[sort_clusters_for_overdraw(indices, boundaries, positions)]
+
+        return indices
+
+
+    def optimize(self, npmesh):
+        """
+        Reorders each draw region of a welded NpMesh for the vertex cache, optionally for overdraw,
+        then reorders vertices into first use order for fetch locality.
+        """
+        indices = npmesh.indices.reshape((-1, 3))
+        regions = npmesh.draw_regions
+
+        if self.compute_stats:
+            self.misses_before += get_cache_misses(indices, self.cache_size)
+            self.triangle_count_before += len(indices)
+            self.vertex_count_before += len(np.unique(indices))
+
+        regions = regions.copy()
+        parts = []
+        start = 0
+        for i in range(len(regions)):
+            first = regions[i]['elements_start'] // 3
+            count = regions[i]['elements_count'] // 3
+            part = self.optimize_indices(indices[first:first + count], npmesh.positions)
+            regions[i]['elements_start'] = start * 3
+            regions[i]['elements_count'] = len(part) * 3
+            start += len(part)
+            parts.append(part)
+
+        indices = np.concatenate(parts) if parts else indices
+        npmesh.draw_regions = regions[regions['elements_count'] > 0]
+
+        order = get_first_use_order(indices, len(npmesh.positions))
+        remap = np.empty(len(npmesh.positions), dtype=np.int32)
+        remap[order] = np.arange(len(order), dtype=np.int32)
+        npmesh.indices = remap[indices].astype(np.int32)
+        npmesh.reorder_vertices(order)
+
+        if self.compute_stats:
+            self.misses_after += get_cache_misses(npmesh.indices, self.cache_size)
+            self.triangle_count += len(npmesh.indices)
+            self.vertex_count += len(order)
+
+
+    def get_stats(self) -> str:
+        triangles_before = max(self.triangle_count_before, 1)
+        triangles = max(self.triangle_count, 1)
+        vertices_before = max(self.vertex_count_before, 1)
+        vertices = max(self.vertex_count, 1)
+        return (
+            f"ACMR {self.misses_before / triangles_before:.3f} -> {self.misses_after / triangles:.3f}, "
+            f"ATVR {self.misses_before / vertices_before:.3f} -> {self.misses_after / vertices:.3f}"
+        )
+
+
+    def stripify(self, npmesh) -> tuple[int, int]:
+        """
+        Converts each triangle list region into a strip region where that takes fewer indices.
+        Returns the index count before and after.
+        """
+        indices = npmesh.indices.ravel()
+        regions = npmesh.draw_regions.copy()
+        parts = []
+        start = 0
+        for i in range(len(regions)):
+            first = regions[i]['elements_start']
+            count = regions[i]['elements_count']
+            part = indices[first:first + count]
+
+            strip = stripify(part.reshape((-1, 3)))
+            if len(strip) < len(part):
+                part = strip
+                regions[i]['material_index'] |= CdaeV31.Mesh.DrawRegion.DrawType.Strip
+
+            regions[i]['elements_start'] = start
+            regions[i]['elements_count'] = len(part)
+            start += len(part)
+            parts.append(part)
+
+        npmesh.draw_regions = regions
+        npmesh.indices = np.concatenate(parts).astype(np.int32) if parts else indices
+        return len(indices), len(npmesh.indices)
@@ -52,6 +52,12 @@ class CdaeNodeList:
         return node
     
 
+    def iter_nodes(self):
+        for node in self.nodes:
+            yield node
+            yield from node.iter_nodes()
+
+
     def print_nodes_recursive(self, indent = 0):
         istr = ' '*indent
         if indent > 8:
@@ -88,6 +94,8 @@ class CdaeTree:
     class Mesh:
         def __init__(self, obj: bpy.types.Object):
             self.bpy_mesh_obj = obj
+            self.prebuilt: list[CdaeV31.Mesh] = None
+            self.lod_ratio: float = 1.0
 
 
 
@@ -98,11 +106,13 @@ class CdaeTree:
             self.meshes: list[CdaeTree.Mesh] = []
 
 
-        def set_mesh(self, index: int, obj: bpy.types.Object):
+        def set_mesh(self, index: int, obj: bpy.types.Object, lod_ratio: float = 1.0):
             
             if len(self.meshes) > index:
                 if self.meshes[index].bpy_mesh_obj is None:
                     self.meshes[index].bpy_mesh_obj = obj
+                    self.meshes[index].lod_ratio = lod_ratio
+                    return
                 else:
                     raise Exception()
             
@@ -110,6 +120,7 @@ class CdaeTree:
                 self.meshes.append(CdaeTree.Mesh(None))
             
             self.meshes.append(CdaeTree.Mesh(obj))
+            self.meshes[index].lod_ratio = lod_ratio
     
 
 
@@ -119,6 +130,7 @@ class CdaeTree:
 
             super().__init__(nodes)
             self.bpy_sample_obj: bpy.types.Object = None
+            self.instance_matrix = None
             self.name = name
             self.objects = objects
             self.transforms: Transforms = Transforms()
@@ -173,17 +185,57 @@ class CdaeTree:
         self.details: dict[str, CdaeTree.Detail] = {}
         self.build_mode = CdaeTreeBuildMode.NONE
         self._mesh_index_counter = 0
+        self.lod_levels: list[tuple[float, int]] = []
+        self.lod_base_size: int = 2
+        self.lod_levels_skipped: int = 0
 
 
-    def get_detail(self, name: str = "detail2"):
+    def get_detail(self, name: str = "detail2", size: int = 2):
         detail = self.details.get(name, None)
         if detail is None:
             detail = CdaeTree.Detail()
-            detail.template.size = 2
+            detail.template.size = size
             self.details[name] = detail
         return detail
 
 
+    def get_base_detail(self):
+        """The full detail level, named after its size once generated levels sit below it."""
+        if self.lod_levels:
+            return self.get_detail(f"detail{self.lod_base_size}", self.lod_base_size)
+        return self.get_detail()
+
+
+    def get_shape_details(self, shape: SubShape) -> 'list[CdaeTree.Detail]':
+        """Visible mesh details of a shape, largest first."""
+        details = [detail for detail in self.details.values() if detail.shape is shape and detail.template.objectDetailNum >= 0 and detail.template.size >= 0]
+        return sorted(details, key=lambda detail: -detail.template.size)
+
+
+    @staticmethod
+    def parse_lod_levels(ratios: str, sizes: str) -> list[tuple[float, int]]:
+        """Pairs of comma separated triangle ratios and pixel sizes, e.g. "0.5, 0.25" and "64, 32"."""
+        ratio_list = [float(value) for value in re.split(r'[,\s]+', ratios.strip()) if value]
+        size_list = [int(value) for value in re.split(r'[,\s]+', sizes.strip()) if value]
+        if len(ratio_list) != len(size_list):
+            raise ValueError(f"{len(ratio_list)} LOD ratios but {len(size_list)} LOD sizes")
+        for ratio in ratio_list:
+            if not 0 < ratio < 1:
+                raise ValueError(f"LOD ratio {ratio} is not between 0 and 1")
+        return list(zip(ratio_list, size_list))
+
+
+    def get_lod_levels(self, base_size: int) -> list[tuple[float, int]]:
+        """Generated levels below a detail of base_size, largest first, levels that are not below it are skipped."""
+        levels = sorted(self.lod_levels, key=lambda level: -level[1])
+        kept = [(ratio, size) for ratio, size in levels if size < base_size]
+        skipped = len(levels) - len(kept)
+        if skipped and not self.lod_levels_skipped:
+            print(f"LOD: generated levels not below the detail size are skipped, e.g. size {levels[0][1]} for detail size {base_size}")
+        self.lod_levels_skipped += skipped
+        return kept
+
+
     def get_shape(self, name: str = "_default_") -> SubShape:
         shape = self.shapes.get(name, None)
         if shape is None:
@@ -202,18 +254,33 @@ class CdaeTree:
             yield from shape.iter_meshes()
 
 
+    def iter_nodes(self):
+        for shape in self.shapes.values():
+            yield from shape.iter_nodes()
+
+
     def _add_obj_FLAT_DUMP(self, obj: bpy.types.Object):
 
         if not ObjectProperties.has_mesh(obj):
             return
 
-        detail = self.get_detail()
+        detail = self.get_base_detail()
         shape = self.get_shape()
         detail.shape = shape
         node = shape.get_child_node(self._get_obj_name(obj))
         node.bpy_sample_obj = obj
         node.get_object().set_mesh(0, obj)
 
+        if ObjectProperties.get_role(obj) not in (ObjectRole.Mesh, ObjectRole.Generic):
+            return
+
+        # Generated levels are extra meshes of the same object, each selected by its own detail.
+        for index, (ratio, size) in enumerate(self.get_lod_levels(self.lod_base_size)):
+            node.get_object().set_mesh(index + 1, obj, ratio)
+            lod_detail = self.get_detail(f"detail{size}", size)
+            lod_detail.shape = shape
+            lod_detail.template.objectDetailNum = index + 1
+
 
     def _add_obj_DAE_NODE_TREE(self, obj: bpy.types.Object):
 
@@ -222,11 +289,11 @@ class CdaeTree:
         lod_size = ObjectProperties.get_lod(obj)
         namespace = "base00.start01"
 
-        def add(path: str, use_obj = True):
+        def add(path: str, use_obj = True, lod_ratio: float = 1.0):
             node = shape.get_node_by_path(path)
             if use_obj:
                 node.bpy_sample_obj = obj
-                node.get_object().set_mesh(0, obj)
+                node.get_object().set_mesh(0, obj, lod_ratio)
 
         match ObjectProperties.get_role(obj):
             case ObjectRole.Generic:
@@ -234,6 +301,8 @@ class CdaeTree:
                 add(path, has_mesh)
             case ObjectRole.Mesh:
                 add(f"{namespace}.detail{lod_size}")
+                for ratio, size in self.get_lod_levels(lod_size):
+                    add(f"{namespace}.detail{size}", True, ratio)
             case ObjectRole.Collision:
                 add(f"{namespace}.colmesh-1")
             case ObjectRole.Billboard:
@@ -296,6 +365,22 @@ class CdaeTree:
             add(tnode, self._get_obj_name(tnode.obj))
 
 
+    def add_instance(self, name: str, matrix, meshes: list[CdaeV31.Mesh]):
+        """Adds a node with a fixed transform that references already built meshes, used for depsgraph instances."""
+        if self.build_mode == CdaeTreeBuildMode.NONE:
+            return
+
+        detail = self.get_base_detail()
+        shape = self.get_shape()
+        if detail.shape is None:
+            detail.shape = shape
+        node = shape.get_child_node(name)
+        node.instance_matrix = matrix
+        obj = node.get_object()
+        obj.set_mesh(0, None)
+        obj.meshes[0].prebuilt = meshes
+
+
     def add_objects(self, objects: set[bpy.types.Object]):
         match self.build_mode:
             case CdaeTreeBuildMode.BLENDER_HIERARCHY:
@@ -115,7 +115,7 @@ class CdaeParser:
 
     def get_clean_data(self, info: CdaeV31.Mesh):
 
-        all_indices = info.indices.to_numpy_array(np.int32).reshape(-1, 3)
+        all_indices = info.indices.to_numpy_array(np.int32)
         positions = info.verts.to_numpy_array(np.float32).reshape(-1, 3)
 
         # Collect filtered triangles and material mapping
@@ -123,7 +123,7 @@ class CdaeParser:
         region_materials = []
 
         for region in info.unpack_regions():
-            tris = all_indices[region.get_polygon_range()]
+            tris = region.get_triangles(all_indices)
 
             # Filter out triangles where any two vertices share the same position
             p0 = positions[tris[:, 0]]
@@ -183,8 +183,9 @@ class CdaeParser:
             layer = mesh.color_attributes.new(name="Color", domain='CORNER', type='FLOAT_COLOR')
             layer.data.foreach_set("color", loop_colors.ravel())
 
-        if info.norms.element_count:
-            loop_normals = -info.norms.to_numpy_array(np.float32).reshape(-1, 3)[indices]
+        normals = info.get_vec3f_normals()
+        if normals.size:
+            loop_normals = -normals.reshape(-1, 3)[indices]
             mesh.normals_split_custom_set(loop_normals)
 
         if self.validate:
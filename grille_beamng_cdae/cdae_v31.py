@@ -5,6 +5,7 @@ from dataclasses import dataclass, asdict
 from enum import Enum, IntFlag
 
 from .packed_vector import PackedVector
+from .torque3d import Torque3D
 from .numerics import *
 
 
@@ -296,6 +297,23 @@ class CdaeV31:
                 return range(start, stop)
 
 
+            def get_triangles(self, indices: np.ndarray) -> np.ndarray:
+                """Expands the region into a (n, 3) triangle list, strips alternate winding on odd triangles."""
+                elements = indices[self.elements_start:self.elements_start + self.elements_count]
+                draw_type = self.info.type
+
+                if draw_type == CdaeV31.Mesh.DrawRegion.DrawType.Triangles:
+                    return elements.reshape(-1, 3)
+
+                count = max(len(elements) - 2, 0)
+                first = np.arange(count)
+                if draw_type == CdaeV31.Mesh.DrawRegion.DrawType.Strip:
+                    odd = first & 1
+                    return np.stack([elements[first + odd], elements[first + 1 - odd], elements[first + 2]], axis=1)
+
+                return np.stack([np.full(count, elements[0] if count else 0), elements[first + 1], elements[first + 2]], axis=1)
+
+
             def unpack(self, data: bytes):
                 self.elements_start, self.elements_count, self.raw_info = struct.unpack("<iii", data)
 
@@ -337,6 +355,13 @@ class CdaeV31:
             self.vertsPerFrame: int = 0
             self.flags: CdaeV31.Mesh.Flags = 0
 
+            # Skin meshes only, influences are parallel lists sorted by vertex.
+            self.initial_transforms = create_empty(64) #bone matrix4x4, inverse bind pose in shape space
+            self.vertex_index = create_empty(4) #influence int
+            self.bone_index = create_empty(4) #influence int
+            self.weight = create_empty(4) #influence float
+            self.node_index = create_empty(4) #bone int
+
 
         def unpack_regions(self):
             return self.draw_regions.unpack_list(CdaeV31.Mesh.DrawRegion)
@@ -348,6 +373,33 @@ class CdaeV31:
             return float_array
         
 
+        def get_vec3f_normals(self):
+            if self.norms.element_count == 0 and self.flags & CdaeV31.Mesh.Flags.USE_ENCODED_NORMALS:
+                return Torque3D.decode_normals(self.encoded_norms.to_numpy_array(np.uint8)).ravel()
+            return self.norms.to_numpy_array(np.float32)
+        
+
+        def get_triangles(self) -> np.ndarray:
+            """All regions as one (n, 3) triangle list, without the degenerates that join strips."""
+            indices = self.indices.to_numpy_array(np.int32)
+            regions = self.unpack_regions()
+            if len(regions) == 0:
+                return np.zeros((0, 3), dtype=np.int32)
+            tris = np.concatenate([region.get_triangles(indices) for region in regions])
+            return tris[(tris[:, 0] != tris[:, 1]) & (tris[:, 1] != tris[:, 2]) & (tris[:, 0] != tris[:, 2])]
+
+
+        def get_poly_count(self) -> int:
+            """Polygon count the way Torque3D counts it, strips and fans count their degenerates."""
+            count = 0
+            for region in self.unpack_regions():
+                if region.info.type == CdaeV31.Mesh.DrawRegion.DrawType.Triangles:
+                    count += region.elements_count // 3
+                else:
+                    count += max(region.elements_count - 2, 0)
+            return count
+
+
         def data_equals(self, other: 'CdaeV31.Mesh') -> bool:
             pass
 
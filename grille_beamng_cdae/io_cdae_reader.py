@@ -120,7 +120,11 @@ def read_v31_from_stream(f: BufferedReader) -> CdaeV31:
             continue
 
         elif (mesh.type == CdaeV31.MeshType.SKIN):
-            raise Exception()
+            mesh.initial_transforms = read_vector()
+            mesh.vertex_index = read_vector()
+            mesh.bone_index = read_vector()
+            mesh.weight = read_vector()
+            mesh.node_index = read_vector()
         
         else:
             raise Exception()
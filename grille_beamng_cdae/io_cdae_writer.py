@@ -89,6 +89,13 @@ def get_body_bytes(cdae: CdaeV31) -> bytes:
         body.write_int32(mesh.vertsPerFrame)
         body.write_int32(mesh.flags)
 
+        if mesh.type == CdaeV31.MeshType.SKIN:
+            write_vector(mesh.initial_transforms)
+            write_vector(mesh.vertex_index)
+            write_vector(mesh.bone_index)
+            write_vector(mesh.weight)
+            write_vector(mesh.node_index)
+
 
     body.write_int32(len(cdae.sequences))
     for seq in cdae.sequences:
@@ -4,6 +4,7 @@ from enum import Enum
 
 
 class Semantic(str, Enum):
+    POSITION = "POSITION"
     VERTEX = "VERTEX"
     NORMAL = "NORMAL"
     TEXCOORD = "TEXCOORD"
@@ -25,6 +26,9 @@ class DaeTag(str, Enum):
     input = "input"
     triangles = "triangles"
     polylist = "polylist"
+    polygons = "polygons"
+    ph = "ph"
+    vcount = "vcount"
     p = "p"
     library_materials = "library_materials"
     material = "material"
@@ -34,6 +38,12 @@ class DaeTag(str, Enum):
     library_visual_scenes = "library_visual_scenes"
     visual_scene = "visual_scene"
     node = "node"
+    matrix = "matrix"
+    translate = "translate"
+    rotate = "rotate"
+    scale = "scale"
+    lookat = "lookat"
+    skew = "skew"
     instance_geometry = "instance_geometry"
     bind_material = "bind_material"
     instance_material = "instance_material"
@@ -69,7 +79,9 @@ class Geometry:
 
 
     def __init__(self):
+        self.id: str = None
         self.sources: dict[str, NDArray] = {}
+        self.vertices: dict[str, list[Geometry.Triangles.Input]] = {}
         self.triangles: list[Geometry.Triangles] = []
 
 
@@ -77,9 +89,11 @@ class Geometry:
 class Node:
 
     def __init__(self):
-        self.name: str
+        self.name: str = ""
         self.children: list[Node] = []
-        self.geometry: str
+        self.matrix: NDArray = None
+        self.geometries: list[str] = []
+        self.material_bindings: dict[str, str] = {}
 
 
 
@@ -1,6 +1,9 @@
+import re
+import copy
+import math
 import struct
+import mathutils
 import numpy as np
-import zstandard as zstd
 import xml.etree.cElementTree as ET
 
 from dataclasses import dataclass
@@ -13,100 +16,514 @@ from .cdae_v31 import CdaeV31
 from .numerics import *
 
 
+def local_tag(xml: ET.Element) -> str:
+    return xml.tag.rpartition("}")[2]
+
+
+def find(xml: ET.Element, tag: DaeTag) -> ET.Element | None:
+    for child in xml:
+        if local_tag(child) == tag:
+            return child
+    return None
+
+
+def findall(xml: ET.Element, tag: DaeTag) -> list[ET.Element]:
+    return [child for child in xml if local_tag(child) == tag]
+
+
+def get_ref(url: str | None) -> str | None:
+    if url is None:
+        return None
+    return url[1:] if url.startswith("#") else url
+
+
 def parse_array(xml: ET.Element, dtype=np.float32) -> NDArray:
+    if xml is None or not xml.text:
+        return np.empty(0, dtype=dtype)
     return np.fromstring(xml.text, dtype=dtype, sep=" ")
 
 
+def parse_source(xml: ET.Element) -> NDArray:
+    array = parse_array(find(xml, DaeTag.float_array))
+
+    stride = 1
+    technique = find(xml, DaeTag.technique_common)
+    if technique is not None:
+        accessor = find(technique, DaeTag.accessor)
+        if accessor is not None:
+            stride = int(accessor.get("stride", 1))
+
+    return array.reshape(-1, stride)
+
+
 def parse_input(xml: ET.Element) -> Geometry.Triangles.Input:
-    return Geometry.Triangles.Input(Semantic(xml.get("semantic")), xml.get("source"), xml.get("offset", 0), xml.get("set", 0))
+    semantic = xml.get("semantic")
+    semantic = Semantic(semantic) if semantic in Semantic.__members__ else semantic
+    return Geometry.Triangles.Input(semantic, get_ref(xml.get("source")), int(xml.get("offset", 0)), int(xml.get("set", 0)))
 
 
 def parse_triangle(xml: ET.Element) -> Geometry.Triangles:
     result = Geometry.Triangles()
+    result.count = int(xml.get("count", 0))
+    result.mat = xml.get("material")
 
-    result.indices = parse_array(xml.find(DaeTag.p), np.int32)
-    inputlist = xml.findall(DaeTag.param)
-    for input in inputlist:
+    for input in findall(xml, DaeTag.input):
         result.inputs.append(parse_input(input))
 
+    stride = max((input.offset for input in result.inputs), default=0) + 1
+
+    match local_tag(xml):
+        case DaeTag.polylist:
+            indices = parse_array(find(xml, DaeTag.p), np.int64).reshape(-1, stride)
+            vcount = parse_array(find(xml, DaeTag.vcount), np.int64)
+            indices = indices[triangulate_fan(vcount)]
+        case DaeTag.polygons:
+            # One <p> per polygon, the vertex counts follow from their lengths.
+            if find(xml, DaeTag.ph) is not None:
+                raise ValueError(f"<polygons> with holes (<ph>) are not supported, material '{result.mat}'")
+            polygons = [parse_array(p, np.int64).reshape(-1, stride) for p in findall(xml, DaeTag.p)]
+            indices = np.concatenate(polygons) if len(polygons) > 0 else np.zeros((0, stride), dtype=np.int64)
+            vcount = np.array([len(polygon) for polygon in polygons], dtype=np.int64)
+            indices = indices[triangulate_fan(vcount)]
+        case _:
+            indices = parse_array(find(xml, DaeTag.p), np.int64).reshape(-1, stride)
+
+    result.indices = indices
     return result
 
 
+def triangulate_fan(vcount: NDArray) -> NDArray:
+    """Returns corner indices that fan-triangulate polygons of the given sizes."""
+    tri_counts = np.maximum(vcount - 2, 0)
+    poly_starts = np.concatenate(([0], np.cumsum(vcount)[:-1]))
+
+    first = np.repeat(poly_starts, tri_counts)
+    tri_starts = np.concatenate(([0], np.cumsum(tri_counts)[:-1]))
+    step = np.arange(first.size) - np.repeat(tri_starts, tri_counts) + 1
+
+    return np.stack((first, first + step, first + step + 1), axis=1).ravel()
+
+
 def parse_geometry(xml: ET.Element) -> Geometry:
     result = Geometry()
-    mesh = xml.find(DaeTag.mesh)
+    result.id = xml.get("id")
+    mesh = find(xml, DaeTag.mesh)
+    if mesh is None:
+        return result
 
-    srclist = mesh.findall(DaeTag.source)
-    for src in srclist:
-        array = parse_array(src.find(DaeTag.float_array))
-        result.sources[src.get("id")] = array
+    for src in findall(mesh, DaeTag.source):
+        result.sources[src.get("id")] = parse_source(src)
 
-    trilist0 = mesh.findall(DaeTag.triangles)
-    for tri in trilist0:
-        result.triangles.append(parse_triangle(tri))
+    for vertices in findall(mesh, DaeTag.vertices):
+        result.vertices[vertices.get("id")] = [parse_input(input) for input in findall(vertices, DaeTag.input)]
 
-    trilist1 = mesh.findall(DaeTag.polylist)
-    for tri in trilist1:
-        result.triangles.append(parse_triangle(tri))
+    for tri in mesh:
+        if local_tag(tri) in (DaeTag.triangles, DaeTag.polylist, DaeTag.polygons):
+            result.triangles.append(parse_triangle(tri))
 
     return result
 
 
 def parse_node(xml: ET.Element) -> Node:
     res = Node()
-    nodelist = xml.findall(DaeTag.node)
-    for node in nodelist:
-        res.children.append(parse_node(node))
+    res.name = xml.get("name") or xml.get("id") or ""
+
+    for child in xml:
+        match local_tag(child):
+            case DaeTag.node:
+                res.children.append(parse_node(child))
+            case DaeTag.matrix:
+                matrix = parse_array(child).reshape(4, 4)
+                res.matrix = matrix if res.matrix is None else res.matrix @ matrix
+            case DaeTag.translate:
+                matrix = np.identity(4, dtype=np.float32)
+                matrix[:3, 3] = parse_array(child)
+                res.matrix = matrix if res.matrix is None else res.matrix @ matrix
+            case DaeTag.rotate:
+                x, y, z, angle = parse_array(child)
+                matrix = np.array(mathutils.Matrix.Rotation(math.radians(angle), 4, (x, y, z)), dtype=np.float32)
+                res.matrix = matrix if res.matrix is None else res.matrix @ matrix
+            case DaeTag.scale:
+                matrix = np.diag([*parse_array(child), 1.0]).astype(np.float32)
+                res.matrix = matrix if res.matrix is None else res.matrix @ matrix
+            case DaeTag.lookat | DaeTag.skew:
+                raise ValueError(f"node '{res.name}': <{local_tag(child)}> transforms are not supported")
+            case DaeTag.instance_geometry:
+                res.geometries.append(get_ref(child.get("url")))
+                for inst_mat in child.iter():
+                    if local_tag(inst_mat) == DaeTag.instance_material:
+                        res.material_bindings[inst_mat.get("symbol")] = get_ref(inst_mat.get("target"))
+
     return res
 
 
-def parse_collada(xml: ET.Element) -> Collada:
-    dae = Collada()
-    
-    matlib = xml.find(DaeTag.library_materials)
-    matlist = matlib.findall(DaeTag.material)
-    for mat in matlist:
-        dae.materials.append(Material(mat.get("id"), mat.get("name")))
+def iterparse_collada(stream: BufferedReader):
+    """Streams top-level library items, clearing each element once it has been parsed."""
 
-    geolib = xml.find(DaeTag.library_geometries)
-    geolist = geolib.findall(DaeTag.geometry)
-    for geo in geolist:
-        dae.geometries.append(parse_geometry(geo))
+    context = ET.iterparse(stream, events=("start", "end"))
+    path: list[str] = []
 
-    scnlib = xml.find(DaeTag.library_visual_scenes)
-    scn = scnlib.find(DaeTag.visual_scene)
-    nodelist = scn.findall(DaeTag.node)
-    for node in nodelist:
-        dae.nodes.append(parse_node(node))
-    
-    return dae
+    for event, xml in context:
+        tag = local_tag(xml)
 
+        if event == "start":
+            path.append(tag)
+            continue
 
-def convert_material(daemat: Material) -> CdaeV31.Material:
-    mat = CdaeV31.Material()
-    mat.name = daemat.name
+        path.pop()
+        parent = path[-1] if len(path) > 0 else None
 
-    return mat
+        match tag:
+            case DaeTag.geometry if parent == DaeTag.library_geometries:
+                yield parse_geometry(xml)
+                xml.clear()
+            case DaeTag.material if parent == DaeTag.library_materials:
+                yield Material(xml.get("id"), xml.get("name") or xml.get("id"))
+                xml.clear()
+            case DaeTag.node if parent == DaeTag.visual_scene:
+                yield parse_node(xml)
+                xml.clear()
+            case DaeTag.library_geometries | DaeTag.library_materials | DaeTag.library_visual_scenes | DaeTag.library_effects | DaeTag.library_animations:
+                xml.clear()
+
+
+def weld_indices(columns: NDArray) -> tuple[NDArray, NDArray]:
+    """Returns (first occurrence, inverse) of unique index rows, using a single 1-D key where it fits."""
 
+    radix = columns.max(axis=0).astype(np.float64) + 1 if columns.size else np.ones(columns.shape[1])
+    if np.prod(radix) < 2**62:
+        key = np.zeros(len(columns), dtype=np.int64)
+        for i in range(columns.shape[1]):
+            key = key * int(radix[i]) + columns[:, i]
+        _, first, inverse = np.unique(key, return_index=True, return_inverse=True)
+    else:
+        _, first, inverse = np.unique(columns, axis=0, return_index=True, return_inverse=True)
 
-def convert_geometry(geo: Geometry) -> CdaeV31.Mesh:
+    return first, inverse.reshape(-1)
+
+
+def convert_geometry(geo: Geometry, materials: list[str]) -> CdaeV31.Mesh:
+    """
+    Converts a parsed geometry, draw regions reference the local material symbols in `materials`,
+    which get resolved once node bindings are known.
+    """
     mesh = CdaeV31.Mesh()
+    mesh.type = CdaeV31.MeshType.STANDARD
+
+    slots = [(Semantic.VERTEX, 0), (Semantic.NORMAL, 0), (Semantic.TEXCOORD, 0), (Semantic.TEXCOORD, 1), (Semantic.COLOR, 0)]
+    sizes = [3, 3, 2, 2, 4]
+    # Primitives may index different sources for the same slot, each slot gathers from its sources concatenated.
+    sources: dict[tuple[Semantic, int], list[str]] = {}
+    source_bases: dict[tuple[tuple[Semantic, int], str], int] = {}
+    groups: list[NDArray] = []
+
+    def get_slot(semantic: Semantic, set: int):
+        return (semantic, set if semantic == Semantic.TEXCOORD else 0)
+
+    def bind(columns: NDArray, slot: tuple[Semantic, int], source: str, indices: NDArray):
+        if slot not in slots:
+            return
+        if source not in geo.sources:
+            raise ValueError(f"geometry '{geo.id}': source '{source}' not found")
+        slot_sources = sources.setdefault(slot, [])
+        if source not in slot_sources:
+            source_bases[slot, source] = sum(len(geo.sources[other]) for other in slot_sources)
+            slot_sources.append(source)
+        columns[:, slots.index(slot)] = indices + source_bases[slot, source]
+
+    for tri in geo.triangles:
+        columns = np.full((len(tri.indices), len(slots)), -1, dtype=np.int64)
+        for input in tri.inputs:
+            if input.semantic == Semantic.VERTEX:
+                # Inputs declared on <vertices> share the VERTEX index.
+                for vtx_input in geo.vertices.get(input.source, []):
+                    semantic = Semantic.VERTEX if vtx_input.semantic == Semantic.POSITION else vtx_input.semantic
+                    bind(columns, get_slot(semantic, vtx_input.set), vtx_input.source, tri.indices[:, input.offset])
+            else:
+                bind(columns, get_slot(input.semantic, input.set), input.source, tri.indices[:, input.offset])
+
+        groups.append(columns)
+
+    if len(groups) == 0:
+        return mesh
+
+    if slots[0] not in sources:
+        raise ValueError(f"geometry '{geo.id}': no POSITION input")
+
+    # A slot is either indexed by every primitive or by none, a missing input has no data to fall back to.
+    for tri, columns in zip(geo.triangles, groups):
+        for slot in sources:
+            if len(columns) > 0 and columns[0, slots.index(slot)] < 0:
+                semantic, set = slot
+                raise ValueError(f"geometry '{geo.id}': primitives with material '{tri.mat}' have no {semantic.value} input of set {set}, others do")
+
+    loop_columns = np.maximum(np.concatenate(groups), 0)
+    first, inverse = weld_indices(loop_columns)
+    vertex_columns = loop_columns[first]
+
+    def gather(slot: tuple[Semantic, int], fill: float = 0.0) -> NDArray | None:
+        if slot not in sources:
+            return None
+        size = sizes[slots.index(slot)]
+        # Shorter sources are padded, e.g. RGB colors get an opaque alpha.
+        data = np.concatenate([
+            np.pad(geo.sources[source][:, :size], ((0, 0), (0, max(size - geo.sources[source].shape[1], 0))), constant_values=fill)
+            for source in sources[slot]
+        ])
+        return np.ascontiguousarray(data[vertex_columns[:, slots.index(slot)]], dtype=np.float32)
+
+    positions = gather(slots[0])
+    normals = gather(slots[1])
+    uvs0 = gather(slots[2])
+    uvs1 = gather(slots[3])
+    colors = gather(slots[4], 1.0)
+
+    indices = inverse.astype(np.int32).reshape(-1, 3)[:, [2, 1, 0]].ravel()
+
+    draw_regions = []
+    offset = 0
+    for tri, columns in zip(geo.triangles, groups):
+        count = len(columns)
+        if tri.mat not in materials:
+            materials.append(tri.mat)
+        draw_regions.append((offset, count, materials.index(tri.mat) | CdaeV31.Mesh.DrawRegion.InfoMask.INDEXED))
+        offset += count
+
+    mesh.draw_regions.set_numpy_array(np.array(draw_regions, dtype=np.int32))
+    mesh.indices.set_numpy_array(indices)
+    mesh.verts.set_numpy_array(positions)
+
+    if normals is not None:
+        mesh.norms.set_numpy_array(normals)
+
+    if uvs0 is not None:
+        uvs0[:, 1] = 1.0 - uvs0[:, 1]
+        mesh.tverts0.set_numpy_array(uvs0)
+
+    if uvs1 is not None:
+        uvs1[:, 1] = 1.0 - uvs1[:, 1]
+        mesh.tverts1.set_numpy_array(uvs1)
+
+    if colors is not None:
+        colors = np.clip(np.rint(colors * 255.0), 0, 255).astype(np.uint8)
+        mesh.colors.set_numpy_array(colors)
+
+    mesh.numFrames = 1
+    mesh.numMatFrames = 1
+    mesh.vertsPerFrame = len(positions)
+
+    if mesh.vertsPerFrame > 0:
+        mins = positions.min(axis=0).astype(float)
+        maxs = positions.max(axis=0).astype(float)
+        mesh.bounds = Box6F(*mins, *maxs)
+        mesh.center = mesh.bounds.center()
+        mesh.radius = float(np.linalg.norm(positions - np.array(mesh.center.tuple3, dtype=np.float32), axis=1).max())
 
     return mesh
 
 
-def convert(dae: Collada):
-    cdae = CdaeV31()
-
-    for mat in dae.materials:
-        cdae.materials.append(convert_material(mat))
+def convert_material(daemat: Material) -> CdaeV31.Material:
+    mat = CdaeV31.Material()
+    mat.name = daemat.name
 
-    for geo in dae.geometries:
-        cdae.meshes.append(convert_geometry(geo))
+    return mat
 
-    cdae.unpack_tree()
 
-    return cdae
+class DaeConverter:
+
+    DETAIL_PATTERN = re.compile(r"^detail(-?\d+)$")
+    # Torque naming, a trailing number is the detail size of a mesh, e.g. foo_a500, foo_a100 and Colmesh-1.
+    MESH_SIZE_PATTERN = re.compile(r"^(.+?)(-?\d+)$")
+
+
+    @dataclass
+    class Object:
+        name: str
+        node_index: int
+        sizes: dict[float, CdaeV31.Mesh]
+        slots: list[CdaeV31.Mesh]
+
+
+    def __init__(self):
+        self.cdae = CdaeV31()
+        self.tree = self.cdae.unpack_tree()
+        self.materials: list[Material] = []
+        self.nodes: list[Node] = []
+        self.geometry_meshes: dict[str, CdaeV31.Mesh] = {}
+        self.geometry_symbols: dict[str, list[str]] = {}
+        self.details: list[CdaeV31.Detail] = []
+        self.objects: dict[int, DaeConverter.Object] = {}
+        self.mesh_nodes: dict[tuple[int, str], int] = {}
+        self.rotations: list[Quat4I16] = []
+        self.translations: list[Vec3F] = []
+
+
+    def add(self, item: Geometry | Material | Node):
+        match item:
+            case Geometry():
+                symbols: list[str] = []
+                self.geometry_meshes[item.id] = convert_geometry(item, symbols)
+                self.geometry_symbols[item.id] = symbols
+            case Material():
+                self.materials.append(item)
+            case Node():
+                self.nodes.append(item)
+
+
+    def resolve_material(self, target: str | None) -> int:
+        for index, mat in enumerate(self.materials):
+            if target in (mat.id, mat.name):
+                return index
+        return -1
+
+
+    def add_node(self, node: Node, parent_index: int = -1):
+        cdae = self.cdae
+        tree = self.tree
+
+        geometries = [geo for geo in node.geometries if geo in self.geometry_meshes]
+        detail_match = DaeConverter.DETAIL_PATTERN.match(node.name)
+        size_match = DaeConverter.MESH_SIZE_PATTERN.match(node.name) if len(geometries) > 0 and not detail_match else None
+
+        # Meshes of one object at several details share a node named without the size, placed by the first of them.
+        name = size_match.group(1) if size_match else node.name
+        node_index = self.mesh_nodes.get((parent_index, name)) if size_match else None
+        if node_index is None:
+            (node_index, flat_node) = tree.create_node()
+            tree.link_node(parent_index, node_index)
+            flat_node.nameIndex = cdae.get_name_index(name)
+            if size_match:
+                self.mesh_nodes[parent_index, name] = node_index
+
+            if node.matrix is not None:
+                transforms = Transforms.from_blender_matrix(mathutils.Matrix(node.matrix.tolist()))
+            else:
+                transforms = Transforms()
+            self.rotations.append(transforms.rotation)
+            self.translations.append(transforms.translation)
+
+        if detail_match:
+            detail = CdaeV31.Detail()
+            detail.nameIndex = cdae.get_name_index(node.name)
+            detail.size = float(detail_match.group(1))
+            self.details.append(detail)
+
+        if len(geometries) > 0:
+            obj = self.objects.get(node_index)
+            if obj is None:
+                obj = self.objects[node_index] = DaeConverter.Object(name, node_index, {}, [])
+            meshes = [self.resolve_mesh(geometry, node.material_bindings) for geometry in geometries]
+            if size_match:
+                size = float(size_match.group(2))
+                if len(meshes) > 1 or size in obj.sizes:
+                    raise ValueError(f"node '{node.name}': object '{name}' has more than one mesh at detail size {size:g}")
+                obj.sizes[size] = meshes[0]
+            else:
+                # Without a size, instances fill the detail slots in order, as the DAE writer lists them.
+                obj.slots.extend(meshes)
+
+        for child in node.children:
+            self.add_node(child, node_index)
+
+
+    def add_details(self):
+        """
+        One detail per size, largest first so collision details (negative sizes) come last.
+        Sizes of meshes without a detail node get one, each detail selects the mesh slot of its rank.
+        """
+        cdae = self.cdae
+        sizes = {detail.size for detail in self.details}
+        for obj in self.objects.values():
+            for size in obj.sizes:
+                if size not in sizes:
+                    detail = CdaeV31.Detail()
+                    detail.nameIndex = cdae.get_name_index(f"{'detail' if size >= 0 else 'collision'}{size:g}")
+                    detail.size = size
+                    self.details.append(detail)
+                    sizes.add(size)
+
+        if len(self.details) == 0:
+            detail = CdaeV31.Detail()
+            detail.nameIndex = cdae.get_name_index("detail2")
+            detail.size = 2
+            self.details.append(detail)
+
+        ranks = {size: rank for rank, size in enumerate(sorted({detail.size for detail in self.details}, reverse=True))}
+        self.details.sort(key=lambda detail: -detail.size)
+        for detail in self.details:
+            detail.objectDetailNum = ranks[detail.size]
+        return ranks
+
+
+    def add_objects(self, ranks: dict[float, int]):
+        """Objects with one mesh per detail slot up to their last used one, null meshes fill the gaps."""
+        cdae = self.cdae
+        tree = self.tree
+        for obj in self.objects.values():
+            meshes = dict(enumerate(obj.slots))
+            for size, mesh in obj.sizes.items():
+                if ranks[size] in meshes:
+                    raise ValueError(f"object '{obj.name}': detail size {size:g} is also given by an instance without a size")
+                meshes[ranks[size]] = mesh
+
+            (obj_index, flat_obj) = tree.create_object()
+            tree.link_object(obj.node_index, obj_index)
+            flat_obj.nameIndex = cdae.get_name_index(obj.name)
+            flat_obj.numMeshes = max(meshes) + 1
+            flat_obj.startMeshIndex = len(cdae.meshes)
+            cdae.meshes.extend(meshes.get(slot, CdaeV31.Mesh()) for slot in range(flat_obj.numMeshes))
+
+
+    def resolve_mesh(self, geometry: str, bindings: dict[str, str]) -> CdaeV31.Mesh:
+        """A mesh of the geometry with materials bound for one instance, vertex data stays shared between instances."""
+        mesh = copy.copy(self.geometry_meshes[geometry])
+        mesh.draw_regions = copy.copy(mesh.draw_regions)
+        symbols = self.geometry_symbols[geometry]
+        regions = mesh.unpack_regions()
+
+        for region in regions:
+            symbol = symbols[region.material]
+            mat_index = self.resolve_material(bindings.get(symbol, symbol))
+            if mat_index == -1:
+                region.raw_info = CdaeV31.Mesh.DrawRegion.InfoMask.INDEXED | CdaeV31.Mesh.DrawRegion.InfoMask.NO_MATERIAL
+            else:
+                region.raw_info = CdaeV31.Mesh.DrawRegion.InfoMask.INDEXED
+                region.material = mat_index
+
+        if len(regions) > 0:
+            mesh.draw_regions.pack_list(regions)
+        return mesh
+
+
+    def convert(self) -> CdaeV31:
+        cdae = self.cdae
+
+        for mat in self.materials:
+            cdae.materials.append(convert_material(mat))
+
+        for node in self.nodes:
+            self.add_node(node)
+        self.add_objects(self.add_details())
+
+        node_count = len(self.tree.nodes)
+        obj_count = len(self.tree.objects)
+        cdae.pack_subshapes([CdaeV31.SubShape(0, 0, node_count, obj_count)])
+        cdae.pack_details(self.details)
+        cdae.pack_tree(self.tree)
+        cdae.pack_states([CdaeV31.ObjectState() for _ in self.tree.objects])
+        cdae.defaultRotations.pack_list(self.rotations)
+        cdae.defaultTranslations.pack_list(self.translations)
+
+        meshes = [mesh for mesh in cdae.meshes if mesh.vertsPerFrame > 0]
+        if len(meshes) > 0:
+            cdae.bounds = meshes[0].bounds
+            for mesh in meshes[1:]:
+                cdae.bounds = cdae.bounds.extended(mesh.bounds)
+            cdae.center = cdae.bounds.center()
+            cdae.radius = math.sqrt(sum(x * x for x in cdae.bounds.range())) / 2
+            cdae.tube_radius = cdae.radius
+
+        return cdae
 
 
 
@@ -114,13 +531,14 @@ class DaeReader:
 
     @staticmethod
     def read_from_stream(stream: BufferedReader):
-        tree = ET.parse(stream)
-        dae = parse_collada(tree.find(DaeTag.COLLADA))
-        return convert(dae)
+        converter = DaeConverter()
+        for item in iterparse_collada(stream):
+            converter.add(item)
+        return converter.convert()
 
 
     @staticmethod
     def read_from_file(filepath: str) -> CdaeV31:
 
         with open(filepath, "rb") as f:
-            return DaeReader.read_from_stream(f)
\ No newline at end of file
+            return DaeReader.read_from_stream(f)
@@ -91,7 +91,7 @@ def write_geometry(mesh: CdaeV31.Mesh, lib_geometries: ET.Element, mesh_index: i
         return try_write_src(uv.ravel(), name, A.VEC2)
 
     positions_id = try_write_src(mesh.verts.to_numpy_array(np.float32), "position", A.VEC3)
-    normals_id = try_write_src(mesh.norms.to_numpy_array(np.float32), "normals", A.VEC3)
+    normals_id = try_write_src(mesh.get_vec3f_normals(), "normals", A.VEC3)
     uv0s_id = try_write_src_uv(mesh.tverts0.to_numpy_array(np.float32), "uv0s")
     uv1s_id = try_write_src_uv(mesh.tverts1.to_numpy_array(np.float32), "uv1s")
     color_id = try_write_src(mesh.get_vec4f_colors(), "colors", A.VEC4)
@@ -103,14 +103,15 @@ def write_geometry(mesh: CdaeV31.Mesh, lib_geometries: ET.Element, mesh_index: i
 
     # Triangles by draw region
     indices = mesh.indices.to_numpy_array(np.uint32)
-    indices = indices.reshape(-1, 3)[:, [2, 1, 0]].ravel()
     draw_regions = mesh.unpack_regions()
     for reg in draw_regions:
         mat_index = reg.material
         mat_name = f"mat_{mat_index}" if mat_index < len(materials) else "mat_0"
         mesh_mat_names.append(mat_name)
+        reg_indices = reg.get_triangles(indices)[:, [2, 1, 0]]
+        reg_indices = reg_indices[(reg_indices[:, 0] != reg_indices[:, 1]) & (reg_indices[:, 1] != reg_indices[:, 2]) & (reg_indices[:, 0] != reg_indices[:, 2])]
         tris = ET.SubElement(mesh_elem, DaeTag.triangles, {
-            "count": str(reg.elements_count // 3),
+            "count": str(len(reg_indices)),
             "material": mat_name
         })
 
@@ -123,7 +124,7 @@ def write_geometry(mesh: CdaeV31.Mesh, lib_geometries: ET.Element, mesh_index: i
         if color_id is not None:
             ET.SubElement(tris, DaeTag.input, {"semantic": "COLOR", "source": f"#{color_id}", "offset": "0"})
 
-        ET.SubElement(tris, DaeTag.p).text = " ".join(str(indices[i]) for i in range(reg.elements_start, reg.elements_start + reg.elements_count))
+        ET.SubElement(tris, DaeTag.p).text = " ".join(map(str, reg_indices.ravel().tolist()))
 
 
 def collapse_animation(times: list[float], transforms: list[float]) -> tuple[list[float], list[float]]:
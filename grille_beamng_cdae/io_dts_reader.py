@@ -0,0 +1,311 @@
+import mmap
+import struct
+import numpy as np
+
+from io import BufferedReader
+
+from .cdae_v31 import CdaeV31
+from .packed_vector import PackedVector
+from .io_dts_writer import S32, U32, SHAPE_COUNTS, SHAPE_BOUNDS, MESH_HEADER, MESH_FOOTER, FILE_HEADER, SEQUENCE
+from .numerics import *
+
+
+class CdaeDtsStreams:
+    """
+    Cursor over the three TSShapeAlloc streams of a mapped file.
+    All arrays are returned as views into the mapping, nothing gets copied.
+    """
+
+    def __init__(self, data: memoryview, start32: int, start16: int, start8: int, end: int):
+        self.b32 = data[start32:start16]
+        self.b16 = data[start16:start8]
+        self.b8 = data[start8:end]
+        self.pos32 = 0
+        self.pos16 = 0
+        self.pos8 = 0
+        self.guard_index = 0
+
+
+    def read_struct(self, layout: struct.Struct) -> tuple:
+        values = layout.unpack_from(self.b32, self.pos32)
+        self.pos32 += layout.size
+        return values
+
+
+    def read_s32(self) -> int:
+        return self.read_struct(S32)[0]
+
+
+    def read_view32(self, count: int, element_size: int = 4) -> memoryview:
+        size = count * element_size
+        view = self.b32[self.pos32:self.pos32 + size]
+        self.pos32 += size
+        return view
+
+
+    def read_view16(self, count: int, element_size: int = 2) -> memoryview:
+        size = count * element_size
+        view = self.b16[self.pos16:self.pos16 + size]
+        self.pos16 += size
+        return view
+
+
+    def read_view8(self, count: int) -> memoryview:
+        view = self.b8[self.pos8:self.pos8 + count]
+        self.pos8 += count
+        return view
+
+
+    def read_vector32(self, count: int, element_size: int) -> PackedVector:
+        return CdaeDtsStreams.create_vector(self.read_view32(count, element_size), count, element_size)
+
+
+    def read_vector16(self, count: int, element_size: int) -> PackedVector:
+        return CdaeDtsStreams.create_vector(self.read_view16(count, element_size), count, element_size)
+
+
+    def read_vector8(self, count: int, element_size: int = 1) -> PackedVector:
+        return CdaeDtsStreams.create_vector(self.read_view8(count * element_size), count, element_size)
+
+
+    def read_str(self) -> str:
+        end = self.pos8
+        while self.b8[end] != 0:
+            end += 1
+        value = bytes(self.b8[self.pos8:end]).decode("utf-8")
+        self.pos8 = end + 1
+        return value
+
+
+    def check_guard(self):
+        guard8 = self.b8[self.pos8]
+        guard16 = int.from_bytes(self.b16[self.pos16:self.pos16 + 2], "little")
+        guard32 = int.from_bytes(self.b32[self.pos32:self.pos32 + 4], "little", signed=True)
+        self.pos8 += 1
+        self.pos16 += 2
+        self.pos32 += 4
+
+        expected = self.guard_index
+        if guard32 != expected or guard16 != expected & 0xFFFF or guard8 != expected & 0xFF:
+            raise ValueError(f"DTS guard {expected} mismatch: {guard32}, {guard16}, {guard8}")
+        self.guard_index += 1
+
+
+    @staticmethod
+    def create_vector(view: memoryview, count: int, element_size: int) -> PackedVector:
+        vec = PackedVector()
+        vec.element_count = count
+        vec.element_size = element_size
+        vec.data = view
+        return vec
+
+
+
+def read_integerset(data: memoryview, offset: int) -> tuple[list[bool], int]:
+    _, count = struct.unpack_from("<ii", data, offset)
+    offset += 8
+    words = np.frombuffer(data, dtype="<u4", count=count, offset=offset)
+    bits = np.unpackbits(words.view(np.uint8), bitorder="little").astype(bool)
+    return bits.tolist(), offset + count * 4
+
+
+def read_mesh(streams: CdaeDtsStreams) -> CdaeV31.Mesh:
+
+    mesh = CdaeV31.Mesh()
+    mesh.type = CdaeV31.MeshType(streams.read_struct(U32)[0])
+
+    if mesh.type == CdaeV31.MeshType.NULL:
+        return mesh
+
+    if mesh.type != CdaeV31.MeshType.STANDARD:
+        raise Exception(f"Unsupported mesh type {mesh.type.name}")
+
+    streams.check_guard()
+
+    header = streams.read_struct(MESH_HEADER)
+    mesh.numFrames, mesh.numMatFrames, mesh.parentMesh = header[0:3]
+    mesh.bounds = Box6F(*header[3:9])
+    mesh.center = Vec3F(*header[9:12])
+    mesh.radius = header[12]
+
+    vert_count = streams.read_s32()
+    mesh.verts = streams.read_vector32(vert_count, 12)
+    mesh.tverts0 = streams.read_vector32(streams.read_s32(), 8)
+    mesh.tverts1 = streams.read_vector32(streams.read_s32(), 8)
+    mesh.colors = streams.read_vector32(streams.read_s32(), 4)
+    mesh.norms = streams.read_vector32(vert_count, 12)
+    mesh.encoded_norms = streams.read_vector8(vert_count)
+    mesh.draw_regions = streams.read_vector32(streams.read_s32(), 12)
+    mesh.indices = streams.read_vector32(streams.read_s32(), 4)
+    streams.read_view16(streams.read_s32()) #mergeIndices
+
+    mesh.vertsPerFrame, flags = streams.read_struct(MESH_FOOTER)
+    mesh.flags = flags
+    streams.check_guard()
+
+    return mesh
+
+
+def read_v26_from_buffer(data: memoryview) -> CdaeV31:
+
+    cdae = CdaeV31()
+
+    file_version, export_version, size, start16, start8 = FILE_HEADER.unpack_from(data, 0)
+    if file_version != 26:
+        raise Exception(f"Unsupported DTS version {file_version}")
+
+    base = FILE_HEADER.size
+    streams = CdaeDtsStreams(data, base, base + start16 * 4, base + start8 * 4, base + size * 4)
+
+    (
+        num_nodes, num_objects, num_decals, num_subshapes, num_ifls,
+        num_node_rots, num_node_trans, num_uniform_scales, num_aligned_scales, num_arb_scales,
+        num_ground_frames, num_object_states, num_decal_states, num_triggers, num_details,
+        num_meshes, num_names, cdae.smallest_visible_size, cdae.smallest_visible_dl
+    ) = streams.read_struct(SHAPE_COUNTS)
+    streams.check_guard()
+
+    bounds = streams.read_struct(SHAPE_BOUNDS)
+    cdae.radius, cdae.tube_radius = bounds[0:2]
+    cdae.center = Vec3F(*bounds[2:5])
+    cdae.bounds = Box6F(*bounds[5:11])
+    streams.check_guard()
+
+    cdae.nodes = streams.read_vector32(num_nodes, 20)
+    streams.check_guard()
+
+    cdae.objects = streams.read_vector32(num_objects, 24)
+    streams.check_guard()
+
+    streams.read_view32(num_decals, 20) #decals
+    streams.check_guard()
+
+    streams.read_view32(num_ifls, 20) #iflMaterials
+    streams.check_guard()
+
+    cdae.subShapeFirstNode = streams.read_vector32(num_subshapes, 4)
+    cdae.subShapeFirstObject = streams.read_vector32(num_subshapes, 4)
+    streams.read_view32(num_subshapes) #subShapeFirstDecal
+    streams.check_guard()
+
+    # Counts are implicit, each subshape ends where the next one starts.
+    first_nodes = cdae.subShapeFirstNode.to_numpy_array(np.int32)
+    first_objects = cdae.subShapeFirstObject.to_numpy_array(np.int32)
+    cdae.subShapeNumNodes.set_numpy_array(np.diff(first_nodes, append=num_nodes).astype(np.int32))
+    cdae.subShapeNumObjects.set_numpy_array(np.diff(first_objects, append=num_objects).astype(np.int32))
+
+    cdae.defaultRotations = streams.read_vector16(num_nodes, 8)
+    cdae.defaultTranslations = streams.read_vector32(num_nodes, 12)
+    cdae.nodeRotations = streams.read_vector16(num_node_rots, 8)
+    cdae.nodeTranslations = streams.read_vector32(num_node_trans, 12)
+    streams.check_guard()
+
+    cdae.nodeUniformScales = streams.read_vector32(num_uniform_scales, 4)
+    cdae.nodeAlignedScales = streams.read_vector32(num_aligned_scales, 12)
+    cdae.nodeArbitraryScaleFactors = streams.read_vector32(num_arb_scales, 12)
+    cdae.nodeArbitraryScaleRots = streams.read_vector16(num_arb_scales, 8)
+    streams.check_guard()
+
+    cdae.groundTranslations = streams.read_vector32(num_ground_frames, 12)
+    cdae.groundRotations = streams.read_vector16(num_ground_frames, 8)
+    streams.check_guard()
+
+    cdae.objectStates = streams.read_vector32(num_object_states, 12)
+    streams.check_guard()
+
+    streams.read_view32(num_decal_states, 4) #decalStates
+    streams.check_guard()
+
+    cdae.triggers = streams.read_vector32(num_triggers, 8)
+    streams.check_guard()
+
+    cdae.details = streams.read_vector32(num_details, 52)
+    streams.check_guard()
+
+    for _ in range(num_meshes):
+        cdae.meshes.append(read_mesh(streams))
+    streams.check_guard()
+
+    for _ in range(num_names):
+        cdae.names.append(streams.read_str())
+    streams.check_guard()
+
+    offset = base + size * 4
+
+    seq_count = S32.unpack_from(data, offset)[0]
+    offset += S32.size
+    for _ in range(seq_count):
+        seq = CdaeV31.Sequence()
+        cdae.sequences.append(seq)
+
+        (
+            seq.nameIndex, seq.flags, seq.numKeyframes, seq.duration, seq.priority,
+            seq.firstGroundFrame, seq.numGroundFrames,
+            seq.baseRotation, seq.baseTranslation, seq.baseScale, seq.baseObjectState, seq.baseDecalState,
+            seq.firstTrigger, seq.numTriggers, seq.toolBegin
+        ) = SEQUENCE.unpack_from(data, offset)
+        offset += SEQUENCE.size
+
+        seq.rotationMatters, offset = read_integerset(data, offset)
+        seq.translationMatters, offset = read_integerset(data, offset)
+        seq.scaleMatters, offset = read_integerset(data, offset)
+        _, offset = read_integerset(data, offset) #decalMatters
+        _, offset = read_integerset(data, offset) #iflMatters
+        seq.visMatters, offset = read_integerset(data, offset)
+        seq.frameMatters, offset = read_integerset(data, offset)
+        seq.matFrameMatters, offset = read_integerset(data, offset)
+
+    offset += 1 #matStreamType
+    mat_count = S32.unpack_from(data, offset)[0]
+    offset += S32.size
+    for _ in range(mat_count):
+        mat = CdaeV31.Material()
+        cdae.materials.append(mat)
+
+        name_length = S32.unpack_from(data, offset)[0]
+        offset += S32.size
+        mat.name = bytes(data[offset:offset + name_length]).decode("utf-8")
+        offset += name_length + 1
+
+    def read_table(dtype: str) -> np.ndarray:
+        nonlocal offset
+        table = np.frombuffer(data, dtype=dtype, count=mat_count, offset=offset)
+        offset += mat_count * 4
+        return table
+
+    flags = read_table("<u4")
+    reflect = read_table("<i4")
+    bump = read_table("<i4")
+    detail = read_table("<i4")
+    read_table("<i4") #lightMaps (deprecated)
+    detail_scale = read_table("<f4")
+    reflection_amount = read_table("<f4")
+
+    for i, mat in enumerate(cdae.materials):
+        mat.flags = int(flags[i])
+        mat.reflect = int(reflect[i])
+        mat.bump = int(bump[i])
+        mat.detail = int(detail[i])
+        mat.detailScale = float(detail_scale[i])
+        mat.reflectionAmount = float(reflection_amount[i])
+
+    return cdae
+
+
+
+class DtsReader:
+
+    @staticmethod
+    def read_from_stream(stream: BufferedReader):
+        return read_v26_from_buffer(memoryview(stream.read()))
+
+
+    @staticmethod
+    def read_from_file(filepath: str) -> CdaeV31:
+        """
+        Maps the file instead of reading it, the returned vectors stay views into the mapping,
+        which is released once the last of them is gone.
+        """
+        with open(filepath, "rb") as f:
+            mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return read_v26_from_buffer(memoryview(mapping))
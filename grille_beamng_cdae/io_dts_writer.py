@@ -1,6 +1,5 @@
 import struct
 import numpy as np
-import zstandard as zstd
 
 from dataclasses import dataclass
 from enum import Enum
@@ -8,143 +7,154 @@ from io import BufferedReader, BufferedWriter, BytesIO
 
 from .cdae_v31 import CdaeV31
 from .packed_vector import PackedVector
-from .io_msgpack_reader import MsgpackReader
-from .io_msgpack_writer import MsgpackWriter
 from .numerics import *
 
 
-class CdaeDtsBuffers:
-        
-    def __init__(self):
-        self.guard_index = 0
-        self.b8 = BytesIO()
-        self.b16 = BytesIO()
-        self.b32 = BytesIO()
+# Precompiled layouts, scalars that belong together are packed in one call.
+U8 = struct.Struct("<B")
+S8 = struct.Struct("<b")
+U16 = struct.Struct("<H")
+S32 = struct.Struct("<i")
+U32 = struct.Struct("<I")
+F32 = struct.Struct("<f")
 
+SHAPE_COUNTS = struct.Struct("<17i f i")
+SHAPE_BOUNDS = struct.Struct("<2f 3f 6f")
+MESH_HEADER = struct.Struct("<Ii 3i 6f 3f f i")
+MESH_FOOTER = struct.Struct("<iiIi")
+FILE_HEADER = struct.Struct("<hh3i")
+SEQUENCE = struct.Struct("<iIifiiiiiiiiiif")
 
-    def write_u8(self, value: int):
-        self.b8.write(struct.pack("<B", value))
 
+def pack_integerset(bits: list[bool]) -> bytes:
+    """TSIntegerSet layout: 0 (legacy), dword count, dwords."""
+    words = np.packbits(np.asarray(bits, dtype=bool), bitorder="little")
+    words = np.pad(words, (0, -len(words) % 4)).view("<u4")
+    used = np.flatnonzero(words)
+    words = words[:used[-1] + 1] if len(used) > 0 else words[:0]
+    return struct.pack("<ii", 0, len(words)) + words.tobytes()
 
-    def write_s8(self, value: int):
-        self.b8.write(struct.pack("<b", value))
 
+class CdaeDtsBuffers:
+    """Collects the three TSShapeAlloc streams, each one a list of byte chunks joined at the end."""
 
-    def write_u16(self, value: int):
-        self.b16.write(struct.pack("<H", value))
+    def __init__(self):
+        self.guard_index = 0
+        self.b8: list[bytes] = []
+        self.b16: list[bytes] = []
+        self.b32: list[bytes] = []
 
 
-    def write_s16(self, value: int):
-        self.b16.write(struct.pack("<h", value))
+    def write_struct(self, stream: list[bytes], layout: struct.Struct, *values):
+        stream.append(layout.pack(*values))
 
 
-    def write_u32(self, value: int):
-        self.b32.write(struct.pack("<I", value))
-        
+    def write_array(self, stream: list[bytes], data: bytes | np.ndarray):
+        stream.append(data if isinstance(data, bytes) else data.tobytes())
 
-    def write_s32(self, value: int):
-        self.b32.write(struct.pack("<i", value))
-        
 
-    def write_f32(self, value: float):
-        self.b32.write(struct.pack("<f", value))
+    def write_zeros(self, stream: list[bytes], size: int):
+        if size > 0:
+            stream.append(bytes(size))
 
 
-    def write_vec3(self, value: Vec3F):
-        self.write_f32(value.x)
-        self.write_f32(value.y)
-        self.write_f32(value.z)
+    def write_s32(self, value: int):
+        self.write_struct(self.b32, S32, value)
 
 
     def write_str(self, value: str):
-        data = value.encode("utf-8")
-        self.b8.write(data)
-        self.b8.write(b"\x00")  # null terminator
+        self.write_array(self.b8, value.encode("utf-8") + b"\x00")
 
 
-    def write_box6(self, value: Box6F):
-        self.write_vec3(value.min)
-        self.write_vec3(value.max)
+    def next_guard(self) -> int:
+        """Writes the guard to the 8 and 16-bit streams, the 32-bit one is left to the caller to pack with its neighbours."""
+        index = self.guard_index
+        self.b8.append(U8.pack(index & 0xFF))
+        self.b16.append(U16.pack(index & 0xFFFF))
+        self.guard_index += 1
+        return index
 
 
     def write_guard(self):
-        self.write_s8(self.guard_index)
-        self.write_s16(self.guard_index)
-        self.write_s32(self.guard_index)
-        self.guard_index += 1
+        self.write_struct(self.b32, S32, self.next_guard())
 
 
     def write_mesh(self, mesh: CdaeV31.Mesh):
-        
-        self.write_u32(mesh.type)
-        self.write_guard()
+
         if mesh.type == CdaeV31.MeshType.NULL:
+            self.write_struct(self.b32, U32, mesh.type)
             return
-        
+
         if mesh.type != CdaeV31.MeshType.STANDARD:
-            raise Exception()
-        
-        self.write_s32(mesh.numFrames)
-        self.write_s32(mesh.numMatFrames)
-        self.write_s32(mesh.parentMesh)
-        self.write_box6(mesh.bounds)
-        self.write_vec3(mesh.center)
-        self.write_f32(mesh.radius)
-
-        self.write_s32(mesh.verts.element_count)
-        self.b32.write(mesh.verts.data)
-        self.write_s32(mesh.tverts0.element_count)
-        self.b32.write(mesh.tverts0.data)
-        self.write_s32(mesh.tverts1.element_count)
-        self.b32.write(mesh.tverts1.data)
-        self.write_s32(mesh.colors.element_count)
-        self.b32.write(mesh.colors.data)
-        self.b32.write(mesh.norms.data)
-        self.b8.write(mesh.encoded_norms.data)
-        self.write_s32(mesh.draw_regions.element_count)
-        self.b32.write(mesh.draw_regions.data)
-        self.write_s32(mesh.indices.element_count)
-        self.b32.write(mesh.indices.data)
-        self.write_s32(0) #numMergeIndices
-        #mergeIndices
-        self.write_s32(mesh.vertsPerFrame)
-        self.write_u32(mesh.flags)
-        self.write_guard()
+            raise Exception(f"DTS writer does not support {mesh.type.name} meshes")
+
+        # Everything between two guards goes in one extend, the scalar runs in one pack each.
+        vert_count = mesh.verts.element_count
+        header = MESH_HEADER.pack(
+            mesh.type, self.next_guard(),
+            mesh.numFrames, mesh.numMatFrames, mesh.parentMesh,
+            *mesh.bounds.tuple6, *mesh.center.tuple3, mesh.radius,
+            vert_count
+        )
+
+        # Normals are not prefixed with a count, both arrays always hold one entry per vertex.
+        norms = mesh.norms.data if mesh.norms.element_count == vert_count else bytes(vert_count * 12)
+        encoded_norms = mesh.encoded_norms.data if mesh.encoded_norms.element_count == vert_count else bytes(vert_count)
+        self.b8.append(encoded_norms)
+
+        self.b32.extend((
+            header,
+            mesh.verts.data,
+            S32.pack(mesh.tverts0.element_count),
+            mesh.tverts0.data,
+            S32.pack(mesh.tverts1.element_count),
+            mesh.tverts1.data,
+            S32.pack(mesh.colors.element_count),
+            mesh.colors.data,
+            norms,
+            S32.pack(mesh.draw_regions.element_count),
+            mesh.draw_regions.data,
+            S32.pack(mesh.indices.element_count),
+            mesh.indices.data,
+            MESH_FOOTER.pack(0, mesh.vertsPerFrame, mesh.flags, self.next_guard()), #numMergeIndices, no mergeIndices
+        ))
 
 
     def write_data_to_buffers(self, cdae: CdaeV31):
-        
-        self.write_s32(cdae.nodes.element_count)
-        self.write_s32(cdae.objects.element_count)
-        self.write_s32(0) #numDecals
-        self.write_s32(cdae.subShapeFirstNode.element_count)
-        self.write_s32(0) #numIFLs
-        self.write_s32(cdae.nodeRotations.element_count)
-        self.write_s32(cdae.nodeTranslations.element_count)
-        self.write_s32(cdae.nodeUniformScales.element_count)
-        self.write_s32(cdae.nodeAlignedScales.element_count)
-        self.write_s32(0) #numNodeArbScales
-        self.write_s32(0) #numGroundFrames
-        self.write_s32(cdae.objectStates.element_count)
-        self.write_s32(0) #numDecalStates
-        self.write_s32(cdae.triggers.element_count)
-        self.write_s32(cdae.details.element_count)
-        self.write_s32(len(cdae.meshes))
-        self.write_s32(len(cdae.names))
-        self.write_f32(cdae.smallest_visible_size)
-        self.write_s32(cdae.smallest_visible_dl)
+
+        subshape_count = cdae.subShapeFirstNode.element_count
+        detail_count = cdae.details.element_count
+
+        self.write_struct(self.b32, SHAPE_COUNTS,
+            cdae.nodes.element_count,
+            cdae.objects.element_count,
+            0, #numDecals
+            subshape_count,
+            0, #numIFLs
+            cdae.nodeRotations.element_count,
+            cdae.nodeTranslations.element_count,
+            cdae.nodeUniformScales.element_count,
+            cdae.nodeAlignedScales.element_count,
+            cdae.nodeArbitraryScaleFactors.element_count,
+            cdae.groundTranslations.element_count,
+            cdae.objectStates.element_count,
+            0, #numDecalStates
+            cdae.triggers.element_count,
+            detail_count,
+            len(cdae.meshes),
+            len(cdae.names),
+            cdae.smallest_visible_size,
+            cdae.smallest_visible_dl,
+        )
         self.write_guard()
 
-        self.write_f32(cdae.radius)
-        self.write_f32(cdae.tube_radius)
-        self.write_vec3(cdae.center)
-        self.write_box6(cdae.bounds)
+        self.write_struct(self.b32, SHAPE_BOUNDS, cdae.radius, cdae.tube_radius, *cdae.center.tuple3, *cdae.bounds.tuple6)
         self.write_guard()
 
-        self.b32.write(cdae.nodes.data)
+        self.write_array(self.b32, cdae.nodes.data)
         self.write_guard()
 
-        self.b32.write(cdae.objects.data)
+        self.write_array(self.b32, cdae.objects.data)
         self.write_guard()
 
         #decals
@@ -153,92 +163,127 @@ class CdaeDtsBuffers:
         #iflMaterials
         self.write_guard()
 
-        self.b32.write(cdae.subShapeFirstNode.data)
-        self.b32.write(cdae.subShapeFirstObject.data)
-        self.b32.write(bytearray(cdae.subShapeFirstNode.element_count*4)) #subShapeFirstDecal
-        self.b32.write(bytearray(cdae.subShapeFirstNode.element_count*4)) #subShapeFirstTranslucentObject
+        self.write_array(self.b32, cdae.subShapeFirstNode.data)
+        self.write_array(self.b32, cdae.subShapeFirstObject.data)
+        self.write_zeros(self.b32, subshape_count * 4) #subShapeFirstDecal
         self.write_guard()
 
-        self.b32.write(cdae.defaultRotations.data)
-        self.b32.write(cdae.defaultTranslations.data)
-        self.b32.write(cdae.nodeRotations.data)
-        self.b32.write(cdae.nodeTranslations.data)
+        # Quaternions are stored as 4x s16 and go to the 16-bit stream.
+        self.write_array(self.b16, cdae.defaultRotations.data)
+        self.write_array(self.b32, cdae.defaultTranslations.data)
+        self.write_array(self.b16, cdae.nodeRotations.data)
+        self.write_array(self.b32, cdae.nodeTranslations.data)
         self.write_guard()
 
-        self.b32.write(cdae.nodeUniformScales.data)
-        self.b32.write(cdae.nodeAlignedScales.data)
-        #nodeArbScaleFactors
-        #nodeArbScaleRots
+        self.write_array(self.b32, cdae.nodeUniformScales.data)
+        self.write_array(self.b32, cdae.nodeAlignedScales.data)
+        self.write_array(self.b32, cdae.nodeArbitraryScaleFactors.data)
+        self.write_array(self.b16, cdae.nodeArbitraryScaleRots.data)
         self.write_guard()
 
-        self.b32.write(cdae.groundTranslations.data)
-        self.b32.write(cdae.groundRotations.data)
+        self.write_array(self.b32, cdae.groundTranslations.data)
+        self.write_array(self.b16, cdae.groundRotations.data)
         self.write_guard()
 
-        self.b32.write(cdae.objectStates.data)
+        self.write_array(self.b32, cdae.objectStates.data)
         self.write_guard()
 
-        self.b32.write(cdae.triggers.data)
+        #decalStates
         self.write_guard()
 
-        self.b32.write(cdae.details.data)
+        self.write_array(self.b32, cdae.triggers.data)
+        self.write_guard()
+
+        self.write_array(self.b32, cdae.details.data)
         self.write_guard()
 
         for mesh in cdae.meshes:
             self.write_mesh(mesh)
         self.write_guard()
 
-        for name in cdae.names:
-            self.write_str(name)
+        self.write_array(self.b8, b"".join(name.encode("utf-8") + b"\x00" for name in cdae.names))
         self.write_guard()
 
-        self.write_f32(0) #alphaIn
-        self.write_f32(0) #alphaOut
+        self.write_zeros(self.b32, detail_count * 4) #alphaIn
+        self.write_zeros(self.b32, detail_count * 4) #alphaOut
+
+
+    @staticmethod
+    def join_aligned(stream: list[bytes]) -> bytes:
+        data = b"".join(stream)
+        return data + bytes(-len(data) % 4)
 
 
 
 class DtsWriter:
 
     @staticmethod
-    def write_to_stream(cdae: CdaeV31, f: BufferedWriter):
+    def write_sequence(seq: CdaeV31.Sequence, f: BufferedWriter):
+        f.write(SEQUENCE.pack(
+            seq.nameIndex, seq.flags, seq.numKeyframes, seq.duration, seq.priority,
+            seq.firstGroundFrame, seq.numGroundFrames,
+            seq.baseRotation, seq.baseTranslation, seq.baseScale, seq.baseObjectState, seq.baseDecalState,
+            seq.firstTrigger, seq.numTriggers, seq.toolBegin
+        ))
+        f.write(b"".join((
+            pack_integerset(seq.rotationMatters),
+            pack_integerset(seq.translationMatters),
+            pack_integerset(seq.scaleMatters),
+            pack_integerset([]), #decalMatters
+            pack_integerset([]), #iflMatters
+            pack_integerset(seq.visMatters),
+            pack_integerset(seq.frameMatters),
+            pack_integerset(seq.matFrameMatters),
+        )))
+
+
+    @staticmethod
+    def write_materials(materials: list[CdaeV31.Material], f: BufferedWriter):
+        f.write(S8.pack(1)) #matStreamType binary
+        f.write(S32.pack(len(materials)))
+        for mat in materials:
+            name = mat.name.encode("utf-8")
+            f.write(S32.pack(len(name)) + name + b"\x00")
+
+        # Property tables are stored field by field, not material by material.
+        count = len(materials)
+        f.write(np.array([mat.flags for mat in materials], dtype="<u4").tobytes())
+        f.write(np.array([mat.reflect for mat in materials], dtype="<i4").tobytes())
+        f.write(np.array([mat.bump for mat in materials], dtype="<i4").tobytes())
+        f.write(np.array([mat.detail for mat in materials], dtype="<i4").tobytes())
+        f.write(np.full(count, -1, dtype="<i4").tobytes()) #lightMaps (deprecated)
+        f.write(np.array([mat.detailScale for mat in materials], dtype="<f4").tobytes())
+        f.write(np.array([mat.reflectionAmount for mat in materials], dtype="<f4").tobytes())
+
 
-        def write_s8(value: int): f.write(struct.pack("<b", value))
-        def write_s16(value: int): f.write(struct.pack("<h", value))
-        def write_s32(value: int): f.write(struct.pack("<i", value))
-        def write_u32(value: int): f.write(struct.pack("<I", value))
-        def write_f32(value: float): f.write(struct.pack("<f", value))
+    @staticmethod
+    def write_to_stream(cdae: CdaeV31, f: BufferedWriter, buffers: CdaeDtsBuffers = None):
 
-        self = CdaeDtsBuffers()
+        self = CdaeDtsBuffers() if buffers is None else buffers
         self.write_data_to_buffers(cdae)
-        buffer32 = self.b32.getvalue()
-        buffer16 = self.b16.getvalue()
-        buffer8 = self.b8.getvalue()
-
-        write_s16(26)
-        write_s16(0)
-        write_s32(len(buffer32)+len(buffer16)+len(buffer8))
-        write_s32(len(buffer32))
-        write_s32(len(buffer32)+len(buffer16))
+        buffer32 = CdaeDtsBuffers.join_aligned(self.b32)
+        buffer16 = CdaeDtsBuffers.join_aligned(self.b16)
+        buffer8 = CdaeDtsBuffers.join_aligned(self.b8)
+
+        # Sizes and stream offsets are counted in dwords.
+        size32 = len(buffer32) // 4
+        size16 = len(buffer16) // 4
+        size8 = len(buffer8) // 4
+
+        f.write(FILE_HEADER.pack(26, 0, size32 + size16 + size8, size32, size32 + size16))
         f.write(buffer32)
         f.write(buffer16)
         f.write(buffer8)
-        write_s32(len(cdae.sequences))
+
+        f.write(S32.pack(len(cdae.sequences)))
         for seq in cdae.sequences:
-            write_s32(seq.nameIndex)
-            write_u32(seq.flags)
-            #TODO:
-        write_s8(1) #matStreamType binary
-        write_s32(len(cdae.materials))
-        for mat in cdae.materials:
-            write_s32(len(mat.name))
-            f.write(mat.name.encode("utf-8"))
-            f.write(b"\x00")  # null terminator
-        for _ in cdae.materials:
-            f.write(bytearray(7*4))
+            DtsWriter.write_sequence(seq, f)
+
+        DtsWriter.write_materials(cdae.materials, f)
 
 
     @staticmethod
     def write_to_file(cdae: CdaeV31, filepath: str):
 
         with open(filepath, 'wb') as f:
-            DtsWriter.write_to_stream(cdae, f)
\ No newline at end of file
+            DtsWriter.write_to_stream(cdae, f)
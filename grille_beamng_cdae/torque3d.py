@@ -261,9 +261,13 @@ U8_NORMAL_TABLE = [
 ]
 
 U8_NORMAL_TABLE_NP = np.array(U8_NORMAL_TABLE)
+U8_NORMAL_TABLE_F32 = U8_NORMAL_TABLE_NP.astype(np.float32)
 
 class Torque3D:
 
+    ENCODE_CHUNK_SIZE = 65536
+
+
     @staticmethod
     def encode_normal(normal: Vec3F | tuple):
 
@@ -271,4 +275,36 @@ class Torque3D:
             normal = normal.tuple3
 
         dots = U8_NORMAL_TABLE_NP @ normal
-        return np.argmax(dots)
\ No newline at end of file
+        return np.argmax(dots)
+    
+
+    @staticmethod
+    def encode_normals(normals: np.ndarray) -> np.ndarray:
+        """Encodes (n, 3) normals to table indices, in chunks to bound the (n, 256) dot matrix."""
+
+        normals = np.asarray(normals, dtype=np.float32).reshape(-1, 3)
+        encoded = np.empty(len(normals), dtype=np.uint8)
+
+        table_t = U8_NORMAL_TABLE_F32.T
+        chunk = Torque3D.ENCODE_CHUNK_SIZE
+        for start in range(0, len(normals), chunk):
+            dots = normals[start:start + chunk] @ table_t
+            encoded[start:start + chunk] = np.argmax(dots, axis=1)
+
+        return encoded
+    
+
+    @staticmethod
+    def decode_normals(encoded: np.ndarray) -> np.ndarray:
+        return U8_NORMAL_TABLE_F32[np.asarray(encoded, dtype=np.uint8)]
+    
+
+    @staticmethod
+    def get_encoding_error(normals: np.ndarray, encoded: np.ndarray) -> np.ndarray:
+        """Angular error in degrees per normal."""
+
+        decoded = Torque3D.decode_normals(encoded)
+        decoded = decoded / np.linalg.norm(decoded, axis=1, keepdims=True)
+        lengths = np.linalg.norm(normals, axis=1)
+        dots = np.einsum("ij,ij->i", normals, decoded) / np.where(lengths > 0, lengths, 1)
+        return np.degrees(np.arccos(np.clip(dots, -1.0, 1.0)))
\ No newline at end of file
@@ -58,6 +58,8 @@ class CdaeJsonDebugger:
                     "draw_regions": mesh.draw_regions.element_count,
                     "indices": mesh.indices.element_count,
                     "tangents": mesh.tangents.element_count,
+                    "initial_transforms": mesh.initial_transforms.element_count,
+                    "influences": mesh.weight.element_count,
                 }
             })
 